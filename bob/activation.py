@@ -2,9 +2,11 @@
 import os
 import logging
 import datetime  # Added the missing datetime import
-from bob.ftp_client import FTPClient
+from bob.ftp_client import ftp_pool
+from bob.spool import upload_spool, PRIORITY_CONTROL
 from bob.config import FTP_DETAILS, DATA_DIR, LOG_DIR
 from bob.led import bluelight_minion
+from bob.data_uploader import drain_spool
 
 logger = logging.getLogger('bob.activation')
 
@@ -21,17 +23,15 @@ def download_activation_file(device_id: str):
     Returns:
         str: Path to the downloaded activation file
     """
-    ftp_client = FTPClient()
-    ftp_client.change_directory(FTP_DETAILS['target_activate'])
     remote_filename = ACTIVATION_FILENAME_PATTERN.format(device_id=device_id)
     local_filepath = os.path.join(DATA_DIR, remote_filename)
     try:
-        ftp_client.download_file(remote_filename, local_filepath)
+        with ftp_pool.lease() as ftp_client:
+            ftp_client.change_directory(FTP_DETAILS['target_activate'])
+            ftp_client.download_file(remote_filename, local_filepath)
         logger.info("Activation file downloaded: %s", local_filepath)
     except Exception as e:
         logger.error("Error downloading activation file: %s", e)
-    finally:
-        ftp_client.quit()
     return local_filepath
 
 def check_activation_status(device_id: str) -> bool:
@@ -74,16 +74,16 @@ def upload_deactivation(device_id: str):
     # Overwrite local file with a deactivation message.
     with open(local_filepath, 'w') as f:
         f.write("BOB SAYS DEACTIVATE!!!")
-    # Now upload via FTP.
-    ftp_client = FTPClient()
-    ftp_client.change_directory(FTP_DETAILS['target_activate'])
+    # Now upload via FTP. The spool keeps the notice if we are offline and
+    # sends it ahead of any bulk data once the link is back; only control
+    # notices are drained here, so the data backlog does not delay it.
     try:
-        ftp_client.upload_file(local_filepath, os.path.basename(local_filepath))
-        logger.info("Deactivation file uploaded for device %s.", device_id)
+        upload_spool.enqueue(local_filepath, FTP_DETAILS['target_activate'],
+                             priority=PRIORITY_CONTROL, delete_after=False, resume=False)
+        drain_spool(max_priority=PRIORITY_CONTROL)
+        logger.info("Deactivation file spooled for device %s.", device_id)
     except Exception as e:
         logger.error("Error uploading deactivation file: %s", e)
-    finally:
-        ftp_client.quit()
 
 def mark_extinct(device_id: str, log_filepath: str):
     """
@@ -107,11 +107,10 @@ def mark_extinct(device_id: str, log_filepath: str):
         with open(notify_filepath, "w") as f:
             f.write(f"Device {device_id} marked as EXTINCT at {datetime.datetime.now().isoformat()}")
         
-        ftp_client = FTPClient()
-        ftp_client.change_directory(FTP_DETAILS['target_up'])
-        ftp_client.upload_file(notify_filepath, os.path.basename(notify_filepath))
-        logger.info("Extinction notification uploaded for device %s.", device_id)
-        ftp_client.quit()
+        upload_spool.enqueue(notify_filepath, FTP_DETAILS['target_up'],
+                             priority=PRIORITY_CONTROL, delete_after=False, resume=False)
+        drain_spool(max_priority=PRIORITY_CONTROL)
+        logger.info("Extinction notification spooled for device %s.", device_id)
     except Exception as e:
         logger.error("Error uploading extinction notification: %s", e)
 
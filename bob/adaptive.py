@@ -0,0 +1,184 @@
+# File: bob/adaptive.py
+import os
+import json
+import math
+import datetime
+import logging
+import threading
+from bob.track import distance
+from bob.config import (SPEED_TEST_INTERVAL, SPEEDTEST_MIN_INTERVAL, SPEEDTEST_MAX_INTERVAL,
+                        SPEEDTEST_DAILY_BUDGET, SPEEDTEST_STABLE_CV, SPEEDTEST_UNSTABLE_CV,
+                        SPEEDTEST_MOVE_DISTANCE, ADAPTIVE_STATE_FILE)
+
+logger = logging.getLogger('bob.adaptive')
+
+# EWMA smoothing factor for the download speeds the policy watches
+_ALPHA = 0.3
+# Results needed before the variance is trusted
+_MIN_SAMPLES = 3
+
+
+class AdaptiveInterval:
+    """
+    Interval policy for the speedtest task (see Scheduler.add_task).
+
+    After every test the interval is:
+      - reset to ``min_interval`` when the GPS shows the device has moved
+        more than ``move_distance`` metres since the previous test,
+      - halved when the coefficient of variation of recent download speeds
+        (EW standard deviation / EWMA) exceeds ``unstable_cv``,
+      - grown by half when it is below ``stable_cv``,
+    and kept between ``min_interval`` and ``max_interval``. The daily budget
+    then takes precedence: the interval is stretched so the remaining tests
+    last until UTC midnight, and once the budget is spent the next test waits
+    for the next day. Today's test count is persisted across restarts.
+
+    The speedtest stage calls ``record_test()`` whenever a test actually
+    ran; cycles skipped while offline or over the data cap neither use the
+    budget nor move the interval.
+    """
+    def __init__(self, gps_reader=None, initial=None, min_interval=None, max_interval=None,
+                 daily_budget=None, stable_cv=None, unstable_cv=None, move_distance=None,
+                 state_path=None):
+        """
+        Args:
+            gps_reader (GPSReader): Source of the device position; None disables motion checks
+            initial (float): Starting interval in seconds
+            min_interval (float): Shortest interval
+            max_interval (float): Longest interval (unless the budget needs longer)
+            daily_budget (int): Tests per UTC day; 0 for no limit
+            stable_cv (float): Variation below which the interval grows
+            unstable_cv (float): Variation above which the interval shrinks
+            move_distance (float): Metres of movement that trigger a short interval
+            state_path (str): File holding today's test count
+        """
+        self.gps_reader = gps_reader
+        self.min_interval = min_interval or SPEEDTEST_MIN_INTERVAL
+        self.max_interval = max_interval or SPEEDTEST_MAX_INTERVAL
+        self.interval = min(max(initial or SPEED_TEST_INTERVAL, self.min_interval),
+                            self.max_interval)
+        self.daily_budget = SPEEDTEST_DAILY_BUDGET if daily_budget is None else daily_budget
+        self.stable_cv = SPEEDTEST_STABLE_CV if stable_cv is None else stable_cv
+        self.unstable_cv = SPEEDTEST_UNSTABLE_CV if unstable_cv is None else unstable_cv
+        self.move_distance = move_distance or SPEEDTEST_MOVE_DISTANCE
+        self.state_path = state_path or ADAPTIVE_STATE_FILE
+        self._mean = None
+        self._var = 0.0
+        self._samples = 0
+        self._position = None
+        self._tested = False
+        self._lock = threading.Lock()
+        self.day, self.tests_today = self._load()
+
+    def _load(self):
+        today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+            if state.get('day') == today:
+                return today, state.get('tests', 0)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Ignoring unreadable adaptive state %s: %s", self.state_path, e)
+        return today, 0
+
+    def _save(self):
+        tmp_path = self.state_path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'day': self.day, 'tests': self.tests_today}, f)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            logger.error("Failed to save adaptive state to %s: %s", self.state_path, e)
+
+    def _roll_day(self, now):
+        today = now.date().isoformat()
+        if today != self.day:
+            self.day, self.tests_today = today, 0
+
+    def record_test(self):
+        """Count a test that ran, including one cut short by a timeout or error."""
+        with self._lock:
+            self._roll_day(datetime.datetime.now(datetime.timezone.utc))
+            self.tests_today += 1
+            self._tested = True
+            self._save()
+
+    def observe(self, download):
+        """Feed a download speed from a finished test."""
+        with self._lock:
+            self._samples += 1
+            if self._mean is None:
+                self._mean = download
+                return
+            diff = download - self._mean
+            increment = _ALPHA * diff
+            self._mean += increment
+            self._var = (1 - _ALPHA) * (self._var + diff * increment)
+
+    def variation(self):
+        """
+        Returns:
+            float: EW coefficient of variation of download speed, or None if not known yet
+        """
+        if self._samples < _MIN_SAMPLES or not self._mean:
+            return None
+        return math.sqrt(self._var) / self._mean
+
+    def _moved(self):
+        if self.gps_reader is None:
+            return False
+        fix = self.gps_reader.latest()
+        if fix is None:
+            return False
+        position = (fix.latitude, fix.longitude)
+        previous, self._position = self._position, position
+        return previous is not None and distance(previous, position) > self.move_distance
+
+    def _budget_floor(self, now):
+        """Shortest interval that keeps today's tests within the daily budget."""
+        if not self.daily_budget:
+            return 0.0
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1),
+                                             datetime.time(), tzinfo=datetime.timezone.utc)
+        until_midnight = (midnight - now).total_seconds()
+        remaining = self.daily_budget - self.tests_today
+        if remaining <= 0:
+            return until_midnight + 1
+        return until_midnight / remaining
+
+    def __call__(self, task=None):
+        """
+        Return the interval until the next test. The interval only adapts
+        after a cycle in which a test ran.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            self._roll_day(now)
+            tested, self._tested = self._tested, False
+
+            cv = self.variation()
+            if not tested:
+                interval, reason = self.interval, None
+            elif self._moved():
+                interval, reason = self.min_interval, "device moved"
+            elif cv is not None and cv > self.unstable_cv:
+                interval, reason = self.interval / 2, f"unstable (cv {cv:.2f})"
+            elif cv is not None and cv < self.stable_cv:
+                interval, reason = self.interval * 1.5, f"stable (cv {cv:.2f})"
+            else:
+                interval, reason = self.interval, None
+            interval = min(max(interval, self.min_interval), self.max_interval)
+            floor = self._budget_floor(now)
+            if floor > interval:
+                interval, reason = floor, (f"daily budget ({self.tests_today}/"
+                                           f"{self.daily_budget} tests used)")
+            interval = round(interval)
+            if interval != self.interval and reason:
+                logger.info("Speedtest interval %ss -> %ss: %s", self.interval, interval, reason)
+            if floor <= self.max_interval:
+                # Don't carry a budget-stretched interval into tomorrow.
+                self.interval = interval
+            return interval
@@ -0,0 +1,221 @@
+# File: bob/bandwidth.py
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from bob.config import (BANDWIDTH_RATE_LIMIT, BANDWIDTH_BURST, QUIET_BEFORE_MEASUREMENT,
+                        QUIET_AFTER_MEASUREMENT, QUIET_MAX_WAIT, BANDWIDTH_STATE_FILE)
+
+logger = logging.getLogger('bob.bandwidth')
+
+# Seconds between checks of another process's measurement state
+STATE_POLL_INTERVAL = 1.0
+# A measurement state older than this is left over from a crashed process
+STATE_STALE_AFTER = 3600
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by every thread moving data. Callers
+    may overdraw the bucket; they then sleep until the debt is paid back, so
+    the long-run rate never exceeds ``rate`` bytes per second.
+    """
+    def __init__(self, rate, burst):
+        """
+        Args:
+            rate (float): Bytes per second; 0 disables limiting
+            burst (int): Bucket size in bytes
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= nbytes
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+
+
+class Measurement:
+    """Outcome of a measurement window: whether background traffic overlapped it."""
+    __slots__ = ('overlap', 'overlap_bytes', 'waited')
+
+    def __init__(self):
+        self.overlap = False
+        self.overlap_bytes = 0
+        self.waited = 0.0
+
+
+class BandwidthCoordinator:
+    """
+    Keeps background transfers (uploads, activation and update downloads) off
+    the link while a speedtest runs, and rate limits them otherwise.
+
+    Background traffic wraps each transfer in ``transfer()`` and reports the
+    bytes it moves through ``throttle()``. A measurement wrapped in
+    ``measurement()`` blocks new transfers, waits for running ones to finish
+    and for the link to stay idle ``quiet_before`` seconds, and keeps
+    transfers paused for ``quiet_after`` seconds once it ends. If a transfer
+    is still running after ``max_wait`` seconds the measurement goes ahead
+    and is flagged as overlapped.
+
+    Measurements are also published to ``state_file`` so transfers in other
+    processes (the updater runs separately) wait out the measurement and
+    its quiet window too. Their bytes are not seen by this process, so they
+    cannot flag a measurement as overlapped.
+
+    Usage:
+        with bandwidth.measurement() as m:
+            result = engine.run()
+        overlapped = m.overlap
+    """
+    def __init__(self, rate_limit=None, burst=None, quiet_before=None, quiet_after=None,
+                 max_wait=None, state_file=None):
+        """
+        Args:
+            rate_limit (float): Background transfer limit in bytes per second; 0 for none
+            burst (int): Token bucket size in bytes
+            quiet_before (float): Idle seconds required before a measurement starts
+            quiet_after (float): Seconds transfers stay paused after a measurement
+            max_wait (float): Longest a measurement waits for running transfers
+            state_file (str): File sharing measurement state between processes
+        """
+        self.bucket = TokenBucket(BANDWIDTH_RATE_LIMIT if rate_limit is None else rate_limit,
+                                  burst or BANDWIDTH_BURST)
+        self.quiet_before = QUIET_BEFORE_MEASUREMENT if quiet_before is None else quiet_before
+        self.quiet_after = QUIET_AFTER_MEASUREMENT if quiet_after is None else quiet_after
+        self.max_wait = QUIET_MAX_WAIT if max_wait is None else max_wait
+        self.state_file = state_file or BANDWIDTH_STATE_FILE
+        self._condition = threading.Condition()
+        self._active = 0
+        self._last_transfer_end = float('-inf')
+        self._quiet_until = 0.0
+        self._measurements = []
+        self._measuring = 0
+
+    def _publish(self, measuring):
+        """Write this process's measurement state for transfers in other processes."""
+        state = {'pid': os.getpid(), 'measuring': measuring, 'since': time.time(),
+                 'quiet_until': time.time() + max(0.0, self._quiet_until - time.monotonic())}
+        tmp_path = self.state_file + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            logger.warning("Could not publish measurement state to %s: %s", self.state_file, e)
+
+    def _held_elsewhere(self):
+        """
+        Returns:
+            float: Seconds to hold a transfer back for a measurement running in
+            another process, or 0 if there is none
+        """
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0.0
+        now = time.time()
+        if state.get('pid') == os.getpid() or now - state.get('since', 0) > STATE_STALE_AFTER:
+            return 0.0
+        if state.get('measuring') and _pid_alive(state['pid']):
+            return STATE_POLL_INTERVAL
+        return max(0.0, state.get('quiet_until', 0) - now)
+
+    @contextmanager
+    def transfer(self, label='transfer'):
+        """Run a background transfer once no measurement or quiet window is in progress."""
+        start = time.monotonic()
+        while True:
+            delay = self._held_elsewhere()
+            if not delay:
+                break
+            time.sleep(min(delay, STATE_POLL_INTERVAL))
+        with self._condition:
+            while self._measuring or time.monotonic() < self._quiet_until:
+                if self._measuring:
+                    self._condition.wait()
+                else:
+                    self._condition.wait(self._quiet_until - time.monotonic())
+            waited = time.monotonic() - start
+            self._active += 1
+        if waited >= 1:
+            logger.info("%s held back %.1fs for a measurement.", label, waited)
+        try:
+            yield self
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._last_transfer_end = time.monotonic()
+                self._condition.notify_all()
+
+    def throttle(self, nbytes):
+        """Account for nbytes of background traffic, sleeping as the rate limit requires."""
+        if self._measurements:
+            with self._condition:
+                for m in self._measurements:
+                    m.overlap = True
+                    m.overlap_bytes += nbytes
+        self.bucket.consume(nbytes)
+
+    @contextmanager
+    def measurement(self):
+        """Hold background traffic for the duration of a measurement."""
+        m = Measurement()
+        with self._condition:
+            self._measuring += 1
+            self._publish(True)
+            start = time.monotonic()
+            deadline = start + self.max_wait
+            while True:
+                now = time.monotonic()
+                idle_for = now - self._last_transfer_end
+                if not self._active and idle_for >= self.quiet_before:
+                    break
+                if now >= deadline:
+                    if self._active:
+                        logger.warning("Background transfers still running after %.0fs; "
+                                       "measuring anyway.", self.max_wait)
+                    break
+                if self._active:
+                    self._condition.wait(deadline - now)
+                else:
+                    self._condition.wait(min(deadline, now + self.quiet_before - idle_for) - now)
+            m.waited = time.monotonic() - start
+            m.overlap = self._active > 0
+            self._measurements.append(m)
+        try:
+            yield m
+        finally:
+            with self._condition:
+                self._measurements.remove(m)
+                self._measuring -= 1
+                self._quiet_until = max(self._quiet_until, time.monotonic() + self.quiet_after)
+                self._publish(self._measuring > 0)
+                self._condition.notify_all()
+
+
+# Shared coordinator used by the FTP client and the speedtest stage.
+bandwidth = BandwidthCoordinator()
@@ -0,0 +1,135 @@
+# File: bob/compression.py
+import time
+import zlib
+import logging
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available.
+    zstandard = None
+
+logger = logging.getLogger('bob.compression')
+
+# Codec name -> extension appended to the remote filename
+CODEC_EXTENSIONS = {
+    'none': '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+def resolve_codec(codec):
+    """
+    Return the codec to actually use, falling back to gzip when zstd is
+    requested but the zstandard package is not installed.
+    """
+    if codec not in CODEC_EXTENSIONS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    if codec == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed; using gzip instead of zstd.")
+        return 'gzip'
+    return codec
+
+
+def _make_compressor(codec, level):
+    if codec == 'gzip':
+        # wbits=31 writes a gzip header (with a zero mtime, so output is deterministic).
+        return zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+    return None
+
+
+class CompressingReader:
+    """
+    File-like wrapper that compresses another file chunk by chunk as it is
+    read, so ``ftplib.storbinary`` can send compressed data without a second
+    copy being staged on disk. With codec 'none' data passes through unchanged.
+
+    Compression output is deterministic for a given codec and level, which
+    lets an interrupted upload resume by skipping the bytes already sent.
+    """
+    def __init__(self, raw, codec='gzip', level=None, chunk_size=65536):
+        """
+        Args:
+            raw: Binary file object to read from
+            codec (str): 'none', 'gzip' or 'zstd'
+            level (int): Compression level; codec default if None
+            chunk_size (int): Bytes read from raw per compression step
+        """
+        self.raw = raw
+        self.codec = codec
+        self.chunk_size = chunk_size
+        self._compressor = _make_compressor(codec, level)
+        self._buffer = bytearray()
+        self._eof = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    def _fill(self, size):
+        """Compress more input until at least size bytes are buffered or input ends."""
+        while (size < 0 or len(self._buffer) < size) and not self._eof:
+            chunk = self.raw.read(self.chunk_size)
+            start = time.thread_time()
+            if chunk:
+                self.bytes_in += len(chunk)
+                out = self._compressor.compress(chunk) if self._compressor else chunk
+            else:
+                self._eof = True
+                out = self._compressor.flush() if self._compressor else b''
+            self.cpu_time += time.thread_time() - start
+            self._buffer += out
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        self._fill(size)
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.bytes_out += len(data)
+        return data
+
+    def skip(self, count):
+        """
+        Discard the first count bytes of output (e.g. already on the server).
+
+        Returns:
+            int: Number of bytes actually skipped (less than count at end of stream)
+        """
+        if self._compressor is None and not self._buffer:
+            # Uncompressed: seek instead of reading.
+            start = self.raw.tell()
+            end = self.raw.seek(0, 2)
+            target = min(start + count, end)
+            self.raw.seek(target)
+            self.bytes_in += target - start
+            self.bytes_out += target - start
+            return target - start
+        skipped = 0
+        while skipped < count:
+            data = self.read(min(self.chunk_size, count - skipped))
+            if not data:
+                break
+            skipped += len(data)
+        return skipped
+
+    def exhausted(self):
+        """Return True if no more output remains."""
+        self._fill(1)
+        return not self._buffer
+
+    def stats(self):
+        """
+        Returns:
+            dict: Input/output byte counts, compression ratio and CPU seconds
+        """
+        return {
+            'codec': self.codec,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': (self.bytes_out / self.bytes_in) if self.bytes_in else 1.0,
+            'cpu_time': self.cpu_time,
+        }
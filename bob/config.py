@@ -4,6 +4,7 @@ import os
 import configparser
 import socket
 import re
+import ipaddress
 from pathlib import Path
 
 # Import the base logger without configuration dependencies
@@ -23,7 +24,12 @@ DEFAULT_CONFIG = {
         'pass': 'password',
         'target_down': '/download_dir',
         'target_up': '/upload_dir',
-        'target_activate': '/activate_dir'
+        'target_activate': '/activate_dir',
+        'timeout': '30',               # socket timeout in seconds
+        'pool_size': '1',              # FTPS connections kept open by the pool
+        'keepalive_interval': '60',    # seconds between NOOPs on idle connections
+        'idle_timeout': '1800',        # close pooled connections idle this long
+        'resume_uploads': 'true'       # send only the missing tail of interrupted uploads
     },
     'logging': {
         'LOG_DIR': 'logs/',
@@ -33,12 +39,115 @@ DEFAULT_CONFIG = {
     },
     'speedtest': {
         'SPEED_TEST_INTERVAL': '300',  # default is 300 seconds (5 minutes)
-        'SPEEDTEST_TARGET_VERSION': '2.1.1'
+        'SPEEDTEST_TARGET_VERSION': '2.1.1',
+        'SPEEDTEST_CONFIG_TTL': '21600',     # re-download config/server list every 6 hours
+        'SPEEDTEST_RERANK_FACTOR': '2.0',    # re-rank when latency doubles vs. baseline
+        'SPEEDTEST_CANDIDATE_SERVERS': '5',
+        'SPEEDTEST_ISOLATED': 'true',        # run speedtests in a worker process under hard deadlines
+        'SPEEDTEST_SETUP_TIMEOUT': '60',     # seconds for config download and server selection
+        'SPEEDTEST_DOWNLOAD_TIMEOUT': '60',
+        'SPEEDTEST_UPLOAD_TIMEOUT': '60',
+        'SPEEDTEST_TOTAL_TIMEOUT': '150',
+        'SPEEDTEST_BACKEND': 'speedtest-cli'  # 'speedtest-cli' or 'native' (bob.throughput)
+    },
+    'throughput': {
+        'THROUGHPUT_SERVER': '',              # host running `python -m bob.throughput serve`
+        'THROUGHPUT_PORT': '5210',
+        'THROUGHPUT_STREAMS': '4',            # parallel TCP connections per direction
+        'THROUGHPUT_DURATION': '10',          # longest time per direction in seconds
+        'THROUGHPUT_MAX_MB': '50',            # byte budget per direction in MB
+        'THROUGHPUT_STABLE_WINDOW': '2',      # seconds of steady throughput that end a direction early
+        'THROUGHPUT_STABLE_TOLERANCE': '0.05' # largest relative change between the window's halves
+    },
+    'upload': {
+        'UPLOAD_WORKERS': '1',             # concurrent FTPS connections used to drain the spool
+        'SPOOL_BACKOFF_BASE': '30',        # retry delay after a failed upload, doubled per attempt
+        'SPOOL_BACKOFF_MAX': '3600',
+        'UPLOAD_COMPRESSION': 'none',      # 'none', 'gzip' or 'zstd' (falls back to gzip)
+        'UPLOAD_COMPRESSION_LEVEL': ''     # empty for the codec's default level
+    },
+    'bandwidth': {
+        'BANDWIDTH_RATE_LIMIT': '0',         # background FTP transfer limit in KB/s; 0 for none
+        'BANDWIDTH_BURST': '64',             # token bucket size in KB
+        'QUIET_BEFORE_MEASUREMENT': '5',     # idle seconds required before a speedtest
+        'QUIET_AFTER_MEASUREMENT': '2',      # seconds transfers stay paused after a speedtest
+        'QUIET_MAX_WAIT': '120'              # longest a speedtest waits for running transfers
+    },
+    'connectivity': {
+        'CONNECTIVITY_TTL': '30',            # seconds an online/offline verdict is reused
+        'CONNECTIVITY_TIMEOUT': '3',         # seconds allowed for one concurrent check
+        'PUBLIC_IP_PROVIDERS': 'https://api.ipify.org,https://checkip.amazonaws.com,https://icanhazip.com',
+        'PUBLIC_IP_TTL': '300',              # seconds a resolved public IP is reused
+        'HTTP_POOL_SIZE': '8'                # pooled connections per host for bob's HTTP calls
+    },
+    'latency': {
+        'LATENCY_PROBING': 'false',          # sample RTT in the background between speedtests
+        'LATENCY_TARGETS': '1.1.1.1:443,8.8.8.8:443,9.9.9.9:443',  # host:port pairs probed by TCP connect
+        'LATENCY_INTERVAL': '5',             # seconds between probe rounds
+        'LATENCY_TIMEOUT': '2',              # seconds before a probe counts as lost
+        'LATENCY_BUFFER_SIZE': '4096',       # samples kept in memory
+        'LATENCY_ICMP': 'false',             # also send ICMP echoes (unprivileged ping sockets)
+        'LATENCY_SUMMARY_INTERVAL': '300'    # seconds between summary files
+    },
+    'datacap': {
+        'DATA_CAP_MB': '0',                     # monthly data budget in MB; 0 to only account usage
+        'DATA_CAP_RESET_DAY': '1',              # day of the month the billing period starts (1-28)
+        'DATA_CAP_SPEEDTEST_UPLOAD_AT': '0.8',  # share of the budget after which speedtests skip the upload phase
+        'DATA_CAP_RAW_UPLOAD_AT': '0.9',        # ... raw data segments are held back (summaries still go)
+        'DATA_CAP_SPEEDTEST_AT': '1.0',         # ... speedtests stop
+        'DATA_ACCOUNTING_INTERFACES': ''        # comma-separated interfaces to count; empty for all but lo
+    },
+    'tiles': {
+        'TILE_SUMMARY_MODE': 'off',   # 'off', 'alongside' raw geo data, or 'only' (raw geo kept locally)
+        'TILE_SCHEME': 'geohash',     # 'geohash' or 'grid'
+        'TILE_PRECISION': '6',        # geohash characters (6 is about 1.2 km x 0.6 km)
+        'TILE_GRID_SIZE': '0.01',     # grid cell size in degrees
+        'TILE_PERSIST_INTERVAL': '300'
+    },
+    'stats': {
+        'STATS_SUMMARY_MODE': 'off',  # 'off', 'alongside' raw speed data, or 'only' (raw speed kept locally)
+        'STATS_WINDOWS': '3600,86400',  # window sizes in seconds (hourly and daily)
+        'STATS_EWMA_ALPHA': '0.2'
     },
     'gps': {
         'GPS_PORT': '/dev/ttyAMA0',
         'GPS_BAUDRATE': '9600',
-        'GPS_TIMEOUT': '1'
+        'GPS_TIMEOUT': '1',
+        'GPS_BUFFER_SIZE': '3600',   # fixes kept in memory by the background reader
+        'GPS_TRACK_COMPRESSION': 'false',  # record every fix, thinned, instead of one per GPS_INTERVAL
+        'GPS_TRACK_MIN_DISTANCE': '5',     # metres moved before another fix is kept
+        'GPS_TRACK_MAX_INTERVAL': '300',   # keep a fix at least this often (seconds) when stationary
+        'GPS_TRACK_TOLERANCE': '5',        # Douglas-Peucker error bound in metres
+        'GPS_TRACK_WINDOW': '120',         # fixes simplified at a time
+        'GPS_TRACK_ENCODING': 'false',     # store GPS rows delta/varint encoded (.trk)
+        'GEO_JOIN_METHOD': 'interpolate',  # locate speedtests by 'nearest' fix or 'interpolate'
+        'GEO_JOIN_MAX_ERROR': '30'         # seconds; no geotag if the fixes are further away
+    },
+    'storage': {
+        'STORAGE_BACKEND': 'csv',     # 'csv' or 'binary' (struct-packed .rec record log)
+        'DURABILITY_POLICY': 'row',   # 'row', 'count', 'interval' or 'shutdown'
+        'COMMIT_EVERY_ROWS': '10',
+        'COMMIT_INTERVAL': '60',
+        'COMMIT_FSYNC': 'false',
+        'SEGMENT_MAX_AGE': '3600',       # seal live data files every hour...
+        'SEGMENT_MAX_BYTES': '1048576'   # ...or once they reach 1 MB
+    },
+    'scheduler': {
+        'GPS_INTERVAL': '30',
+        'UPLOAD_INTERVAL': '900',
+        'EXTINCTION_CHECK_INTERVAL': '60',
+        'SCHEDULER_MAX_WORKERS': '4',
+        'SCHEDULER_MODE': 'deadline',  # 'deadline' (drift-free) or 'delay' (sleep after each run)
+        'SCHEDULER_JITTER': '0',       # max random offset in seconds added to each deadline
+        'SCHEDULER_SHUTDOWN_TIMEOUT': '10',  # seconds in-flight stages get to finish at shutdown
+        'SCHEDULER_METRICS_INTERVAL': '60',  # seconds between metrics file writes; 0 for shutdown only
+        'SPEEDTEST_ADAPTIVE': 'false',     # vary the speedtest interval with variance and motion
+        'SPEEDTEST_MIN_INTERVAL': '120',
+        'SPEEDTEST_MAX_INTERVAL': '1800',
+        'SPEEDTEST_DAILY_BUDGET': '288',   # tests per UTC day; 0 for no limit
+        'SPEEDTEST_STABLE_CV': '0.1',      # lengthen the interval below this download variation
+        'SPEEDTEST_UNSTABLE_CV': '0.3',    # shorten it above this
+        'SPEEDTEST_MOVE_DISTANCE': '500'   # metres moved between tests that reset to the minimum
     },
     'survey': {
         'SURVEY_URL': 'https://survey.example.com'
@@ -133,6 +242,103 @@ def is_positive_int(value):
     """Check if the value is a positive integer"""
     return value > 0
 
+def is_positive_number(value):
+    """Check if the value is greater than zero"""
+    return value > 0
+
+def is_non_negative_number(value):
+    """Check if the value is zero or a positive number"""
+    return value >= 0
+
+def is_valid_scheduler_mode(mode):
+    """Check if the scheduler mode is supported"""
+    return mode in ('deadline', 'delay')
+
+def is_valid_durability_policy(policy):
+    """Check if the storage durability policy is supported"""
+    return policy in ('row', 'count', 'interval', 'shutdown')
+
+def is_valid_compression(codec):
+    """Check if the upload compression codec is supported"""
+    return codec in ('none', 'gzip', 'zstd')
+
+def is_valid_join_method(method):
+    """Check if the speedtest/GPS join method is supported"""
+    return method in ('nearest', 'interpolate')
+
+def is_valid_tile_scheme(scheme):
+    """Check if the coverage tile scheme is supported"""
+    return scheme in ('geohash', 'grid')
+
+def is_valid_summary_mode(mode):
+    """Check if the summary upload mode is supported"""
+    return mode in ('off', 'alongside', 'only')
+
+def is_valid_smoothing_factor(value):
+    """Check if the value is a valid EWMA smoothing factor"""
+    return 0 < value <= 1
+
+def is_valid_window_list(sizes):
+    """Check if the value is a non-empty list of positive window sizes"""
+    return bool(sizes) and all(size > 0 for size in sizes)
+
+def to_int_list(value):
+    """Convert a comma-separated string to a list of integers"""
+    return [int(item) for item in value.split(',')]
+
+def is_valid_speedtest_backend(backend):
+    """Check if the speedtest backend is supported"""
+    return backend in ('speedtest-cli', 'native')
+
+def is_valid_host(host):
+    """Check if the value is a host name or IP address without a port"""
+    if not host or any(c.isspace() for c in host):
+        return False
+    if ':' in host:
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            return False
+    return True
+
+def is_valid_tcp_port(port):
+    """Check if the value is a valid TCP port number"""
+    return 0 < port < 65536
+
+def to_target_list(value):
+    """Convert a comma-separated list of host:port pairs to (host, port) tuples"""
+    targets = []
+    for item in to_str_list(value):
+        host, port = item.rsplit(':', 1)
+        targets.append((host, int(port)))
+    return targets
+
+def is_valid_target_list(targets):
+    """Check if the value is a non-empty list of (host, port) pairs"""
+    return bool(targets) and all(host and is_valid_tcp_port(port) for host, port in targets)
+
+def is_valid_reset_day(day):
+    """Check if the value is a day that exists in every month"""
+    return 1 <= day <= 28
+
+def to_str_list(value):
+    """Convert a comma-separated string to a list of non-empty strings"""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def is_valid_storage_backend(backend):
+    """Check if the storage backend is supported"""
+    return backend in ('csv', 'binary')
+
+def to_bool(value):
+    """Convert a config/environment string such as 'true' or '0' to a bool"""
+    if isinstance(value, bool):
+        return value
+    if value.strip().lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if value.strip().lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f"not a boolean: {value}")
+
 def is_valid_version(version):
     """Check if the version string has the format X.Y.Z"""
     return bool(re.match(r'^\d+\.\d+\.\d+$', version))
@@ -156,7 +362,7 @@ def is_valid_baudrate(rate):
 
 # Load the configuration file
 config_file_path = get_config_path()
-config = configparser.ConfigParser()
+config = configparser.ConfigParser(inline_comment_prefixes=(';',))
 config.read_dict(DEFAULT_CONFIG)  # load defaults first
 
 try:
@@ -214,7 +420,7 @@ LOG_BACKUP_COUNT = get_env_var(
 # Speedtest configuration
 SPEED_TEST_INTERVAL = get_env_var(
     'SPEED_TEST_INTERVAL', 
-    config.get('speedtest', 'SPEED_TEST_INTERVAL'),
+    config.getint('speedtest', 'SPEED_TEST_INTERVAL'),
     validator=is_positive_int,
     converter=int
 )
@@ -223,6 +429,104 @@ SPEEDTEST_TARGET_VERSION = get_env_var(
     config.get('speedtest', 'SPEEDTEST_TARGET_VERSION'),
     validator=is_valid_version
 )
+SPEEDTEST_CONFIG_TTL = get_env_var(
+    'SPEEDTEST_CONFIG_TTL',
+    config.getint('speedtest', 'SPEEDTEST_CONFIG_TTL'),
+    validator=is_positive_int,
+    converter=int
+)
+SPEEDTEST_RERANK_FACTOR = get_env_var(
+    'SPEEDTEST_RERANK_FACTOR',
+    config.getfloat('speedtest', 'SPEEDTEST_RERANK_FACTOR'),
+    validator=is_positive_number,
+    converter=float
+)
+SPEEDTEST_CANDIDATE_SERVERS = get_env_var(
+    'SPEEDTEST_CANDIDATE_SERVERS',
+    config.getint('speedtest', 'SPEEDTEST_CANDIDATE_SERVERS'),
+    validator=is_positive_int,
+    converter=int
+)
+SPEEDTEST_ISOLATED = get_env_var(
+    'SPEEDTEST_ISOLATED',
+    config.getboolean('speedtest', 'SPEEDTEST_ISOLATED'),
+    converter=to_bool
+)
+SPEEDTEST_SETUP_TIMEOUT = get_env_var(
+    'SPEEDTEST_SETUP_TIMEOUT',
+    config.getfloat('speedtest', 'SPEEDTEST_SETUP_TIMEOUT'),
+    validator=is_positive_number,
+    converter=float
+)
+SPEEDTEST_DOWNLOAD_TIMEOUT = get_env_var(
+    'SPEEDTEST_DOWNLOAD_TIMEOUT',
+    config.getfloat('speedtest', 'SPEEDTEST_DOWNLOAD_TIMEOUT'),
+    validator=is_positive_number,
+    converter=float
+)
+SPEEDTEST_UPLOAD_TIMEOUT = get_env_var(
+    'SPEEDTEST_UPLOAD_TIMEOUT',
+    config.getfloat('speedtest', 'SPEEDTEST_UPLOAD_TIMEOUT'),
+    validator=is_positive_number,
+    converter=float
+)
+SPEEDTEST_TOTAL_TIMEOUT = get_env_var(
+    'SPEEDTEST_TOTAL_TIMEOUT',
+    config.getfloat('speedtest', 'SPEEDTEST_TOTAL_TIMEOUT'),
+    validator=is_positive_number,
+    converter=float
+)
+SPEEDTEST_BACKEND = get_env_var(
+    'SPEEDTEST_BACKEND',
+    config.get('speedtest', 'SPEEDTEST_BACKEND'),
+    validator=is_valid_speedtest_backend
+)
+
+# Native multi-stream throughput test (SPEEDTEST_BACKEND=native)
+THROUGHPUT_SERVER = get_env_var(
+    'THROUGHPUT_SERVER',
+    config.get('throughput', 'THROUGHPUT_SERVER').strip(),
+    validator=is_valid_host
+)
+if SPEEDTEST_BACKEND == 'native' and not is_valid_host(THROUGHPUT_SERVER):
+    raise ValueError("SPEEDTEST_BACKEND=native needs THROUGHPUT_SERVER set to the host "
+                     f"running `python -m bob.throughput serve` (got '{THROUGHPUT_SERVER}')")
+THROUGHPUT_PORT = get_env_var(
+    'THROUGHPUT_PORT',
+    config.getint('throughput', 'THROUGHPUT_PORT'),
+    validator=is_valid_tcp_port,
+    converter=int
+)
+THROUGHPUT_STREAMS = get_env_var(
+    'THROUGHPUT_STREAMS',
+    config.getint('throughput', 'THROUGHPUT_STREAMS'),
+    validator=is_positive_int,
+    converter=int
+)
+THROUGHPUT_DURATION = get_env_var(
+    'THROUGHPUT_DURATION',
+    config.getfloat('throughput', 'THROUGHPUT_DURATION'),
+    validator=is_positive_number,
+    converter=float
+)
+THROUGHPUT_MAX_BYTES = int(get_env_var(
+    'THROUGHPUT_MAX_MB',
+    config.getfloat('throughput', 'THROUGHPUT_MAX_MB'),
+    validator=is_positive_number,
+    converter=float
+) * 1048576)
+THROUGHPUT_STABLE_WINDOW = get_env_var(
+    'THROUGHPUT_STABLE_WINDOW',
+    config.getfloat('throughput', 'THROUGHPUT_STABLE_WINDOW'),
+    validator=is_positive_number,
+    converter=float
+)
+THROUGHPUT_STABLE_TOLERANCE = get_env_var(
+    'THROUGHPUT_STABLE_TOLERANCE',
+    config.getfloat('throughput', 'THROUGHPUT_STABLE_TOLERANCE'),
+    validator=is_positive_number,
+    converter=float
+)
 
 # FTP details - with validation
 FTP_DETAILS = {
@@ -258,6 +562,72 @@ FTP_DETAILS = {
     )
 }
 
+# FTP connection pool
+FTP_TIMEOUT = get_env_var(
+    'FTP_TIMEOUT',
+    config.getint('ftp', 'timeout'),
+    validator=is_positive_int,
+    converter=int
+)
+FTP_POOL_SIZE = get_env_var(
+    'FTP_POOL_SIZE',
+    config.getint('ftp', 'pool_size'),
+    validator=is_positive_int,
+    converter=int
+)
+FTP_KEEPALIVE_INTERVAL = get_env_var(
+    'FTP_KEEPALIVE_INTERVAL',
+    config.getint('ftp', 'keepalive_interval'),
+    validator=is_positive_int,
+    converter=int
+)
+FTP_IDLE_TIMEOUT = get_env_var(
+    'FTP_IDLE_TIMEOUT',
+    config.getint('ftp', 'idle_timeout'),
+    validator=is_positive_int,
+    converter=int
+)
+FTP_RESUME_UPLOADS = get_env_var(
+    'FTP_RESUME_UPLOADS',
+    config.getboolean('ftp', 'resume_uploads'),
+    converter=to_bool
+)
+UPLOAD_MANIFEST_FILE = os.path.join(DATA_DIR, 'upload_manifest.json')
+
+# Upload spool (durable store-and-forward queue for outgoing files)
+SPOOL_DB_FILE = os.path.join(DATA_DIR, 'spool.db')
+SPOOL_BACKOFF_BASE = get_env_var(
+    'SPOOL_BACKOFF_BASE',
+    config.getint('upload', 'SPOOL_BACKOFF_BASE'),
+    validator=is_positive_int,
+    converter=int
+)
+SPOOL_BACKOFF_MAX = get_env_var(
+    'SPOOL_BACKOFF_MAX',
+    config.getint('upload', 'SPOOL_BACKOFF_MAX'),
+    validator=is_positive_int,
+    converter=int
+)
+UPLOAD_WORKERS = get_env_var(
+    'UPLOAD_WORKERS',
+    config.getint('upload', 'UPLOAD_WORKERS'),
+    validator=is_positive_int,
+    converter=int
+)
+
+# Upload compression
+UPLOAD_COMPRESSION = get_env_var(
+    'UPLOAD_COMPRESSION',
+    config.get('upload', 'UPLOAD_COMPRESSION'),
+    validator=is_valid_compression
+)
+UPLOAD_COMPRESSION_LEVEL = get_env_var(
+    'UPLOAD_COMPRESSION_LEVEL',
+    config.getint('upload', 'UPLOAD_COMPRESSION_LEVEL')
+    if config.get('upload', 'UPLOAD_COMPRESSION_LEVEL').strip() else None,
+    converter=int
+)
+
 # GPS configuration
 GPS_PORT = get_env_var(
     'GPS_PORT', 
@@ -272,10 +642,392 @@ GPS_BAUDRATE = get_env_var(
 )
 GPS_TIMEOUT = get_env_var(
     'GPS_TIMEOUT', 
-    config.get('gps', 'GPS_TIMEOUT'),
+    config.getint('gps', 'GPS_TIMEOUT'),
+    validator=is_positive_int,
+    converter=int
+)
+GPS_BUFFER_SIZE = get_env_var(
+    'GPS_BUFFER_SIZE',
+    config.getint('gps', 'GPS_BUFFER_SIZE'),
+    validator=is_positive_int,
+    converter=int
+)
+GPS_TRACK_COMPRESSION = get_env_var(
+    'GPS_TRACK_COMPRESSION',
+    config.getboolean('gps', 'GPS_TRACK_COMPRESSION'),
+    converter=to_bool
+)
+GPS_TRACK_MIN_DISTANCE = get_env_var(
+    'GPS_TRACK_MIN_DISTANCE',
+    config.getfloat('gps', 'GPS_TRACK_MIN_DISTANCE'),
+    validator=is_non_negative_number,
+    converter=float
+)
+GPS_TRACK_MAX_INTERVAL = get_env_var(
+    'GPS_TRACK_MAX_INTERVAL',
+    config.getfloat('gps', 'GPS_TRACK_MAX_INTERVAL'),
+    validator=is_non_negative_number,
+    converter=float
+)
+GPS_TRACK_TOLERANCE = get_env_var(
+    'GPS_TRACK_TOLERANCE',
+    config.getfloat('gps', 'GPS_TRACK_TOLERANCE'),
+    validator=is_non_negative_number,
+    converter=float
+)
+GPS_TRACK_WINDOW = get_env_var(
+    'GPS_TRACK_WINDOW',
+    config.getint('gps', 'GPS_TRACK_WINDOW'),
     validator=is_positive_int,
     converter=int
 )
+GPS_TRACK_ENCODING = get_env_var(
+    'GPS_TRACK_ENCODING',
+    config.getboolean('gps', 'GPS_TRACK_ENCODING'),
+    converter=to_bool
+)
+GEO_JOIN_METHOD = get_env_var(
+    'GEO_JOIN_METHOD',
+    config.get('gps', 'GEO_JOIN_METHOD'),
+    validator=is_valid_join_method
+)
+GEO_JOIN_MAX_ERROR = get_env_var(
+    'GEO_JOIN_MAX_ERROR',
+    config.getfloat('gps', 'GEO_JOIN_MAX_ERROR'),
+    validator=is_non_negative_number,
+    converter=float
+)
+
+# Coverage tiles
+TILE_SUMMARY_MODE = get_env_var(
+    'TILE_SUMMARY_MODE',
+    config.get('tiles', 'TILE_SUMMARY_MODE'),
+    validator=is_valid_summary_mode
+)
+TILE_SCHEME = get_env_var(
+    'TILE_SCHEME',
+    config.get('tiles', 'TILE_SCHEME'),
+    validator=is_valid_tile_scheme
+)
+TILE_PRECISION = get_env_var(
+    'TILE_PRECISION',
+    config.getint('tiles', 'TILE_PRECISION'),
+    validator=is_positive_int,
+    converter=int
+)
+TILE_GRID_SIZE = get_env_var(
+    'TILE_GRID_SIZE',
+    config.getfloat('tiles', 'TILE_GRID_SIZE'),
+    validator=is_positive_number,
+    converter=float
+)
+TILE_PERSIST_INTERVAL = get_env_var(
+    'TILE_PERSIST_INTERVAL',
+    config.getint('tiles', 'TILE_PERSIST_INTERVAL'),
+    validator=is_positive_int,
+    converter=int
+)
+TILE_STATE_FILE = os.path.join(DATA_DIR, 'tiles_state.json')
+
+# Rolling speedtest statistics
+STATS_SUMMARY_MODE = get_env_var(
+    'STATS_SUMMARY_MODE',
+    config.get('stats', 'STATS_SUMMARY_MODE'),
+    validator=is_valid_summary_mode
+)
+STATS_WINDOWS = get_env_var(
+    'STATS_WINDOWS',
+    to_int_list(config.get('stats', 'STATS_WINDOWS')),
+    validator=is_valid_window_list,
+    converter=to_int_list
+)
+STATS_EWMA_ALPHA = get_env_var(
+    'STATS_EWMA_ALPHA',
+    config.getfloat('stats', 'STATS_EWMA_ALPHA'),
+    validator=is_valid_smoothing_factor,
+    converter=float
+)
+STATS_STATE_FILE = os.path.join(DATA_DIR, 'stats_state.json')
+
+# Storage backend and durability (how often buffered rows are committed to disk)
+STORAGE_BACKEND = get_env_var(
+    'STORAGE_BACKEND',
+    config.get('storage', 'STORAGE_BACKEND'),
+    validator=is_valid_storage_backend
+)
+DURABILITY_POLICY = get_env_var(
+    'DURABILITY_POLICY',
+    config.get('storage', 'DURABILITY_POLICY'),
+    validator=is_valid_durability_policy
+)
+COMMIT_EVERY_ROWS = get_env_var(
+    'COMMIT_EVERY_ROWS',
+    config.getint('storage', 'COMMIT_EVERY_ROWS'),
+    validator=is_positive_int,
+    converter=int
+)
+COMMIT_INTERVAL = get_env_var(
+    'COMMIT_INTERVAL',
+    config.getfloat('storage', 'COMMIT_INTERVAL'),
+    validator=is_positive_number,
+    converter=float
+)
+COMMIT_FSYNC = get_env_var(
+    'COMMIT_FSYNC',
+    config.getboolean('storage', 'COMMIT_FSYNC'),
+    converter=to_bool
+)
+SEGMENT_MAX_AGE = get_env_var(
+    'SEGMENT_MAX_AGE',
+    config.getint('storage', 'SEGMENT_MAX_AGE'),
+    validator=is_positive_int,
+    converter=int
+)
+SEGMENT_MAX_BYTES = get_env_var(
+    'SEGMENT_MAX_BYTES',
+    config.getint('storage', 'SEGMENT_MAX_BYTES'),
+    validator=is_positive_int,
+    converter=int
+)
+
+# Scheduler configuration (per-stage cadences for main_bob)
+GPS_INTERVAL = get_env_var(
+    'GPS_INTERVAL',
+    config.getint('scheduler', 'GPS_INTERVAL'),
+    validator=is_positive_int,
+    converter=int
+)
+UPLOAD_INTERVAL = get_env_var(
+    'UPLOAD_INTERVAL',
+    config.getint('scheduler', 'UPLOAD_INTERVAL'),
+    validator=is_positive_int,
+    converter=int
+)
+EXTINCTION_CHECK_INTERVAL = get_env_var(
+    'EXTINCTION_CHECK_INTERVAL',
+    config.getint('scheduler', 'EXTINCTION_CHECK_INTERVAL'),
+    validator=is_positive_int,
+    converter=int
+)
+SCHEDULER_MAX_WORKERS = get_env_var(
+    'SCHEDULER_MAX_WORKERS',
+    config.getint('scheduler', 'SCHEDULER_MAX_WORKERS'),
+    validator=is_positive_int,
+    converter=int
+)
+SCHEDULER_MODE = get_env_var(
+    'SCHEDULER_MODE',
+    config.get('scheduler', 'SCHEDULER_MODE'),
+    validator=is_valid_scheduler_mode
+)
+SCHEDULER_JITTER = get_env_var(
+    'SCHEDULER_JITTER',
+    config.getfloat('scheduler', 'SCHEDULER_JITTER'),
+    validator=is_non_negative_number,
+    converter=float
+)
+SCHEDULER_SHUTDOWN_TIMEOUT = get_env_var(
+    'SCHEDULER_SHUTDOWN_TIMEOUT',
+    config.getfloat('scheduler', 'SCHEDULER_SHUTDOWN_TIMEOUT'),
+    validator=is_non_negative_number,
+    converter=float
+)
+SCHEDULER_METRICS_INTERVAL = get_env_var(
+    'SCHEDULER_METRICS_INTERVAL',
+    config.getfloat('scheduler', 'SCHEDULER_METRICS_INTERVAL'),
+    validator=is_non_negative_number,
+    converter=float
+)
+SCHEDULER_METRICS_FILE = os.path.join(LOG_DIR, 'scheduler_metrics.json')
+
+# Adaptive speedtest interval
+SPEEDTEST_ADAPTIVE = get_env_var(
+    'SPEEDTEST_ADAPTIVE',
+    config.getboolean('scheduler', 'SPEEDTEST_ADAPTIVE'),
+    converter=to_bool
+)
+SPEEDTEST_MIN_INTERVAL = get_env_var(
+    'SPEEDTEST_MIN_INTERVAL',
+    config.getint('scheduler', 'SPEEDTEST_MIN_INTERVAL'),
+    validator=is_positive_int,
+    converter=int
+)
+SPEEDTEST_MAX_INTERVAL = get_env_var(
+    'SPEEDTEST_MAX_INTERVAL',
+    config.getint('scheduler', 'SPEEDTEST_MAX_INTERVAL'),
+    validator=is_positive_int,
+    converter=int
+)
+SPEEDTEST_DAILY_BUDGET = get_env_var(
+    'SPEEDTEST_DAILY_BUDGET',
+    config.getint('scheduler', 'SPEEDTEST_DAILY_BUDGET'),
+    validator=is_non_negative_number,
+    converter=int
+)
+SPEEDTEST_STABLE_CV = get_env_var(
+    'SPEEDTEST_STABLE_CV',
+    config.getfloat('scheduler', 'SPEEDTEST_STABLE_CV'),
+    validator=is_non_negative_number,
+    converter=float
+)
+SPEEDTEST_UNSTABLE_CV = get_env_var(
+    'SPEEDTEST_UNSTABLE_CV',
+    config.getfloat('scheduler', 'SPEEDTEST_UNSTABLE_CV'),
+    validator=is_non_negative_number,
+    converter=float
+)
+SPEEDTEST_MOVE_DISTANCE = get_env_var(
+    'SPEEDTEST_MOVE_DISTANCE',
+    config.getfloat('scheduler', 'SPEEDTEST_MOVE_DISTANCE'),
+    validator=is_positive_number,
+    converter=float
+)
+ADAPTIVE_STATE_FILE = os.path.join(DATA_DIR, 'adaptive_state.json')
+
+# Bandwidth coordination between background transfers and measurements
+BANDWIDTH_RATE_LIMIT = get_env_var(
+    'BANDWIDTH_RATE_LIMIT',
+    config.getfloat('bandwidth', 'BANDWIDTH_RATE_LIMIT'),
+    validator=is_non_negative_number,
+    converter=float
+) * 1024
+BANDWIDTH_BURST = get_env_var(
+    'BANDWIDTH_BURST',
+    config.getint('bandwidth', 'BANDWIDTH_BURST'),
+    validator=is_positive_int,
+    converter=int
+) * 1024
+QUIET_BEFORE_MEASUREMENT = get_env_var(
+    'QUIET_BEFORE_MEASUREMENT',
+    config.getfloat('bandwidth', 'QUIET_BEFORE_MEASUREMENT'),
+    validator=is_non_negative_number,
+    converter=float
+)
+QUIET_AFTER_MEASUREMENT = get_env_var(
+    'QUIET_AFTER_MEASUREMENT',
+    config.getfloat('bandwidth', 'QUIET_AFTER_MEASUREMENT'),
+    validator=is_non_negative_number,
+    converter=float
+)
+QUIET_MAX_WAIT = get_env_var(
+    'QUIET_MAX_WAIT',
+    config.getfloat('bandwidth', 'QUIET_MAX_WAIT'),
+    validator=is_non_negative_number,
+    converter=float
+)
+BANDWIDTH_STATE_FILE = os.path.join(BASE_DIR, 'bandwidth_state.json')
+
+# Connectivity checks
+CONNECTIVITY_TTL = get_env_var(
+    'CONNECTIVITY_TTL',
+    config.getfloat('connectivity', 'CONNECTIVITY_TTL'),
+    validator=is_positive_number,
+    converter=float
+)
+CONNECTIVITY_TIMEOUT = get_env_var(
+    'CONNECTIVITY_TIMEOUT',
+    config.getfloat('connectivity', 'CONNECTIVITY_TIMEOUT'),
+    validator=is_positive_number,
+    converter=float
+)
+PUBLIC_IP_PROVIDERS = get_env_var(
+    'PUBLIC_IP_PROVIDERS',
+    to_str_list(config.get('connectivity', 'PUBLIC_IP_PROVIDERS')),
+    validator=bool,
+    converter=to_str_list
+)
+PUBLIC_IP_TTL = get_env_var(
+    'PUBLIC_IP_TTL',
+    config.getfloat('connectivity', 'PUBLIC_IP_TTL'),
+    validator=is_positive_number,
+    converter=float
+)
+HTTP_POOL_SIZE = get_env_var(
+    'HTTP_POOL_SIZE',
+    config.getint('connectivity', 'HTTP_POOL_SIZE'),
+    validator=is_positive_int,
+    converter=int
+)
+
+# Background latency probing
+LATENCY_PROBING = get_env_var(
+    'LATENCY_PROBING',
+    config.getboolean('latency', 'LATENCY_PROBING'),
+    converter=to_bool
+)
+LATENCY_TARGETS = get_env_var(
+    'LATENCY_TARGETS',
+    to_target_list(config.get('latency', 'LATENCY_TARGETS')),
+    validator=is_valid_target_list,
+    converter=to_target_list
+)
+LATENCY_INTERVAL = get_env_var(
+    'LATENCY_INTERVAL',
+    config.getfloat('latency', 'LATENCY_INTERVAL'),
+    validator=is_positive_number,
+    converter=float
+)
+LATENCY_TIMEOUT = get_env_var(
+    'LATENCY_TIMEOUT',
+    config.getfloat('latency', 'LATENCY_TIMEOUT'),
+    validator=is_positive_number,
+    converter=float
+)
+LATENCY_BUFFER_SIZE = get_env_var(
+    'LATENCY_BUFFER_SIZE',
+    config.getint('latency', 'LATENCY_BUFFER_SIZE'),
+    validator=is_positive_int,
+    converter=int
+)
+LATENCY_ICMP = get_env_var(
+    'LATENCY_ICMP',
+    config.getboolean('latency', 'LATENCY_ICMP'),
+    converter=to_bool
+)
+LATENCY_SUMMARY_INTERVAL = get_env_var(
+    'LATENCY_SUMMARY_INTERVAL',
+    config.getint('latency', 'LATENCY_SUMMARY_INTERVAL'),
+    validator=is_positive_int,
+    converter=int
+)
+
+# Network byte accounting and monthly data cap
+DATA_CAP_MB = get_env_var(
+    'DATA_CAP_MB',
+    config.getfloat('datacap', 'DATA_CAP_MB'),
+    validator=is_non_negative_number,
+    converter=float
+)
+DATA_CAP_RESET_DAY = get_env_var(
+    'DATA_CAP_RESET_DAY',
+    config.getint('datacap', 'DATA_CAP_RESET_DAY'),
+    validator=is_valid_reset_day,
+    converter=int
+)
+DATA_CAP_SPEEDTEST_UPLOAD_AT = get_env_var(
+    'DATA_CAP_SPEEDTEST_UPLOAD_AT',
+    config.getfloat('datacap', 'DATA_CAP_SPEEDTEST_UPLOAD_AT'),
+    validator=is_positive_number,
+    converter=float
+)
+DATA_CAP_RAW_UPLOAD_AT = get_env_var(
+    'DATA_CAP_RAW_UPLOAD_AT',
+    config.getfloat('datacap', 'DATA_CAP_RAW_UPLOAD_AT'),
+    validator=is_positive_number,
+    converter=float
+)
+DATA_CAP_SPEEDTEST_AT = get_env_var(
+    'DATA_CAP_SPEEDTEST_AT',
+    config.getfloat('datacap', 'DATA_CAP_SPEEDTEST_AT'),
+    validator=is_positive_number,
+    converter=float
+)
+DATA_ACCOUNTING_INTERFACES = get_env_var(
+    'DATA_ACCOUNTING_INTERFACES',
+    to_str_list(config.get('datacap', 'DATA_ACCOUNTING_INTERFACES')),
+    converter=to_str_list
+)
+DATA_USAGE_FILE = os.path.join(DATA_DIR, 'data_usage.json')
 
 # Survey URL for the captive portal
 SURVEY_URL = get_env_var('SURVEY_URL', config.get('survey', 'SURVEY_URL'))
@@ -347,6 +1099,22 @@ def print_config():
         'SPEED_TEST_INTERVAL': SPEED_TEST_INTERVAL,
         'GPS_PORT': GPS_PORT,
         'GPS_BAUDRATE': GPS_BAUDRATE,
+        'STORAGE_BACKEND': STORAGE_BACKEND,
+        'DURABILITY_POLICY': DURABILITY_POLICY,
+        'GPS_INTERVAL': GPS_INTERVAL,
+        'UPLOAD_INTERVAL': UPLOAD_INTERVAL,
+        'SCHEDULER_MAX_WORKERS': SCHEDULER_MAX_WORKERS,
+        'UPLOAD_COMPRESSION': UPLOAD_COMPRESSION,
+        'UPLOAD_WORKERS': UPLOAD_WORKERS,
+        'BANDWIDTH_RATE_LIMIT': BANDWIDTH_RATE_LIMIT,
+        'SCHEDULER_MODE': SCHEDULER_MODE,
+        'SCHEDULER_JITTER': SCHEDULER_JITTER,
+        'SPEEDTEST_ADAPTIVE': SPEEDTEST_ADAPTIVE,
+        'SPEEDTEST_ISOLATED': SPEEDTEST_ISOLATED,
+        'SPEEDTEST_BACKEND': SPEEDTEST_BACKEND,
+        'SPEEDTEST_TOTAL_TIMEOUT': SPEEDTEST_TOTAL_TIMEOUT,
+        'DATA_CAP_MB': DATA_CAP_MB,
+        'LATENCY_PROBING': LATENCY_PROBING,
         'SURVEY_URL': SURVEY_URL,
         'DEVICE_ID': DEVICE_ID,
         'FTP_HOST': FTP_DETAILS['host'],
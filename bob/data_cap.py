@@ -0,0 +1,226 @@
+# File: bob/data_cap.py
+import os
+import json
+import time
+import datetime
+import logging
+import threading
+import psutil
+from bob.config import (DATA_CAP_MB, DATA_CAP_RESET_DAY, DATA_CAP_SPEEDTEST_UPLOAD_AT,
+                        DATA_CAP_RAW_UPLOAD_AT, DATA_CAP_SPEEDTEST_AT,
+                        DATA_ACCOUNTING_INTERFACES, DATA_USAGE_FILE)
+
+logger = logging.getLogger('bob.data_cap')
+
+# Bucket for traffic seen while no stage was running (OS, NTP, other processes)
+OTHER = 'other'
+# Seconds between writes of the usage file
+PERSIST_INTERVAL = 60
+# Days of history kept in the usage file
+HISTORY_DAYS = 92
+
+
+def _billing_start(day, reset_day):
+    """First day of the billing period containing ``day``."""
+    if day.day >= reset_day:
+        return day.replace(day=reset_day)
+    previous = day.replace(day=1) - datetime.timedelta(days=1)
+    return previous.replace(day=reset_day)
+
+
+class DataAccountant:
+    """
+    Attributes network traffic to the stages of the main loop and enforces a
+    monthly data cap.
+
+    ``psutil.net_io_counters()`` is system-wide, so each stage boundary takes
+    a snapshot and the bytes moved since the previous snapshot are split
+    evenly between the stages that were running (or booked to ``other`` when
+    none was). Per-stage totals therefore add up to what the interfaces
+    actually carried, even with stages overlapping on scheduler workers.
+
+    Usage is kept per local day and stage and persisted to ``state_path``.
+    As the billing period's usage crosses the configured fractions of
+    ``budget``, optional work is shed in order: the speedtest upload phase,
+    raw data uploads, then speedtests altogether. Control traffic
+    (activation, extinction, summaries) is never held back.
+    """
+    def __init__(self, budget=None, reset_day=None, interfaces=None, state_path=None):
+        """
+        Args:
+            budget (int): Monthly budget in bytes; 0 to only account
+            reset_day (int): Day of the month the billing period starts
+            interfaces (list): Interfaces to count; empty for all but loopback
+            state_path (str): File the usage is persisted to
+        """
+        self.budget = DATA_CAP_MB * 1024 * 1024 if budget is None else budget
+        self.reset_day = reset_day or DATA_CAP_RESET_DAY
+        self.interfaces = DATA_ACCOUNTING_INTERFACES if interfaces is None else interfaces
+        self.state_path = state_path or DATA_USAGE_FILE
+        self.thresholds = {
+            'speedtest_upload': DATA_CAP_SPEEDTEST_UPLOAD_AT,
+            'raw_upload': DATA_CAP_RAW_UPLOAD_AT,
+            'speedtest': DATA_CAP_SPEEDTEST_AT,
+        }
+        self.days = {}       # 'YYYY-MM-DD' -> {stage: {'sent': n, 'recv': n}}
+        self._active = {}    # stage -> number of running instances
+        self._shed = set()
+        self._lock = threading.Lock()
+        self._last_persist = time.monotonic()
+        self._unsaved = False
+        self._load()
+        self._counters = self._read_counters()
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                self.days = json.load(f).get('days', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Ignoring unreadable data usage file %s: %s", self.state_path, e)
+
+    def _read_counters(self):
+        """
+        Returns:
+            dict: interface -> (bytes_sent, bytes_recv)
+        """
+        try:
+            counters = psutil.net_io_counters(pernic=True)
+        except Exception as e:
+            logger.warning("Could not read network counters: %s", e)
+            return {}
+        return {nic: (c.bytes_sent, c.bytes_recv) for nic, c in counters.items()
+                if (nic in self.interfaces if self.interfaces else nic != 'lo')}
+
+    def _sample_locked(self):
+        """Book the traffic since the previous snapshot to the running stages."""
+        current = self._read_counters()
+        sent = recv = 0
+        for nic, (nic_sent, nic_recv) in current.items():
+            previous = self._counters.get(nic)
+            if previous is None:
+                # A newly seen interface's counters include traffic from before
+                # we watched it; its first reading is only the baseline.
+                previous = (nic_sent, nic_recv)
+            elif nic_sent < previous[0] or nic_recv < previous[1]:
+                # The counters were reset (e.g. modem replugged) and count from zero.
+                previous = (0, 0)
+            sent += nic_sent - previous[0]
+            recv += nic_recv - previous[1]
+        self._counters = current
+        if not sent and not recv:
+            return
+        stages = list(self._active) or [OTHER]
+        day = self.days.setdefault(datetime.date.today().isoformat(), {})
+        for i, stage in enumerate(stages):
+            usage = day.setdefault(stage, {'sent': 0, 'recv': 0})
+            # The first stage also takes the remainder so no byte is lost.
+            usage['sent'] += sent // len(stages) + (sent % len(stages) if i == 0 else 0)
+            usage['recv'] += recv // len(stages) + (recv % len(stages) if i == 0 else 0)
+        self._unsaved = True
+
+    def begin(self, stage):
+        with self._lock:
+            self._sample_locked()
+            self._active[stage] = self._active.get(stage, 0) + 1
+
+    def end(self, stage):
+        with self._lock:
+            self._sample_locked()
+            self._active[stage] -= 1
+            if not self._active[stage]:
+                del self._active[stage]
+            due = time.monotonic() - self._last_persist >= PERSIST_INTERVAL
+        if due:
+            self.persist()
+
+    def wrap(self, stage, func):
+        """
+        Returns:
+            callable: ``func`` with its traffic booked to ``stage``
+        """
+        def accounted():
+            self.begin(stage)
+            try:
+                return func()
+            finally:
+                self.end(stage)
+        return accounted
+
+    def persist(self):
+        """Atomically write the usage history to the state file."""
+        with self._lock:
+            self._sample_locked()
+            if not self._unsaved:
+                return
+            cutoff = (datetime.date.today() - datetime.timedelta(days=HISTORY_DAYS)).isoformat()
+            self.days = {day: usage for day, usage in self.days.items() if day >= cutoff}
+            state = {'days': self.days}
+            self._unsaved = False
+            self._last_persist = time.monotonic()
+            try:
+                os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+                tmp_path = self.state_path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(state, f, separators=(',', ':'))
+                os.replace(tmp_path, self.state_path)
+            except Exception as e:
+                logger.error("Failed to save data usage to %s: %s", self.state_path, e)
+
+    def period_usage(self):
+        """
+        Returns:
+            dict: stage -> bytes (sent + received) in the current billing period
+        """
+        start = _billing_start(datetime.date.today(), self.reset_day).isoformat()
+        totals = {}
+        with self._lock:
+            self._sample_locked()
+            for day, stages in self.days.items():
+                if day < start:
+                    continue
+                for stage, usage in stages.items():
+                    totals[stage] = totals.get(stage, 0) + usage['sent'] + usage['recv']
+        return totals
+
+    def used_fraction(self):
+        """
+        Returns:
+            float: Share of the monthly budget used this period (0 with no budget)
+        """
+        if not self.budget:
+            return 0.0
+        return sum(self.period_usage().values()) / self.budget
+
+    def allows(self, work):
+        """
+        Check whether optional work may still run this billing period.
+
+        Args:
+            work (str): 'speedtest_upload', 'raw_upload' or 'speedtest'
+
+        Returns:
+            bool: False once usage has reached the work's threshold
+        """
+        if not self.budget:
+            return True
+        used = self.used_fraction()
+        allowed = used < self.thresholds[work]
+        if not allowed and work not in self._shed:
+            logger.warning("Data cap: %.0f%% of the monthly budget used; skipping %s.",
+                           used * 100, work.replace('_', ' '))
+            self._shed.add(work)
+        elif allowed and work in self._shed:
+            logger.info("Data cap: %s resumed (%.0f%% used).", work.replace('_', ' '), used * 100)
+            self._shed.discard(work)
+        return allowed
+
+    def report(self):
+        """Log this period's usage per stage."""
+        usage = self.period_usage()
+        total = sum(usage.values())
+        logger.info("Data used this period: %.1f MB%s (%s)", total / 1048576,
+                    f" of {self.budget / 1048576:.0f} MB" if self.budget else "",
+                    ", ".join(f"{stage} {used / 1048576:.1f} MB"
+                              for stage, used in sorted(usage.items())))
@@ -1,24 +1,237 @@
 # File: bob/data_uploader.py
 import os
 import glob
+import time
+import queue
 import logging
-from bob.ftp_client import FTPClient
-from bob.config import FTP_DETAILS, DATA_DIR
+import threading
+from bob.ftp_client import ftp_pool, CONNECTION_ERRORS, LOCAL_FILE_ERRORS
+from bob.compression import CODEC_EXTENSIONS, resolve_codec
+from bob.spool import upload_spool, PRIORITY_DATA, PRIORITY_SUMMARY
+from bob.internet import connectivity
+from bob.config import (FTP_DETAILS, DATA_DIR, FTP_RESUME_UPLOADS, UPLOAD_COMPRESSION,
+                        UPLOAD_COMPRESSION_LEVEL, UPLOAD_WORKERS, TILE_SUMMARY_MODE,
+                        STATS_SUMMARY_MODE)
 
 logger = logging.getLogger('bob.data_uploader')
 
-def upload_csv_files():
-    ftp_client = FTPClient()
-    ftp_client.change_directory(FTP_DETAILS['target_up'])
-    # Look for CSV files in the DATA_DIR.
-    files = glob.glob(os.path.join(DATA_DIR, "*.csv"))
+# Sealed segments and summaries picked up for upload. Live files are kept
+# under DATA_DIR/live/ and never matched here.
+RAW_PATTERNS = ("*.csv", "*.rec", "*.trk")
+SUMMARY_PATTERNS = ("*-tiles-*.json", "*-stats-*.json", "*-latency-*.json")
+UPLOAD_PATTERNS = RAW_PATTERNS + SUMMARY_PATTERNS
+
+# Raw segments of streams that are summarized on the device instead of
+# uploaded are moved here.
+ARCHIVE_DIR = os.path.join(DATA_DIR, 'archive')
+
+# Set when the last drain stopped because the connection failed; the next
+# successful connection then makes the whole backlog due again.
+_link_failed = False
+
+
+def _on_link_change(online):
+    # Items that failed while the link was down are due again as soon as it
+    # is back, even if no upload has yet proved it.
+    if online:
+        upload_spool.reset_backoff()
+
+
+connectivity.add_listener(_on_link_change)
+
+
+def local_only_streams():
+    """
+    Returns:
+        set: Streams (file ids such as 'geo') whose raw segments stay on the device
+    """
+    streams = set()
+    if TILE_SUMMARY_MODE == 'only':
+        streams.add('geo')
+    if STATS_SUMMARY_MODE == 'only':
+        streams.add('speed')
+    return streams
+
+
+def _archive(path):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    os.replace(path, os.path.join(ARCHIVE_DIR, os.path.basename(path)))
+    logger.info("Archived %s locally instead of uploading it.", path)
+
+
+def enqueue_data_files(spool=None, include_raw=True):
+    """
+    Add sealed data segments and summaries in DATA_DIR to the upload spool.
+
+    Args:
+        include_raw (bool): False to leave raw segments in DATA_DIR for a later cycle
+
+    Returns:
+        int: Number of files spooled
+    """
+    spool = spool or upload_spool
+    files = [path for pattern in (UPLOAD_PATTERNS if include_raw else SUMMARY_PATTERNS)
+             for path in glob.glob(os.path.join(DATA_DIR, pattern))]
+    local_only = local_only_streams()
+    if local_only:
+        kept = []
+        for path in files:
+            if any(f"-{stream}-" in os.path.basename(path) for stream in local_only):
+                _archive(path)
+            else:
+                kept.append(path)
+        files = kept
+    codec = resolve_codec(UPLOAD_COMPRESSION)
     for file in files:
-        try:
-            ftp_client.upload_file(file, os.path.basename(file))
-            logger.info("Uploaded file: %s", file)
-            # Optionally, delete file after upload.
-            os.remove(file)
-            logger.info("Deleted local file: %s", file)
-        except Exception as e:
-            logger.error("Failed to upload %s: %s", file, e)
-    ftp_client.quit()
+        summary = file.endswith('.json')
+        spool.enqueue(file, FTP_DETAILS['target_up'],
+                      os.path.basename(file) + CODEC_EXTENSIONS[codec],
+                      codec=codec, priority=PRIORITY_SUMMARY if summary else PRIORITY_DATA)
+    return len(files)
+
+
+def upload_item(ftp_client, item):
+    """Upload a single spool item over a leased connection."""
+    stats = ftp_client.upload_file(item.path, item.remote_name,
+                                   resume=FTP_RESUME_UPLOADS and bool(item.resume),
+                                   codec=item.codec, level=UPLOAD_COMPRESSION_LEVEL)
+    logger.info("Uploaded file: %s as %s", item.path, item.remote_name)
+    if item.codec != 'none':
+        logger.info("Compressed %s with %s: %d -> %d bytes (ratio %.3f, %.3fs CPU)",
+                    item.path, item.codec, stats['bytes_in'], stats['bytes_out'],
+                    stats['ratio'], stats['cpu_time'])
+    return stats
+
+
+class _Batch:
+    """Work queue and shared counters for one round of parallel uploads."""
+    def __init__(self, items):
+        self.work = queue.Queue()
+        for item in items:
+            self.work.put(item)
+        self.lock = threading.Lock()
+        self.uploaded = 0
+        self.bytes_sent = 0
+        self.link_error = None
+        self.error = None
+
+
+def _upload_worker(spool, batch):
+    """
+    Lease one connection and upload items from the batch queue until it is
+    empty or any worker has lost the link.
+    """
+    global _link_failed
+    try:
+        with ftp_pool.lease() as ftp_client:
+            if _link_failed:
+                logger.info("Connection restored; draining %d spooled file(s).",
+                            spool.pending_count())
+                spool.reset_backoff()
+                _link_failed = False
+            current_dir = None
+            while batch.link_error is None:
+                try:
+                    item = batch.work.get_nowait()
+                except queue.Empty:
+                    return
+                if not os.path.exists(item.path):
+                    logger.warning("Spooled file %s no longer exists; dropping it.", item.path)
+                    spool.drop(item)
+                    continue
+                try:
+                    if item.remote_dir != current_dir:
+                        ftp_client.change_directory(item.remote_dir)
+                        current_dir = item.remote_dir
+                    stats = upload_item(ftp_client, item)
+                    spool.mark_done(item)
+                    with batch.lock:
+                        batch.uploaded += 1
+                        batch.bytes_sent += stats.get('bytes_sent', 0)
+                except LOCAL_FILE_ERRORS as e:
+                    spool.mark_failed(item, e)
+                except CONNECTION_ERRORS as e:
+                    # The lease discards the broken connection; the rest
+                    # of the backlog stays spooled.
+                    spool.mark_failed(item, e)
+                    raise
+                except Exception as e:
+                    spool.mark_failed(item, e)
+    except CONNECTION_ERRORS as e:
+        _link_failed = True
+        connectivity.report(False)
+        with batch.lock:
+            batch.link_error = e
+    except Exception as e:
+        # E.g. a permanent reply at login or cwd; items stay spooled.
+        logger.error("Upload worker %s failed: %s", threading.current_thread().name, e)
+        with batch.lock:
+            batch.error = e
+
+
+def drain_spool(spool=None, workers=None, max_priority=None):
+    """
+    Upload every spool item that is due, highest priority first, over up to
+    ``workers`` concurrent FTPS connections fed from a shared work queue.
+    Items are only removed (and their files deleted) once the upload has
+    completed.
+
+    Args:
+        max_priority (int): Leave items less urgent than this in the spool
+
+    Returns:
+        int: Number of files uploaded
+    """
+    spool = spool or upload_spool
+    workers = workers or UPLOAD_WORKERS
+    ftp_pool.ensure_capacity(workers)
+    uploaded = 0
+    while True:
+        items = spool.due(max_priority=max_priority)
+        if not items:
+            break
+        batch = _Batch(items)
+        count = min(workers, len(items))
+        start = time.monotonic()
+        threads = [threading.Thread(target=_upload_worker, args=(spool, batch),
+                                    name=f'bob-upload-{i}') for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        uploaded += batch.uploaded
+        if batch.uploaded:
+            if batch.link_error is None:
+                connectivity.report(True, 'ftp upload')
+            logger.info("Uploaded %d file(s), %d bytes in %.1fs over %d connection(s) (%.1f KB/s)",
+                        batch.uploaded, batch.bytes_sent, elapsed, count,
+                        batch.bytes_sent / 1024.0 / elapsed if elapsed else 0.0)
+        if batch.link_error is not None:
+            logger.error("Upload connection failed; %d file(s) remain spooled: %s",
+                         spool.pending_count(), batch.link_error)
+            break
+        if not batch.uploaded:
+            if batch.error is not None:
+                logger.error("Uploads failed; %d file(s) remain spooled: %s",
+                             spool.pending_count(), batch.error)
+            break
+    return uploaded
+
+
+def upload_csv_files(include_raw=True):
+    """
+    Spool any newly sealed data segments and upload the backlog.
+
+    Args:
+        include_raw (bool): False to send only control notices and summaries,
+            holding raw data segments back (e.g. when the data cap is near)
+    """
+    enqueue_data_files(include_raw=include_raw)
+    pending = upload_spool.pending_count()
+    if not pending:
+        return
+    if not connectivity.is_online():
+        logger.info("Offline; %d file(s) stay spooled.", pending)
+        return
+    drain_spool(max_priority=None if include_raw else PRIORITY_SUMMARY)
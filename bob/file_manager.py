@@ -0,0 +1,345 @@
+# bob/file_manager.py
+
+import os
+import csv
+import time
+import signal
+import threading
+from bob.logger import logger
+from bob.config import (DURABILITY_POLICY, COMMIT_EVERY_ROWS, COMMIT_INTERVAL, COMMIT_FSYNC,
+                        STORAGE_BACKEND, SEGMENT_MAX_AGE, SEGMENT_MAX_BYTES)
+from bob.record_log import RecordLogWriter
+from bob.track import TrackLogWriter
+
+# Durability policies for buffered rows:
+#   'row'      - commit every row as soon as it is written
+#   'count'    - commit once COMMIT_EVERY_ROWS rows are buffered
+#   'interval' - commit buffered rows every COMMIT_INTERVAL seconds
+#   'shutdown' - commit only when the files are closed
+DURABILITY_POLICIES = ('row', 'count', 'interval', 'shutdown')
+
+# Storage backends: CSV text, the compact binary record log (.rec), or the
+# delta/varint track log (.trk) for GPS tracks
+STORAGE_BACKENDS = ('csv', 'binary', 'track')
+BACKEND_EXTENSIONS = {'csv': '.csv', 'binary': '.rec', 'track': '.trk'}
+
+
+class CSVSink:
+    """
+    Appends rows to a CSV file, writing the header if the file is new.
+    With a schema, rows are typed values formatted by the schema.
+    """
+    def __init__(self, path, headers, schema=None):
+        self.path = path
+        self.schema = schema
+        self.created = not os.path.exists(path)
+        self.handle = open(path, 'a', newline='')
+        self.writer = csv.writer(self.handle)
+        if self.created:
+            self.writer.writerow(headers)
+
+    def write_rows(self, rows):
+        if self.schema is not None:
+            rows = [self.schema.to_csv_row(row) for row in rows]
+        self.writer.writerows(rows)
+
+    def flush(self):
+        self.handle.flush()
+
+    def fileno(self):
+        return self.handle.fileno()
+
+    def close(self):
+        self.handle.close()
+
+
+class FileManager:
+    """
+    Manages file handles for CSV operations throughout the application lifecycle.
+    Opens files once and keeps them open until the application terminates.
+    With the 'binary' backend, rows go to a struct-packed record log
+    (bob.record_log) with a .rec extension instead of CSV text; the 'track'
+    backend (bob.track) delta-encodes GPS rows into a .trk file. The backend
+    can be chosen per file.
+
+    Rows are buffered in memory and committed to disk in groups according to
+    the durability policy, which bounds how much data can be lost on a crash
+    while avoiding a flush (and optionally an fsync) for every row on the SD card.
+    Writes are serialized with a lock because stages run on separate threads.
+
+    Live files are written under ``live_dir`` and rotated into sealed segments
+    once they reach ``segment_max_age`` seconds or ``segment_max_bytes``. A
+    segment is sealed by an atomic rename into the data directory as
+    ``{name}-{YYYYmmddHHMMSS}{ext}``, so the uploader only ever sees complete,
+    immutable files.
+    """
+    def __init__(self, file_paths, headers, schemas=None, backend=None, policy=None,
+                 every_rows=None, interval=None, fsync=None, segment_max_age=None,
+                 segment_max_bytes=None, live_dir=None, backends=None):
+        """
+        Initialize the file manager with file paths and their headers.
+
+        Args:
+            file_paths (dict): Dictionary mapping file identifiers to file paths;
+                sealed segments are named after these paths
+            headers (dict): Dictionary mapping file identifiers to column headers
+            schemas (dict): Dictionary mapping file identifiers to RecordSchema objects;
+                when given, rows are typed values (required for the binary backend)
+            backend (str): One of STORAGE_BACKENDS
+            policy (str): One of DURABILITY_POLICIES
+            every_rows (int): Rows per commit for the 'count' policy
+            interval (float): Seconds between commits for the 'interval' policy
+            fsync (bool): Call os.fsync() after each commit
+            segment_max_age (float): Seconds before a live segment is sealed
+            segment_max_bytes (int): Size in bytes at which a live segment is sealed
+            live_dir (str): Directory for live segments; defaults to 'live/' next to
+                each file path
+            backends (dict): Per-file backend overrides, e.g. {'gps': 'track'}
+        """
+        self.backend = backend or STORAGE_BACKEND
+        self.backends = {file_id: (backends or {}).get(file_id, self.backend)
+                         for file_id in file_paths}
+        for file_backend in self.backends.values():
+            if file_backend not in STORAGE_BACKENDS:
+                raise ValueError(f"Unknown storage backend: {file_backend}")
+        self.file_paths = {
+            file_id: os.path.splitext(path)[0] + BACKEND_EXTENSIONS[self.backends[file_id]]
+            for file_id, path in file_paths.items()
+        }
+        self.live_paths = {
+            file_id: os.path.join(live_dir or os.path.join(os.path.dirname(path), 'live'),
+                                  os.path.basename(path))
+            for file_id, path in self.file_paths.items()
+        }
+        self.sinks = {}
+        self.headers = headers
+        self.schemas = schemas or {}
+        for file_id, file_backend in self.backends.items():
+            if file_backend != 'csv' and file_id not in self.schemas:
+                raise ValueError(f"The {file_backend} backend needs a schema for {file_id}")
+        self.policy = policy or DURABILITY_POLICY
+        if self.policy not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability policy: {self.policy}")
+        self.every_rows = every_rows or COMMIT_EVERY_ROWS
+        self.interval = interval or COMMIT_INTERVAL
+        self.fsync = COMMIT_FSYNC if fsync is None else fsync
+        self.segment_max_age = segment_max_age or SEGMENT_MAX_AGE
+        self.segment_max_bytes = segment_max_bytes or SEGMENT_MAX_BYTES
+        self._pending = {}
+        self._segment_opened = {}
+        self._segment_rows = {}
+        self._last_commit = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._committer = None
+
+    def initialize_files(self):
+        """Initialize all files and open file handles."""
+        with self._lock:
+            for file_id, file_path in self.live_paths.items():
+                # A live file left behind by a crash is sealed as-is first.
+                if os.path.exists(file_path):
+                    logger.info(f"Sealing live segment left from a previous run: {file_path}")
+                    self._seal_path(file_id, file_path)
+                self._initialize_file(file_id, file_path, self.headers[file_id])
+        if self.policy == 'interval':
+            self._stop_event.clear()
+            self._committer = threading.Thread(target=self._commit_periodically,
+                                               name='bob-file-commit', daemon=True)
+            self._committer.start()
+
+    def _initialize_file(self, file_id, file_path, headers):
+        """
+        Initialize a single file with headers if it doesn't exist,
+        and open a file handle for writing.
+        """
+        # Create directory if it doesn't exist
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        # Open file for writing (append mode)
+        if self.backends[file_id] == 'binary':
+            self.sinks[file_id] = RecordLogWriter(file_path, self.schemas[file_id])
+        elif self.backends[file_id] == 'track':
+            self.sinks[file_id] = TrackLogWriter(file_path, self.schemas[file_id])
+        else:
+            self.sinks[file_id] = CSVSink(file_path, headers, self.schemas.get(file_id))
+        self._pending.setdefault(file_id, [])
+        self._segment_opened[file_id] = time.monotonic()
+        self._segment_rows[file_id] = 0
+
+        if self.sinks[file_id].created:
+            self._sync(file_id)
+            logger.info(f"Initialized {self.backends[file_id]} file: {file_path}")
+
+    def _sync(self, file_id):
+        """Flush a file's handle to the OS and optionally to the storage device."""
+        sink = self.sinks[file_id]
+        sink.flush()
+        if self.fsync:
+            os.fsync(sink.fileno())
+
+    def _sealed_path(self, file_id):
+        """Pick a unique name in the data directory for a newly sealed segment."""
+        base, extension = os.path.splitext(self.file_paths[file_id])
+        stamp = time.strftime('%Y%m%d%H%M%S')
+        candidate = f"{base}-{stamp}{extension}"
+        counter = 1
+        while os.path.exists(candidate):
+            candidate = f"{base}-{stamp}-{counter}{extension}"
+            counter += 1
+        return candidate
+
+    def _seal_path(self, file_id, live_path):
+        """Atomically move a closed live file into the data directory."""
+        sealed_path = self._sealed_path(file_id)
+        os.replace(live_path, sealed_path)
+        if self.fsync:
+            # Persist the rename itself.
+            dir_fd = os.open(os.path.dirname(sealed_path), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        logger.info(f"Sealed segment: {sealed_path}")
+        return sealed_path
+
+    def _seal_locked(self, file_id, reopen=True):
+        """
+        Commit, close and seal the live segment for a file. Segments without any
+        rows are discarded. The caller must hold the lock.
+        """
+        live_path = self.live_paths[file_id]
+        self._commit_file_locked(file_id)
+        self.sinks.pop(file_id).close()
+        if self._segment_rows[file_id]:
+            self._seal_path(file_id, live_path)
+        else:
+            os.remove(live_path)
+        if reopen:
+            self._initialize_file(file_id, live_path, self.headers[file_id])
+
+    def _segment_due(self, file_id):
+        if not self._segment_rows.get(file_id):
+            return False
+        if time.monotonic() - self._segment_opened[file_id] >= self.segment_max_age:
+            return True
+        return os.fstat(self.sinks[file_id].fileno()).st_size >= self.segment_max_bytes
+
+    def _commit_file_locked(self, file_id):
+        rows = self._pending.get(file_id)
+        if not rows or file_id not in self.sinks:
+            return
+        try:
+            self.sinks[file_id].write_rows(rows)
+            self._sync(file_id)
+            self._segment_rows[file_id] += len(rows)
+            rows.clear()
+        except Exception as e:
+            logger.error(f"Error committing rows to {self.live_paths[file_id]}: {e}")
+
+    def _commit_locked(self):
+        """Write out all buffered rows and seal full segments. The caller must hold the lock."""
+        for file_id in list(self._pending):
+            self._commit_file_locked(file_id)
+            if file_id in self.sinks and self._segment_due(file_id):
+                self._seal_locked(file_id)
+        self._last_commit = time.monotonic()
+
+    def _buffered_rows(self):
+        return sum(len(rows) for rows in self._pending.values())
+
+    def _should_commit(self):
+        if self.policy == 'row':
+            return True
+        if self.policy == 'count':
+            return self._buffered_rows() >= self.every_rows
+        if self.policy == 'interval':
+            return time.monotonic() - self._last_commit >= self.interval
+        return False
+
+    def _commit_periodically(self):
+        """Background commit loop for the 'interval' policy."""
+        while not self._stop_event.wait(self.interval):
+            self.commit()
+
+    def write_row(self, file_id, row_data):
+        """
+        Buffer a row for the specified file and commit according to the policy.
+
+        Args:
+            file_id (str): Identifier for the file
+            row_data (list): Data to write as a row
+        """
+        with self._lock:
+            if file_id in self.sinks:
+                self._pending[file_id].append(row_data)
+                if self._should_commit():
+                    self._commit_locked()
+                return True
+        logger.error(f"Attempted to write to unknown file ID: {file_id}")
+        return False
+
+    def commit(self):
+        """Write out all buffered rows now."""
+        with self._lock:
+            self._commit_locked()
+
+    def seal_due(self):
+        """
+        Seal every live segment that has reached its age or size limit. Called
+        before uploads so that time-based rotation happens even when no rows
+        are being written.
+        """
+        with self._lock:
+            for file_id in list(self.sinks):
+                self._commit_file_locked(file_id)
+                if self._segment_due(file_id):
+                    self._seal_locked(file_id)
+
+    def seal_all(self):
+        """Seal every live segment that has rows, regardless of its age."""
+        with self._lock:
+            for file_id in list(self.sinks):
+                self._commit_file_locked(file_id)
+                if self._segment_rows[file_id]:
+                    self._seal_locked(file_id)
+
+    def close_all(self):
+        """Commit any buffered rows, seal the live segments and close all handles."""
+        self._stop_event.set()
+        with self._lock:
+            for file_id in list(self.sinks):
+                try:
+                    self._seal_locked(file_id, reopen=False)
+                    logger.info(f"Closed file: {self.live_paths[file_id]}")
+                except Exception as e:
+                    logger.error(f"Error closing file {self.live_paths[file_id]}: {e}")
+
+            # Clear the dictionaries
+            self.sinks.clear()
+            self._pending.clear()
+
+
+def install_shutdown_handlers(stop=None):
+    """
+    Turn SIGTERM and SIGHUP into SystemExit so that `finally` blocks and atexit
+    handlers (which drain FileManager buffers) run on a service stop. The
+    actual drain happens outside the signal handler, where taking locks is safe.
+    Must be called from the main thread.
+
+    Args:
+        stop (callable): Tried first, e.g. Scheduler.stop, so a running
+            scheduler seals the files and shuts down in order; SystemExit is
+            raised only if it returns False
+    """
+    def _raise_exit(signum, frame):
+        logger.info("Received signal %s; shutting down.", signum)
+        if stop is not None and stop():
+            return
+        raise SystemExit(0)
+
+    for sig in (signal.SIGTERM, signal.SIGHUP):
+        try:
+            signal.signal(sig, _raise_exit)
+        except (ValueError, OSError) as e:
+            logger.warning("Could not install handler for signal %s: %s", sig, e)
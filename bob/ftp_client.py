@@ -1,27 +1,422 @@
+import os
+import json
+import atexit
+import ftplib
+import logging
+import threading
+import time
+from contextlib import contextmanager
 from ftplib import FTP_TLS
-from .config import FTP_DETAILS
+from .bandwidth import bandwidth
+from .compression import CompressingReader
+from .config import (FTP_DETAILS, FTP_TIMEOUT, FTP_POOL_SIZE, FTP_KEEPALIVE_INTERVAL,
+                     FTP_IDLE_TIMEOUT, UPLOAD_MANIFEST_FILE)
+
+logger = logging.getLogger('bob.ftp_client')
+
+# Errors after which a connection can no longer be trusted and is discarded
+# rather than returned to the pool: any socket-level OSError (reset, timeout,
+# TLS failure, ENETUNREACH when the link drops), a closed connection or a
+# transient/garbled reply. Permanent replies (e.g. 550 file not found) leave
+# the control connection usable.
+CONNECTION_ERRORS = (OSError, EOFError, ftplib.error_temp, ftplib.error_proto,
+                     ftplib.error_reply)
+
+# OSErrors from opening a local file (a missing or unreadable data file), which
+# say nothing about the link. Catch these before CONNECTION_ERRORS.
+LOCAL_FILE_ERRORS = (FileNotFoundError, PermissionError, IsADirectoryError,
+                     NotADirectoryError)
+
+
+class ReusedSessionFTP_TLS(FTP_TLS):
+    """
+    FTP_TLS that resumes the control connection's TLS session on each data
+    connection, so transfers skip a full handshake. Many servers (vsftpd with
+    require_ssl_reuse, FileZilla Server) also insist on this.
+    """
+    def ntransfercmd(self, cmd, rest=None):
+        conn, size = ftplib.FTP.ntransfercmd(self, cmd, rest)
+        if self._prot_p:
+            conn = self.context.wrap_socket(conn, server_hostname=self.host,
+                                            session=self.sock.session)
+        return conn, size
+
+
+class UploadManifest:
+    """
+    Persists how many bytes of each upload have been sent, keyed by remote
+    filename, so an interrupted upload can resume where it stopped even if
+    the server does not support SIZE. An entry also records the local file's
+    path, size and mtime: it is the only proof that bytes already on the
+    server came from that file.
+    """
+    def __init__(self, path=None):
+        self.path = path or UPLOAD_MANIFEST_FILE
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning("Ignoring unreadable upload manifest %s: %s", self.path, e)
+            return {}
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, remote_filename, local_filepath, size, mtime):
+        """
+        Returns:
+            int: Bytes already sent for this file, or 0 if the entry is for a different file
+        """
+        with self._lock:
+            entry = self._entries.get(remote_filename)
+        if (entry and entry['local'] == local_filepath and entry['size'] == size and
+                entry.get('mtime') == mtime):
+            return entry['offset']
+        return 0
+
+    def update(self, remote_filename, local_filepath, size, mtime, offset):
+        with self._lock:
+            self._entries[remote_filename] = {'local': local_filepath, 'size': size,
+                                              'mtime': mtime, 'offset': offset}
+            self._save()
+
+    def remove(self, remote_filename):
+        with self._lock:
+            if self._entries.pop(remote_filename, None) is not None:
+                self._save()
+
+
+upload_manifest = UploadManifest()
+
 
 class FTPClient:
     def __init__(self):
         """Initialize the secure FTP connection using FTP_TLS."""
-        self.ftp = FTP_TLS(FTP_DETAILS['host'])
+        self.ftp = ReusedSessionFTP_TLS(FTP_DETAILS['host'], timeout=FTP_TIMEOUT)
         self.ftp.login(FTP_DETAILS['user'], FTP_DETAILS['pass'])
         self.ftp.prot_p()  # Secure the data connection.
+        self.last_activity = time.monotonic()
+        self.last_released = self.last_activity
 
     def change_directory(self, directory: str) -> None:
         """Change the working directory on the FTP server."""
         self.ftp.cwd(directory)
 
-    def upload_file(self, local_filepath: str, remote_filename: str) -> None:
-        """Upload a local file to the FTP server."""
+    def upload_file(self, local_filepath: str, remote_filename: str, resume: bool = False,
+                    codec: str = 'none', level: int = None) -> dict:
+        """
+        Upload a local file to the FTP server.
+
+        With resume=True, only the part of the file the server does not have yet
+        is sent (see upload_file_resumable). With a codec other than 'none', the
+        file is compressed on the fly; the caller chooses the remote name
+        (normally with the codec's extension).
+
+        Uploads wait out speedtest quiet windows and are rate limited by the
+        shared bandwidth coordinator.
+
+        Returns:
+            dict: Transfer statistics (see CompressingReader.stats) plus bytes_sent
+        """
+        if resume:
+            return self.upload_file_resumable(local_filepath, remote_filename,
+                                              codec=codec, level=level)
+        with bandwidth.transfer(f"Upload of {remote_filename}"), open(local_filepath, 'rb') as f:
+            source = CompressingReader(f, codec, level)
+            self.ftp.storbinary(f'STOR {remote_filename}', source, callback=bandwidth.throttle)
+        stats = source.stats()
+        stats['bytes_sent'] = source.bytes_out
+        return stats
+
+    def remote_size(self, remote_filename: str):
+        """
+        Returns:
+            int: Size of the remote file, 0 if it does not exist, or None if the
+            server does not support SIZE
+        """
+        try:
+            self.ftp.voidcmd('TYPE I')  # SIZE is only reliable in binary mode.
+            return self.ftp.size(remote_filename) or 0
+        except ftplib.error_perm as e:
+            if str(e).startswith('550'):
+                return 0
+            return None
+
+    def upload_file_resumable(self, local_filepath: str, remote_filename: str,
+                              manifest: UploadManifest = None, codec: str = 'none',
+                              level: int = None, checkpoint_bytes: int = 262144) -> dict:
+        """
+        Upload only the missing tail of a file using APPE (or REST + STOR).
+
+        Only a manifest entry for the same local path, size and mtime proves
+        that the remote file holds the start of this one; without it the file
+        is sent from the beginning with STOR, replacing whatever has the same
+        name on the server. With that proof the remote size from SIZE is
+        authoritative, or, if the server does not support SIZE, the recorded
+        offset is used with REST. The manifest is checkpointed every
+        checkpoint_bytes during the transfer.
+        Compressed uploads resume too: the compressed stream is deterministic,
+        so the bytes already on the server are regenerated and skipped.
+
+        Returns:
+            dict: Transfer statistics (see CompressingReader.stats) plus bytes_sent
+        """
+        manifest = manifest or upload_manifest
+        with bandwidth.transfer(f"Upload of {remote_filename}"):
+            return self._upload_missing_tail(local_filepath, remote_filename, manifest,
+                                             codec, level, checkpoint_bytes)
+
+    def _upload_missing_tail(self, local_filepath, remote_filename, manifest, codec, level,
+                             checkpoint_bytes):
+        stat = os.stat(local_filepath)
+        size, mtime = stat.st_size, stat.st_mtime_ns
+        # Bytes of this file known to be on the server. The entry is written
+        # before STOR truncates the remote file, so an offset of 0 proves nothing.
+        recorded = manifest.get(remote_filename, local_filepath, size, mtime)
+        remote_size = self.remote_size(remote_filename) if recorded else 0
+        use_rest = remote_size is None
+        if use_rest:
+            offset = recorded
+        elif remote_size >= recorded:
+            offset = remote_size
+        else:
+            logger.warning("Remote %s is shorter than the %d bytes already sent; re-uploading.",
+                           remote_filename, recorded)
+            offset = 0
+
         with open(local_filepath, 'rb') as f:
-            self.ftp.storbinary(f'STOR {remote_filename}', f)
+            source = CompressingReader(f, codec, level)
+            if offset and source.skip(offset) < offset:
+                # The remote file is not a prefix of ours; start over.
+                logger.warning("Remote %s is larger than the local data; re-uploading.",
+                               remote_filename)
+                f.seek(0)
+                source = CompressingReader(f, codec, level)
+                offset = 0
+            skipped_stats = (source.bytes_out, source.bytes_in)
+
+            if offset and source.exhausted():
+                logger.info("%s already fully uploaded (%d bytes).", remote_filename, offset)
+                manifest.remove(remote_filename)
+                stats = source.stats()
+                stats['bytes_sent'] = 0
+                return stats
+            if offset:
+                logger.info("Resuming upload of %s at byte %d.", remote_filename, offset)
+
+            if offset and not use_rest:
+                command, rest = f'APPE {remote_filename}', None
+            else:
+                command, rest = f'STOR {remote_filename}', (offset or None)
+
+            sent = [offset, offset]  # [bytes sent so far, last checkpoint]
+
+            def checkpoint(block):
+                bandwidth.throttle(len(block))
+                sent[0] += len(block)
+                if sent[0] - sent[1] >= checkpoint_bytes:
+                    manifest.update(remote_filename, local_filepath, size, mtime, sent[0])
+                    sent[1] = sent[0]
+
+            manifest.update(remote_filename, local_filepath, size, mtime, offset)
+            self.ftp.storbinary(command, source, callback=checkpoint, rest=rest)
+        manifest.remove(remote_filename)
+        stats = source.stats()
+        stats['bytes_sent'] = source.bytes_out - skipped_stats[0]
+        return stats
 
     def download_file(self, remote_filename: str, local_filepath: str) -> None:
         """Download a file from the FTP server to a local path."""
-        with open(local_filepath, 'wb') as f:
-            self.ftp.retrbinary(f'RETR {remote_filename}', f.write)
+        def write(block):
+            f.write(block)
+            bandwidth.throttle(len(block))
+
+        with bandwidth.transfer(f"Download of {remote_filename}"), open(local_filepath, 'wb') as f:
+            self.ftp.retrbinary(f'RETR {remote_filename}', write)
+
+    def noop(self) -> None:
+        """Send a NOOP to keep the control connection alive."""
+        self.ftp.voidcmd('NOOP')
+        self.last_activity = time.monotonic()
 
     def quit(self) -> None:
         """Terminate the FTP connection."""
-        self.ftp.quit()
+        try:
+            self.ftp.quit()
+        except Exception:
+            # The server may already have dropped the connection.
+            self.ftp.close()
+
+
+class FTPConnectionPool:
+    """
+    Keeps authenticated FTPS control connections alive between uses so that
+    activation checks, uploads and update downloads do not each pay a full
+    TCP + TLS handshake and login. Idle connections get a NOOP every
+    ``keepalive_interval`` seconds and are closed after ``idle_timeout``.
+    Dead connections are replaced transparently when leased.
+
+    Usage:
+        with ftp_pool.lease() as ftp_client:
+            ftp_client.change_directory(...)
+            ftp_client.upload_file(...)
+    """
+    def __init__(self, max_size=None, keepalive_interval=None, idle_timeout=None):
+        """
+        Args:
+            max_size (int): Maximum number of connections open at once
+            keepalive_interval (float): Seconds between NOOPs on idle connections
+            idle_timeout (float): Seconds after which an idle connection is closed
+        """
+        self.max_size = max_size or FTP_POOL_SIZE
+        self.keepalive_interval = keepalive_interval or FTP_KEEPALIVE_INTERVAL
+        self.idle_timeout = idle_timeout or FTP_IDLE_TIMEOUT
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+        self._keepalive_thread = None
+        self._closed = False
+
+    def ensure_capacity(self, size):
+        """Allow at least size connections to be open at once."""
+        with self._condition:
+            if size > self.max_size:
+                self.max_size = size
+                self._condition.notify_all()
+
+    def _start_keepalive(self):
+        if self._keepalive_thread is None or not self._keepalive_thread.is_alive():
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop,
+                                                      name='bob-ftp-keepalive', daemon=True)
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait(self.keepalive_interval)
+                if self._closed:
+                    return
+                now = time.monotonic()
+                due = [c for c in self._idle if now - c.last_activity >= self.keepalive_interval]
+                for client in due:
+                    self._idle.remove(client)
+            for client in due:
+                if time.monotonic() - client.last_released >= self.idle_timeout:
+                    logger.info("Closing idle FTP connection.")
+                    self._discard(client)
+                    continue
+                try:
+                    client.noop()
+                    self._return(client)
+                except Exception as e:
+                    logger.warning("FTP keepalive failed; dropping connection: %s", e)
+                    self._discard(client)
+
+    def _connect(self):
+        client = FTPClient()
+        logger.info("Opened FTP connection to %s", FTP_DETAILS['host'])
+        return client
+
+    def _acquire(self):
+        with self._condition:
+            while True:
+                if self._idle:
+                    client = self._idle.pop()
+                    break
+                if self._open < self.max_size:
+                    self._open += 1
+                    client = None
+                    break
+                self._condition.wait()
+
+        if client is not None:
+            # Connections idle longer than the keepalive interval may have been
+            # dropped by the server or a NAT; check before handing them out.
+            if time.monotonic() - client.last_activity < self.keepalive_interval:
+                return client
+            try:
+                client.noop()
+                return client
+            except Exception as e:
+                logger.info("Pooled FTP connection is dead, reconnecting: %s", e)
+                client.quit()
+        try:
+            client = self._connect()
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify_all()
+            raise
+        self._start_keepalive()
+        return client
+
+    def _release(self, client):
+        """Return a client to the pool after a lease."""
+        client.last_activity = client.last_released = time.monotonic()
+        self._return(client)
+
+    def _return(self, client):
+        with self._condition:
+            if self._closed:
+                self._open -= 1
+                client.quit()
+            else:
+                self._idle.append(client)
+            # The keepalive thread waits on the same condition, so a single
+            # notify() could wake it instead of a waiting lease.
+            self._condition.notify_all()
+
+    def _discard(self, client):
+        try:
+            client.quit()
+        except Exception:
+            pass
+        with self._condition:
+            self._open -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def lease(self):
+        """
+        Lease a connected FTPClient for the duration of a ``with`` block.
+        The connection is returned to the pool afterwards, or discarded if the
+        block raised a connection-level error.
+        """
+        client = self._acquire()
+        try:
+            yield client
+        except LOCAL_FILE_ERRORS:
+            self._release(client)
+            raise
+        except CONNECTION_ERRORS:
+            self._discard(client)
+            raise
+        except BaseException:
+            self._release(client)
+            raise
+        else:
+            self._release(client)
+
+    def close_all(self):
+        """Close all idle connections and stop the keepalive thread."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for client in idle:
+            client.quit()
+
+
+# Shared pool used by the activation, uploader and updater modules.
+ftp_pool = FTPConnectionPool()
+atexit.register(ftp_pool.close_all)
@@ -0,0 +1,70 @@
+# File: bob/geojoin.py
+import logging
+import collections
+from bob.track import distance
+from bob.config import GEO_JOIN_METHOD, GEO_JOIN_MAX_ERROR
+
+logger = logging.getLogger('bob.geojoin')
+
+# 'nearest'     - the fix closest to the middle of the test
+# 'interpolate' - position interpolated between the fixes either side of it
+JOIN_METHODS = ('nearest', 'interpolate')
+
+# Where a measurement was taken. error is the join error in seconds: the
+# distance in time to the fix used ('nearest'), or the longest gap to the
+# two fixes interpolated between. moved is the distance in metres covered
+# by the fixes recorded during the test.
+GeoTag = collections.namedtuple('GeoTag', ['latitude', 'longitude', 'error', 'moved'])
+
+
+def _epoch(fix):
+    return fix.timestamp.timestamp()
+
+
+def _nearest(before, after, mid):
+    candidates = [fix for fix in (before, after) if fix is not None]
+    if not candidates:
+        return None
+    fix = min(candidates, key=lambda f: abs(_epoch(f) - mid))
+    return fix.latitude, fix.longitude, abs(_epoch(fix) - mid)
+
+
+def _interpolate(before, after, mid):
+    if before is None or after is None or _epoch(after) == _epoch(before):
+        return _nearest(before, after, mid)
+    t0, t1 = _epoch(before), _epoch(after)
+    f = (mid - t0) / (t1 - t0)
+    return (before.latitude + f * (after.latitude - before.latitude),
+            before.longitude + f * (after.longitude - before.longitude),
+            max(mid - t0, t1 - mid))
+
+
+def geotag(gps_reader, start, end, method=None, max_error=None):
+    """
+    Locate a measurement that ran from start to end using the GPS reader's
+    time-ordered fix buffer.
+
+    Args:
+        gps_reader (GPSReader): Source of fixes
+        start (datetime): When the measurement started
+        end (datetime): When it finished
+        method (str): One of JOIN_METHODS
+        max_error (float): Largest acceptable join error in seconds
+
+    Returns:
+        GeoTag: The location, or None if no fix is close enough
+    """
+    method = method or GEO_JOIN_METHOD
+    if method not in JOIN_METHODS:
+        raise ValueError(f"Unknown join method: {method}")
+    max_error = GEO_JOIN_MAX_ERROR if max_error is None else max_error
+    t_start, t_end = start.timestamp(), end.timestamp()
+    mid = (t_start + t_end) / 2.0
+    before, after = gps_reader.bracket(mid)
+    located = (_nearest if method == 'nearest' else _interpolate)(before, after, mid)
+    if located is None or located[2] > max_error:
+        return None
+    during = gps_reader.between(t_start, t_end)
+    moved = sum(distance((a.latitude, a.longitude), (b.latitude, b.longitude))
+                for a, b in zip(during, during[1:]))
+    return GeoTag(located[0], located[1], located[2], moved)
@@ -1,10 +1,30 @@
 # bob/gps.py
 
+import sys
+import time
 import serial
+import bisect
 import datetime
-import pytz
+import threading
+import collections
 from bob.logger import logger
-from bob.config import GPS_PORT, GPS_BAUDRATE
+from bob.config import GPS_PORT, GPS_BAUDRATE, GPS_TIMEOUT, GPS_BUFFER_SIZE
+
+# Seconds to wait before reopening the serial port after an error
+REOPEN_DELAY = 5
+
+UTC = datetime.timezone.utc
+
+# Talker IDs accepted: GPS, multi-constellation and GLONASS receivers
+TALKERS = (b'GP', b'GN', b'GL')
+
+# A position fix. timestamp is the receiver's UTC time; speed is in km/h and
+# course in degrees. Fields the receiver has not reported are None.
+GPSFix = collections.namedtuple(
+    'GPSFix',
+    ['timestamp', 'latitude', 'longitude', 'quality', 'satellites', 'hdop', 'altitude',
+     'speed', 'course'],
+    defaults=(None,) * 6)
 
 def open_gps():
     """
@@ -18,53 +38,177 @@ def open_gps():
         logger.error("Could not open GPS serial connection: %s", e)
         return None
 
-def decode_gps(coord):
+def split_sentence(line):
     """
-    Convert an NMEA coordinate in the format DDDMM.MMMMM to decimal degrees.
+    Validate an NMEA sentence's *hh checksum and split it into fields.
+
+    Args:
+        line (bytes): Raw sentence, with or without the trailing CR/LF
+
+    Returns:
+        list: Fields as bytes (the first is talker + sentence type), or None if invalid
     """
+    line = line.strip()
+    star = line.rfind(b'*')
+    if not line.startswith(b'$') or star < 0 or len(line) - star != 3:
+        return None
+    body = line[1:star]
     try:
-        parts = coord.split(".")
-        if len(parts) != 2:
-            return None
-        head = parts[0]  # DDDMM
-        tail = parts[1]  # MMMMM
-        if len(head) < 3:
-            return None
-        degrees = head[:-2]
-        minutes = head[-2:] + "." + tail
-        decimal_minutes = float(minutes) / 60.0
-        return int(degrees) + decimal_minutes
-    except Exception as e:
-        logger.error("Error decoding GPS coordinate %s: %s", coord, e)
+        expected = int(line[star + 1:], 16)
+    except ValueError:
+        return None
+    checksum = 0
+    for byte in body:
+        checksum ^= byte
+    if checksum != expected:
         return None
+    return body.split(b',')
 
-def parse_gps(data):
+def _coordinate(value, hemisphere):
+    """Convert an NMEA DDDMM.MMMM field to signed decimal degrees."""
+    if not value:
+        return None
+    raw = float(value)
+    degrees = int(raw // 100)
+    result = degrees + (raw - degrees * 100) / 60.0
+    return -result if hemisphere in (b'S', b'W') else result
+
+def _seconds_of_day(value):
+    """Convert an NMEA hhmmss.sss field to seconds since midnight."""
+    return int(value[0:2]) * 3600 + int(value[2:4]) * 60 + float(value[4:])
+
+def _float(value):
+    return float(value) if value else None
+
+class NMEAParser:
     """
-    Parse an NMEA sentence ($GPGGA) and extract timestamp, latitude, and longitude.
+    Incremental NMEA 0183 parser for GGA, RMC, GSA and VTG sentences from
+    GP/GN/GL talkers.
+
+    Sentences are parsed straight from the bytes read off the serial port,
+    with no decoding or per-sentence timezone lookups. GGA sentences produce
+    fixes; RMC supplies the UTC date (and the fix when a receiver sends no
+    GGA); VTG and RMC supply speed and course; GSA supplies the 2D/3D fix
+    type and dilution of precision, kept on the parser.
     """
-    if "$GPGGA" not in data:
-        return None
-    parts = data.split(",")
-    if len(parts) < 6:
-        return None
-    try:
-        lat = decode_gps(parts[2])
-        if lat is None:
+    def __init__(self):
+        self.date = None            # UTC date from the last valid RMC
+        self._date_seconds = None   # time of day of that RMC
+        self.speed = None           # km/h
+        self.course = None          # degrees true
+        self.fix_type = None        # 1 = none, 2 = 2D, 3 = 3D (GSA)
+        self.pdop = self.hdop = self.vdop = None
+        self.sentences = 0
+        self.bad_checksums = 0
+        self.errors = 0
+        self._seen_gga = False
+        self._handlers = {b'GGA': self._gga, b'RMC': self._rmc, b'GSA': self._gsa,
+                          b'VTG': self._vtg}
+
+    def feed(self, line):
+        """
+        Parse one sentence.
+
+        Args:
+            line (bytes): Raw sentence
+
+        Returns:
+            GPSFix: A new fix, or None if the sentence did not complete one
+        """
+        fields = split_sentence(line)
+        if fields is None:
+            if line.strip():
+                self.bad_checksums += 1
             return None
-        if parts[3] == "S":
-            lat = -lat
-        lon = decode_gps(parts[4])
-        if lon is None:
+        tag = fields[0]
+        if tag[:2] not in TALKERS:
             return None
-        if parts[5] == "W":
-            lon = -lon
-        tz = pytz.timezone("America/Chicago")
-        timestamp = datetime.datetime.now(tz)
-        return [timestamp, lat, lon]
-    except Exception as e:
-        logger.error("Error parsing GPS data: %s", e)
+        handler = self._handlers.get(tag[2:])
+        if handler is None:
+            return None
+        self.sentences += 1
+        try:
+            return handler(fields)
+        except (ValueError, IndexError):
+            self.errors += 1
+            return None
+
+    def _timestamp(self, seconds):
+        """Combine a receiver time of day with the last known UTC date."""
+        if self.date is None:
+            # No RMC yet: take the date from the system clock.
+            date = datetime.datetime.now(UTC).date()
+        else:
+            date = self.date
+            # Handle fixes that straddle midnight relative to the last RMC.
+            if seconds - self._date_seconds < -43200:
+                date += datetime.timedelta(days=1)
+            elif seconds - self._date_seconds > 43200:
+                date -= datetime.timedelta(days=1)
+        whole = int(seconds)
+        return datetime.datetime(date.year, date.month, date.day, whole // 3600,
+                                 whole // 60 % 60, whole % 60,
+                                 int(round((seconds - whole) * 1e6)) % 1000000, tzinfo=UTC)
+
+    def _gga(self, f):
+        # $xxGGA,time,lat,N,lon,E,quality,satellites,hdop,altitude,M,...
+        self._seen_gga = True
+        quality = int(f[6] or 0)
+        if not quality or not f[1]:
+            return None
+        latitude = _coordinate(f[2], f[3])
+        longitude = _coordinate(f[4], f[5])
+        if latitude is None or longitude is None:
+            return None
+        return GPSFix(self._timestamp(_seconds_of_day(f[1])), latitude, longitude, quality,
+                      int(f[7]) if f[7] else None, _float(f[8]), _float(f[9]),
+                      self.speed, self.course)
+
+    def _rmc(self, f):
+        # $xxRMC,time,status,lat,N,lon,E,speed(knots),course,date(ddmmyy),...
+        if f[2] != b'A' or not f[1] or not f[9]:
+            return None
+        seconds = _seconds_of_day(f[1])
+        date = f[9]
+        self.date = datetime.date(2000 + int(date[4:6]), int(date[2:4]), int(date[0:2]))
+        self._date_seconds = seconds
+        if f[7]:
+            self.speed = float(f[7]) * 1.852
+        self.course = _float(f[8])
+        if self._seen_gga:
+            return None
+        latitude = _coordinate(f[3], f[4])
+        longitude = _coordinate(f[5], f[6])
+        if latitude is None or longitude is None:
+            return None
+        return GPSFix(self._timestamp(seconds), latitude, longitude,
+                      speed=self.speed, course=self.course)
+
+    def _gsa(self, f):
+        # $xxGSA,mode,fix type,12 x satellite id,pdop,hdop,vdop[,system id]
+        self.fix_type = int(f[2]) if f[2] else None
+        self.pdop, self.hdop, self.vdop = _float(f[15]), _float(f[16]), _float(f[17])
         return None
 
+    def _vtg(self, f):
+        # $xxVTG,course,T,course(magnetic),M,speed,N,speed(km/h),K[,mode]
+        if f[7]:
+            self.speed = float(f[7])
+        if f[1]:
+            self.course = float(f[1])
+        return None
+
+_parser = NMEAParser()
+
+def parse_gps(data):
+    """
+    Parse a single NMEA sentence and return a GPSFix if it completes one.
+    Accepts bytes or str.
+    """
+    if isinstance(data, str):
+        data = data.encode('ascii', 'ignore')
+    return _parser.feed(data)
+
 def read_gps():
     """
     Attempt to read valid GPS data from the serial connection.
@@ -75,10 +219,10 @@ def read_gps():
     attempts = 0
     while attempts < 50:
         try:
-            line = ser.readline().decode("utf-8", "ignore")
+            line = ser.readline()
         except Exception as e:
             logger.error("Error reading GPS serial data: %s", e)
-            line = ""
+            line = b""
         data = parse_gps(line)
         if data:
             ser.close()
@@ -89,7 +233,199 @@ def read_gps():
     logger.error("Unable to obtain valid GPS data after %d attempts", attempts)
     return None
 
+class GPSReader:
+    """
+    Background thread that keeps the GPS serial port open and parses the NMEA
+    stream as it arrives, so no sentence is thrown away between samples and
+    callers never wait on the port.
+
+    Fixes are kept in a bounded ring buffer ordered by time. ``latest()``,
+    ``closest()`` and ``between()`` only take a short lock and never touch
+    the serial port. If the port fails it is reopened after REOPEN_DELAY seconds.
+    """
+    def __init__(self, port=None, baudrate=None, timeout=None, buffer_size=None):
+        """
+        Args:
+            port (str): Serial device
+            baudrate (int): Serial speed
+            timeout (float): Serial read timeout in seconds
+            buffer_size (int): Number of fixes kept in memory
+        """
+        self.port = port or GPS_PORT
+        self.baudrate = baudrate or GPS_BAUDRATE
+        self.timeout = timeout or GPS_TIMEOUT
+        size = buffer_size or GPS_BUFFER_SIZE
+        self._times = collections.deque(maxlen=size)   # epoch seconds, for bisect
+        self._fixes = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.parser = NMEAParser()
+        self.fixes = 0
+
+    def start(self):
+        """Start the reader thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='bob-gps-reader', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the reader thread and close the port."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.timeout + 1)
+
+    def _open(self):
+        try:
+            ser = serial.Serial(self.port, baudrate=self.baudrate, timeout=self.timeout)
+            logger.info("GPS reader opened %s", self.port)
+            return ser
+        except Exception as e:
+            logger.error("Could not open GPS serial connection: %s", e)
+            return None
+
+    def _run(self):
+        ser = None
+        while not self._stop_event.is_set():
+            if ser is None:
+                ser = self._open()
+                if ser is None:
+                    self._stop_event.wait(REOPEN_DELAY)
+                    continue
+            try:
+                line = ser.readline()
+            except Exception as e:
+                logger.error("Error reading GPS serial data: %s", e)
+                ser.close()
+                ser = None
+                self._stop_event.wait(REOPEN_DELAY)
+                continue
+            if line:
+                self.add(self.parser.feed(line))
+        if ser is not None:
+            ser.close()
+
+    def add(self, data):
+        """
+        Append a GPSFix (or a [timestamp, lat, lon] sequence); None is ignored.
+        A fix with the same timestamp as the newest one (e.g. GGA after RMC for
+        the same second) fills in the fields the stored fix is missing.
+        """
+        if not data:
+            return
+        fix = GPSFix(*data)
+        key = fix.timestamp.timestamp()
+        with self._lock:
+            if self._times and key == self._times[-1]:
+                stored = self._fixes[-1]
+                self._fixes[-1] = stored._replace(**{
+                    field: value for field, value in zip(fix._fields, fix)
+                    if getattr(stored, field) is None and value is not None})
+                return
+            if self._times and key < self._times[-1]:
+                return  # Keep the buffer ordered; drop out-of-order fixes.
+            self._times.append(key)
+            self._fixes.append(fix)
+            self.fixes += 1
+
+    def latest(self, max_age=None):
+        """
+        Returns:
+            GPSFix: The newest fix, or None if there is none or it is older than max_age seconds
+        """
+        with self._lock:
+            if not self._fixes:
+                return None
+            key, fix = self._times[-1], self._fixes[-1]
+        if max_age is not None and datetime.datetime.now().timestamp() - key > max_age:
+            return None
+        return fix
+
+    def closest(self, when, max_delta=None):
+        """
+        Args:
+            when (datetime or float): Time to look up (datetime or epoch seconds)
+            max_delta (float): Largest acceptable distance in seconds
+
+        Returns:
+            GPSFix: The fix nearest in time, or None
+        """
+        key = when.timestamp() if isinstance(when, datetime.datetime) else when
+        with self._lock:
+            i = bisect.bisect_left(self._times, key)
+            candidates = [j for j in (i - 1, i) if 0 <= j < len(self._times)]
+            if not candidates:
+                return None
+            best = min(candidates, key=lambda j: abs(self._times[j] - key))
+            delta, fix = abs(self._times[best] - key), self._fixes[best]
+        if max_delta is not None and delta > max_delta:
+            return None
+        return fix
+
+    def bracket(self, when):
+        """
+        Args:
+            when (datetime or float): Time to look up (datetime or epoch seconds)
+
+        Returns:
+            tuple: (last fix at or before when, first fix after when); either may be None
+        """
+        key = when.timestamp() if isinstance(when, datetime.datetime) else when
+        with self._lock:
+            i = bisect.bisect_right(self._times, key)
+            before = self._fixes[i - 1] if i > 0 else None
+            after = self._fixes[i] if i < len(self._fixes) else None
+        return before, after
+
+    def between(self, start, end):
+        """
+        Returns:
+            list: Fixes with start <= timestamp <= end (datetimes or epoch seconds)
+        """
+        start = start.timestamp() if isinstance(start, datetime.datetime) else start
+        end = end.timestamp() if isinstance(end, datetime.datetime) else end
+        with self._lock:
+            lo = bisect.bisect_left(self._times, start)
+            hi = bisect.bisect_right(self._times, end)
+            return [self._fixes[j] for j in range(lo, hi)]
+
+
+def _with_checksum(body):
+    checksum = 0
+    for byte in body:
+        checksum ^= byte
+    return b'$%s*%02X\r\n' % (body, checksum)
+
+# One second of output from a typical multi-constellation receiver.
+SAMPLE_SENTENCES = [_with_checksum(body) for body in (
+    b'GNRMC,123519.00,A,4807.03800,N,01131.00000,E,0.022,,170926,,,A',
+    b'GNVTG,,T,,M,0.022,N,0.041,K,A',
+    b'GNGGA,123519.00,4807.03800,N,01131.00000,E,1,08,0.90,545.4,M,46.9,M,,',
+    b'GNGSA,A,3,04,05,09,12,24,25,,,,,,,1.80,0.90,1.50',
+    b'GPGSV,2,1,08,01,40,083,46,02,17,308,41,12,07,344,39,14,22,228,45',
+)]
+
+def benchmark(count=100000):
+    """
+    Measure NMEAParser throughput on SAMPLE_SENTENCES.
+
+    Returns:
+        float: Sentences parsed per second
+    """
+    parser = NMEAParser()
+    lines = SAMPLE_SENTENCES
+    n = len(lines)
+    start = time.perf_counter()
+    for i in range(count):
+        parser.feed(lines[i % n])
+    return count / (time.perf_counter() - start)
+
+
 if __name__ == '__main__':
+    if '--benchmark' in sys.argv:
+        print("NMEA parser: %.0f sentences/s" % benchmark())
+        sys.exit(0)
     gps_data = read_gps()
     if gps_data:
         print("GPS Data:", gps_data)
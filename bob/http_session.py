@@ -0,0 +1,62 @@
+# File: bob/http_session.py
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from bob.config import HTTP_POOL_SIZE
+
+logger = logging.getLogger('bob.http_session')
+
+USER_AGENT = 'bob/2.0'
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Shared requests.Session for bob's HTTP calls.
+
+    Reusing one session keeps TCP (and TLS) connections to each host open
+    between calls instead of paying DNS and handshake costs every time. The
+    adapter's pool holds up to ``HTTP_POOL_SIZE`` connections per host, enough
+    for the concurrent connectivity and public IP probes. Retries are left to
+    the callers, which already race several endpoints.
+
+    Returns:
+        requests.Session: The process-wide session
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                                  max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = USER_AGENT
+            _session = session
+        return _session
+
+
+def http_get(url, timeout, **kwargs):
+    """
+    GET a URL over the shared session.
+
+    Args:
+        url (str): URL to fetch
+        timeout (float): Seconds before the request is abandoned
+
+    Returns:
+        requests.Response: The response
+    """
+    return get_session().get(url, timeout=timeout, **kwargs)
+
+
+def close_session():
+    """Close pooled connections, e.g. at shutdown."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
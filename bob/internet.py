@@ -1,37 +1,325 @@
 # File: bob/internet.py
-import requests
-import logging
+import os
 import time
+import socket
+import struct
+import logging
+import ipaddress
+import threading
+import concurrent.futures
+from bob.http_session import http_get
+from bob.config import (CONNECTIVITY_TTL, CONNECTIVITY_TIMEOUT, PUBLIC_IP_PROVIDERS,
+                        PUBLIC_IP_TTL)
 
 logger = logging.getLogger('bob.internet')
 
-def check_internet(timeout=3, retries=10):
+# Independent ways of reaching the internet, probed concurrently; any one
+# succeeding means online. HTTP probes must return 204, so a captive portal's
+# redirect does not make them succeed, but a portal that lets TCP or DNS
+# through still counts as online.
+CONNECTIVITY_PROBES = (
+    ('http', 'http://connectivitycheck.gstatic.com/generate_204'),
+    ('http', 'http://clients3.google.com/generate_204'),
+    ('tcp', ('1.1.1.1', 443)),
+    ('tcp', ('8.8.8.8', 53)),
+    ('dns', ('9.9.9.9', 'pool.ntp.org')),
+)
+
+_DNS_TYPE_A = 1
+_DNS_CLASS_IN = 1
+
+
+def _dns_query(resolver, name, timeout):
+    """
+    Ask ``resolver`` directly for the A record of ``name`` over UDP, so a
+    success proves the resolver on the internet answered rather than a local
+    cache.
+
+    Raises:
+        Exception: No valid answer arrived within ``timeout`` seconds
+    """
+    query_id = struct.unpack('!H', os.urandom(2))[0]
+    question = b''.join(bytes([len(label)]) + label.encode('ascii')
+                        for label in name.split('.')) + b'\0'
+    packet = (struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + question +
+              struct.pack('!HH', _DNS_TYPE_A, _DNS_CLASS_IN))
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((resolver, 53))
+        sock.send(packet)
+        deadline = time.monotonic() + timeout
+        while True:
+            reply = sock.recv(512)
+            if len(reply) >= 12:
+                reply_id, flags, _, answers = struct.unpack('!HHHH', reply[:8])
+                if reply_id == query_id and flags & 0x8000:
+                    if flags & 0x000f or not answers:
+                        raise ConnectionError(f"{resolver} could not resolve {name}")
+                    return
+            sock.settimeout(max(0.001, deadline - time.monotonic()))
+
+
+def _probe(kind, target, timeout):
+    """
+    Run one connectivity probe.
+
+    Returns:
+        str: Description of the probe that succeeded
+
+    Raises:
+        Exception: The probe failed
     """
-    Check connectivity by attempting to access a known website (e.g., http://google.com).
-    Use exponential backoff on failures.
+    if kind == 'http':
+        response = http_get(target, timeout, allow_redirects=False)
+        if response.status_code != 204:
+            raise ConnectionError(f"{target} returned {response.status_code}")
+    elif kind == 'tcp':
+        socket.create_connection(target, timeout=timeout).close()
+        target = f"{target[0]}:{target[1]}"
+    else:
+        _dns_query(*target, timeout)
+        target = f"{target[1]} via {target[0]}"
+    return f"{kind} {target}"
+
+
+class ConnectivityMonitor:
+    """
+    Cached online/offline verdict.
+
+    ``check()`` runs every probe in CONNECTIVITY_PROBES concurrently and
+    returns as soon as one succeeds, so a check costs at most ``timeout``
+    seconds. The verdict is cached for ``ttl`` seconds; ``is_online()``
+    answers from the cache and only re-checks once it has expired. Stages
+    that talk to the network anyway can ``report()`` what they saw to keep
+    the verdict fresh for free. Link state changes are logged with how long
+    the previous state lasted, and every listener added with
+    ``add_listener()`` is called as ``listener(online)`` when the link goes
+    down or comes back (not for the first verdict).
     """
-    backoff = 1
-    for i in range(retries):
+    def __init__(self, probes=CONNECTIVITY_PROBES, ttl=None, timeout=None):
+        """
+        Args:
+            probes (tuple): (kind, target) pairs; kind is 'http', 'tcp' (target
+                (host, port)) or 'dns' (target (resolver, name))
+            ttl (float): Seconds a verdict stays valid
+            timeout (float): Seconds allowed for a check
+        """
+        self.probes = probes
+        self.ttl = ttl or CONNECTIVITY_TTL
+        self.timeout = timeout or CONNECTIVITY_TIMEOUT
+        self.online = None           # None until the first check
+        self.checked_at = None
+        self.changed_at = time.monotonic()
+        self.via = None              # probe that last proved the link up
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(probes), thread_name_prefix='bob-connectivity')
+
+    def add_listener(self, listener):
+        """Call ``listener(online)`` whenever the link goes down or comes back."""
+        self._listeners.append(listener)
+
+    def report(self, online, via=None):
+        """Record a verdict observed by a probe or by another stage."""
+        with self._lock:
+            now = time.monotonic()
+            changed = self.online is not None and online != self.online
+            if changed:
+                logger.info("Link went %s after %.0fs %s%s.",
+                            'up' if online else 'down', now - self.changed_at,
+                            'offline' if online else 'online',
+                            f" (via {via})" if via else "")
+            if online != self.online:
+                self.changed_at = now
+            self.online = online
+            self.checked_at = now
+            if online:
+                self.via = via
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener(online)
+                except Exception as e:
+                    logger.error("Connectivity listener failed: %s", e)
+
+    def check(self):
+        """
+        Probe connectivity now.
+
+        Returns:
+            bool: True if any probe succeeded within the timeout
+        """
+        futures = [self._executor.submit(_probe, kind, target, self.timeout)
+                   for kind, target in self.probes]
+        errors = []
         try:
-            response = requests.get("http://google.com", timeout=timeout)
-            if response.ok:
-                logger.info("Internet connection is active.")
+            for future in concurrent.futures.as_completed(futures, timeout=self.timeout + 1):
+                try:
+                    via = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                for other in futures:
+                    other.cancel()
+                self.report(True, via)
                 return True
-        except requests.RequestException as e:
-            logger.warning("Internet check failed: %s", e)
-        time.sleep(backoff)
-        backoff *= 2
+        except concurrent.futures.TimeoutError:
+            errors.append("timed out")
+        logger.debug("All connectivity probes failed: %s", errors)
+        self.report(False)
+        return False
+
+    def is_online(self):
+        """
+        Returns:
+            bool: The cached verdict, re-checked if older than the TTL
+        """
+        with self._lock:
+            fresh = self.checked_at is not None and time.monotonic() - self.checked_at < self.ttl
+            online = self.online
+        return online if fresh else self.check()
+
+
+# Shared monitor so every stage sees the same link state.
+connectivity = ConnectivityMonitor()
+
+
+def check_internet(retries=3, backoff=1):
+    """
+    Check connectivity, retrying a few times with a short exponential
+    backoff. Each attempt probes several endpoints concurrently, so the
+    worst case is about ``retries * (CONNECTIVITY_TIMEOUT + 1)`` seconds plus
+    the backoff.
+
+    Returns:
+        bool: True if the internet is reachable
+    """
+    for attempt in range(retries):
+        if connectivity.check():
+            logger.info("Internet connection is active (%s).", connectivity.via)
+            return True
+        if attempt < retries - 1:
+            time.sleep(backoff)
+            backoff *= 2
     logger.error("Internet connection not available after %d attempts.", retries)
     return False
 
-def get_public_ip(timeout=3):
+
+def is_online():
+    """
+    Returns:
+        bool: Cached link state, refreshed at most every CONNECTIVITY_TTL seconds
+    """
+    return connectivity.is_online()
+
+
+def _fetch_ip(url, timeout):
+    """
+    Returns:
+        str: The address returned by a plain-text "what is my IP" service
+
+    Raises:
+        Exception: The request failed or did not return an IP address
+    """
+    response = http_get(url, timeout)
+    response.raise_for_status()
+    return str(ipaddress.ip_address(response.text.strip()))
+
+
+class PublicIPResolver:
     """
-    Get the public IP address from an external service.
+    Cached public IP with change notification.
+
+    ``resolve()`` asks every provider at once and takes the first valid
+    answer, so one slow or failing provider does not delay the lookup. The
+    address is cached for ``ttl`` seconds. When a lookup returns a different
+    address than the previous one (including the first lookup, with
+    ``old_ip`` None), every listener added with ``add_listener()`` is called
+    as ``listener(old_ip, new_ip)``, e.g. to re-rank speedtest servers.
     """
-    try:
-        ip = requests.get("http://api.ipify.org", timeout=timeout).text
-        logger.info("Public IP retrieved: %s", ip)
+    def __init__(self, providers=None, ttl=None, timeout=None):
+        """
+        Args:
+            providers (list): URLs returning the caller's IP as plain text
+            ttl (float): Seconds a resolved address is reused
+            timeout (float): Seconds allowed for a lookup
+        """
+        self.providers = list(providers or PUBLIC_IP_PROVIDERS)
+        self.ttl = ttl or PUBLIC_IP_TTL
+        self.timeout = timeout or CONNECTIVITY_TIMEOUT
+        self.ip = None
+        self.provider = None
+        self.resolved_at = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(self.providers), thread_name_prefix='bob-public-ip')
+
+    def add_listener(self, listener):
+        """Call ``listener(old_ip, new_ip)`` whenever the public IP changes."""
+        self._listeners.append(listener)
+
+    def _race(self):
+        futures = {self._executor.submit(_fetch_ip, url, self.timeout): url
+                   for url in self.providers}
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=self.timeout + 1):
+                try:
+                    ip = future.result()
+                except Exception as e:
+                    logger.debug("Public IP provider %s failed: %s", futures[future], e)
+                    continue
+                for other in futures:
+                    other.cancel()
+                return ip, futures[future]
+        except concurrent.futures.TimeoutError:
+            pass
+        return None, None
+
+    def resolve(self, force=False):
+        """
+        Returns:
+            str: The public IP, or None if no provider answered
+        """
+        with self._lock:
+            if (not force and self.ip is not None and
+                    time.monotonic() - self.resolved_at < self.ttl):
+                return self.ip
+        ip, provider = self._race()
+        if ip is None:
+            logger.error("Unable to retrieve public IP from %d provider(s).", len(self.providers))
+            return None
+        connectivity.report(True, 'public IP lookup')
+        with self._lock:
+            old, self.ip = self.ip, ip
+            self.provider = provider
+            self.resolved_at = time.monotonic()
+        if old != ip:
+            if old is None:
+                logger.info("Public IP retrieved: %s (from %s)", ip, provider)
+            else:
+                logger.info("Public IP changed from %s to %s (from %s)", old, ip, provider)
+            for listener in self._listeners:
+                try:
+                    listener(old, ip)
+                except Exception as e:
+                    logger.error("Public IP change listener failed: %s", e)
         return ip
-    except requests.RequestException as e:
-        logger.error("Unable to retrieve public IP: %s", e)
-        return None
+
+
+# Shared resolver so listeners see every change.
+public_ip = PublicIPResolver()
+
+
+def get_public_ip(force=False):
+    """
+    Get the public IP address, cached for PUBLIC_IP_TTL seconds.
+
+    Args:
+        force (bool): Ignore the cache
+
+    Returns:
+        str: The public IP, or None if it could not be retrieved
+    """
+    return public_ip.resolve(force)
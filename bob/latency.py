@@ -0,0 +1,250 @@
+# File: bob/latency.py
+import os
+import math
+import time
+import json
+import socket
+import struct
+import logging
+import threading
+from array import array
+from bob.config import (LATENCY_TARGETS, LATENCY_INTERVAL, LATENCY_TIMEOUT, LATENCY_BUFFER_SIZE,
+                        LATENCY_ICMP)
+
+logger = logging.getLogger('bob.latency')
+
+# Percentiles reported for each target
+PERCENTILES = (50, 95, 99)
+# Seconds between DNS lookups of a target's host name
+RESOLVE_INTERVAL = 3600
+
+_ICMP_ECHO_REQUEST = 8
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of (time, target, rtt) samples in flat arrays, so
+    memory does not grow and no per-sample objects are kept. A lost probe is
+    stored with an RTT of NaN. The oldest samples are overwritten when full.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.rtts = array('d', bytes(8 * capacity))
+        self.targets = array('H', bytes(2 * capacity))
+        self.next = 0       # total samples ever added; next % capacity is the write slot
+        self._lock = threading.Lock()
+
+    def append(self, when, target, rtt):
+        with self._lock:
+            slot = self.next % self.capacity
+            self.times[slot] = when
+            self.targets[slot] = target
+            self.rtts[slot] = rtt
+            self.next += 1
+
+    def since(self, position):
+        """
+        Args:
+            position (int): Value of ``next`` after the last sample already read
+
+        Returns:
+            tuple: (list of (time, target, rtt) samples added since ``position``,
+            number of those samples already overwritten, new position)
+        """
+        with self._lock:
+            end = self.next
+            start = max(position, end - self.capacity)
+            samples = [(self.times[i % self.capacity], self.targets[i % self.capacity],
+                        self.rtts[i % self.capacity]) for i in range(start, end)]
+        return samples, start - position, end
+
+
+def _percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+class LatencyProber:
+    """
+    Background RTT sampling between speedtests.
+
+    Every ``interval`` seconds each target is probed once with a TCP connect
+    (the handshake time is the RTT) and, when ``icmp`` is set, an ICMP echo
+    over an unprivileged ping socket. Samples go into a RingBuffer of
+    ``capacity`` entries, so probe cost and memory stay constant however long
+    the device runs. ``write_summary()`` turns the samples since the last
+    summary into loss, percentile and jitter figures per target.
+    """
+    def __init__(self, targets=None, interval=None, timeout=None, capacity=None, icmp=None):
+        """
+        Args:
+            targets (list): (host, port) pairs to probe
+            interval (float): Seconds between probe rounds
+            timeout (float): Seconds before a probe counts as lost
+            capacity (int): Samples kept in the ring buffer
+            icmp (bool): Also send ICMP echoes (needs net.ipv4.ping_group_range to allow it)
+        """
+        self.targets = list(targets or LATENCY_TARGETS)
+        self.interval = interval or LATENCY_INTERVAL
+        self.timeout = timeout or LATENCY_TIMEOUT
+        self.icmp = LATENCY_ICMP if icmp is None else icmp
+        # One sample series per TCP target, plus one per host for ICMP.
+        self.labels = [f"tcp:{host}:{port}" for host, port in self.targets]
+        if self.icmp:
+            self.labels += [f"icmp:{host}" for host, _ in self.targets]
+        self.buffer = RingBuffer(capacity or LATENCY_BUFFER_SIZE)
+        self._addresses = {}      # host -> (address, resolved at)
+        self._position = 0
+        self._sequence = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='bob-latency', daemon=True)
+        self._thread.start()
+        logger.info("Latency probing %d target(s) every %ss.", len(self.targets), self.interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + self.timeout * len(self.labels))
+
+    def _resolve(self, host):
+        cached = self._addresses.get(host)
+        if cached is not None and time.monotonic() - cached[1] < RESOLVE_INTERVAL:
+            return cached[0]
+        address = socket.getaddrinfo(host, None, socket.AF_INET)[0][4][0]
+        self._addresses[host] = (address, time.monotonic())
+        return address
+
+    def probe_tcp(self, host, port):
+        """
+        Returns:
+            float: TCP connect time in ms, or NaN if the probe failed
+        """
+        try:
+            address = self._resolve(host)
+            start = time.perf_counter()
+            with socket.create_connection((address, port), timeout=self.timeout):
+                return (time.perf_counter() - start) * 1000
+        except OSError:
+            # Resolve again next time in case the address moved.
+            self._addresses.pop(host, None)
+            return math.nan
+
+    def probe_icmp(self, host):
+        """
+        Returns:
+            float: ICMP echo round trip in ms, NaN if it failed, or None if
+            ICMP is not permitted (ICMP probing is then switched off)
+        """
+        try:
+            address = self._resolve(host)
+            self._sequence = (self._sequence + 1) & 0xffff
+            # With SOCK_DGRAM the kernel sets the identifier and filters replies.
+            header = struct.pack('!BBHHH', _ICMP_ECHO_REQUEST, 0, 0, 0, self._sequence)
+            payload = b'bob-latency'
+            packet = struct.pack('!BBHHH', _ICMP_ECHO_REQUEST, 0,
+                                 _checksum(header + payload), 0, self._sequence) + payload
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP) as sock:
+                sock.settimeout(self.timeout)
+                start = time.perf_counter()
+                sock.sendto(packet, (address, 0))
+                deadline = start + self.timeout
+                while True:
+                    reply = sock.recv(1024)
+                    if len(reply) >= 8 and struct.unpack('!H', reply[6:8])[0] == self._sequence:
+                        return (time.perf_counter() - start) * 1000
+                    sock.settimeout(max(0.001, deadline - time.perf_counter()))
+        except PermissionError as e:
+            logger.warning("ICMP probes not permitted (%s); continuing with TCP only.", e)
+            self.icmp = False
+            return None
+        except OSError:
+            return math.nan
+
+    def probe_round(self):
+        """Probe every target once and record the samples."""
+        now = time.time()
+        for index, (host, port) in enumerate(self.targets):
+            self.buffer.append(now, index, self.probe_tcp(host, port))
+        for index, (host, _) in enumerate(self.targets, start=len(self.targets)):
+            if not self.icmp:
+                break
+            rtt = self.probe_icmp(host)
+            if rtt is not None:
+                self.buffer.append(now, index, rtt)
+
+    def _run(self):
+        next_round = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.probe_round()
+            except Exception as e:
+                logger.error("Latency probe round failed: %s", e)
+            next_round += self.interval
+            self._stop.wait(max(0.0, next_round - time.monotonic()))
+
+    def summarize(self):
+        """
+        Summarize the samples added since the previous summary.
+
+        Returns:
+            dict: Per-target probes, loss, min/max, percentiles and jitter
+            (mean absolute difference of consecutive RTTs), or None if there
+            are no new samples
+        """
+        samples, overwritten, self._position = self.buffer.since(self._position)
+        if not samples:
+            return None
+        if overwritten:
+            logger.warning("%d latency samples were overwritten before being summarized.",
+                           overwritten)
+        series = {}
+        for when, target, rtt in samples:
+            series.setdefault(target, []).append(rtt)
+        targets = {}
+        for target, rtts in sorted(series.items()):
+            received = [rtt for rtt in rtts if not math.isnan(rtt)]
+            entry = {'probes': len(rtts), 'lost': len(rtts) - len(received),
+                     'loss': (len(rtts) - len(received)) / len(rtts)}
+            if received:
+                ordered = sorted(received)
+                entry['min'] = ordered[0]
+                entry['max'] = ordered[-1]
+                for p in PERCENTILES:
+                    entry[f'p{p}'] = _percentile(ordered, p)
+                entry['jitter'] = (sum(abs(b - a) for a, b in zip(received, received[1:]))
+                                   / (len(received) - 1)) if len(received) > 1 else 0.0
+            targets[self.labels[target]] = entry
+        return {'start': samples[0][0], 'end': samples[-1][0], 'interval': self.interval,
+                'overwritten': overwritten, 'targets': targets}
+
+    def write_summary(self, path_prefix):
+        """
+        Write the summary of new samples to ``{path_prefix}-{YYYYmmddHHMMSS}.json``.
+
+        Returns:
+            str: Path of the summary file, or None if there were no new samples
+        """
+        summary = self.summarize()
+        if summary is None:
+            return None
+        path = f"{path_prefix}-{time.strftime('%Y%m%d%H%M%S')}.json"
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(summary, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        logger.info("Wrote latency summary of %d target(s) to %s", len(summary['targets']), path)
+        return path
@@ -10,12 +10,8 @@ internet connectivity checks, activation verification,
 and even self-update routines.
 """
 
-import time
 import datetime
 import os
-import csv
-import speedtest
-import contextlib
 import atexit
 
 # First import initialize module and set up the system
@@ -24,88 +20,202 @@ from bob.initialize import initialize_system
 config = initialize_system()
 
 # Now it's safe to import other modules
-from bob.config import DATA_DIR, SPEED_TEST_INTERVAL, DEVICE_ID
+from bob.config import (DATA_DIR, SPEED_TEST_INTERVAL, GPS_INTERVAL, UPLOAD_INTERVAL,
+                        EXTINCTION_CHECK_INTERVAL, DEVICE_ID, GPS_TRACK_COMPRESSION,
+                        GPS_TRACK_ENCODING, TILE_SUMMARY_MODE,
+                        STATS_SUMMARY_MODE, SPEEDTEST_ADAPTIVE, DATA_CAP_MB,
+                        SPEEDTEST_ISOLATED, LATENCY_PROBING, LATENCY_SUMMARY_INTERVAL)
 from bob.logger import logger
-from bob.gps import read_gps
+from bob.gps import GPSReader
 from bob.led import ready_red_leds, intled_green, gpsled_green, bluelight_minion
-from bob.internet import check_internet, get_public_ip
+from bob.internet import (check_internet, get_public_ip, is_online,
+                          public_ip as public_ip_resolver)
+from bob.http_session import close_session
 from bob.data_uploader import upload_csv_files
 from bob.activation import download_activation_file, check_activation_status, handle_extinction, is_device_extinct
 from bob.speedtest_upgrade import check_speedtest_version
 from bob.session import get_session
+from bob.scheduler import Scheduler
+from bob.file_manager import FileManager, install_shutdown_handlers
+from bob.speedtest_engine import create_engine
+from bob.speedtest_worker import SpeedtestWorker, SpeedtestTimeout, PHASES
+from bob.bandwidth import bandwidth
+from bob.record_log import RecordSchema
+from bob.track import TrackCompressor
+from bob.geojoin import geotag
+from bob.tiles import TileAggregator
+from bob.rolling_stats import RollingStats
+from bob.adaptive import AdaptiveInterval
+from bob.data_cap import DataAccountant
+from bob.latency import LatencyProber
 
+# Record layouts shared by the CSV and binary storage backends:
+# (column name, struct code, CSV format)
+RECORD_SCHEMAS = {
+    'speed': RecordSchema([
+        ("timestamp", 'd', 'timestamp'),
+        ("download (Mbps)", 'f', '.2f'),
+        ("upload (Mbps)", 'f', '.2f'),
+        ("ping (ms)", 'f', '.2f'),
+        ("background traffic", 'B', 'd'),  # 1 if an upload/download overlapped the test
+        ("timed out in", 'B', 'd'),  # 0, or 1-3 for the setup/download/upload phase
+    ]),
+    # Speed results joined with the GPS position at the time of the test
+    'geo': RecordSchema([
+        ("timestamp", 'd', 'timestamp'),
+        ("download (Mbps)", 'f', '.2f'),
+        ("upload (Mbps)", 'f', '.2f'),
+        ("ping (ms)", 'f', '.2f'),
+        ("latitude", 'd', ''),
+        ("longitude", 'd', ''),
+        ("join error (s)", 'f', '.1f'),
+        ("moved (m)", 'f', '.1f'),
+    ]),
+    'gps': RecordSchema([
+        ("timestamp", 'd', 'timestamp'),
+        ("latitude", 'd', ''),
+        ("longitude", 'd', ''),
+    ]),
+}
 
-class FileManager:
-    """
-    Manages file handles for CSV operations throughout the application lifecycle.
-    Opens files once and keeps them open until the application terminates.
-    """
-    def __init__(self, file_paths, headers):
-        """
-        Initialize the file manager with file paths and their headers.
-        
-        Args:
-            file_paths (dict): Dictionary mapping file identifiers to file paths
-            headers (dict): Dictionary mapping file identifiers to column headers
-        """
-        self.file_paths = file_paths
-        self.file_handles = {}
-        self.csv_writers = {}
-        self.headers = headers
-        
-    def initialize_files(self):
-        """Initialize all files and open file handles."""
-        for file_id, file_path in self.file_paths.items():
-            self._initialize_file(file_id, file_path, self.headers[file_id])
-    
-    def _initialize_file(self, file_id, file_path, headers):
-        """
-        Initialize a single CSV file with headers if it doesn't exist,
-        and open a file handle for writing.
-        """
-        file_exists = os.path.exists(file_path)
-        
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        # Open file for writing (append mode)
-        self.file_handles[file_id] = open(file_path, 'a', newline='')
-        self.csv_writers[file_id] = csv.writer(self.file_handles[file_id])
-        
-        # Write headers if this is a new file
-        if not file_exists:
-            self.csv_writers[file_id].writerow(headers)
-            self.file_handles[file_id].flush()
-            logger.info(f"Initialized CSV file: {file_path}")
-    
-    def write_row(self, file_id, row_data):
-        """
-        Write a row to the specified CSV file.
-        
-        Args:
-            file_id (str): Identifier for the file
-            row_data (list): Data to write as a row
-        """
-        if file_id in self.csv_writers:
-            self.csv_writers[file_id].writerow(row_data)
-            self.file_handles[file_id].flush()  # Ensure data is written to disk
-            return True
-        else:
-            logger.error(f"Attempted to write to unknown file ID: {file_id}")
-            return False
-    
-    def close_all(self):
-        """Close all open file handles."""
-        for file_id, handle in self.file_handles.items():
+
+def run_speedtest_stage(file_manager, engine, gps_reader=None, tiles=None, stats=None,
+                        policy=None, accountant=None):
+    """Run one internet speed test and record the result, geotagged if a GPS fix is available."""
+    if accountant is not None and not accountant.allows('speedtest'):
+        return
+    if not is_online():
+        logger.warning("Offline; skipping the speedtest.")
+        return
+    # Cached for PUBLIC_IP_TTL; a change notifies the engine to re-rank servers.
+    get_public_ip()
+    try:
+        with_upload = accountant is None or accountant.allows('speedtest_upload')
+        with bandwidth.measurement() as measurement:
+            now = datetime.datetime.now()
             try:
-                handle.close()
-                logger.info(f"Closed file: {self.file_paths[file_id]}")
-            except Exception as e:
-                logger.error(f"Error closing file {self.file_paths[file_id]}: {e}")
-        
-        # Clear the dictionaries
-        self.file_handles.clear()
-        self.csv_writers.clear()
+                result = engine.run(upload=with_upload)
+            finally:
+                if policy is not None:
+                    policy.record_test()
+        finished = datetime.datetime.now()
+        current_time = now.strftime("%Y-%m-%d %H:%M:%S")
+        download_speed = result['download']
+        upload_speed = result['upload']
+        ping = result['ping']
+        logger.info("Speedtest at %s: Download=%.2f Mbps, Upload=%s, Ping=%.2f ms",
+                    current_time, download_speed,
+                    f"{upload_speed:.2f} Mbps" if upload_speed is not None else "skipped", ping)
+        if measurement.overlap:
+            logger.warning("Background transfers moved %d bytes during the speedtest.",
+                           measurement.overlap_bytes)
+
+        # Write speed test results; the storage backend formats the typed values.
+        # A skipped upload phase is recorded as NaN.
+        recorded_upload = upload_speed if upload_speed is not None else float('nan')
+        file_manager.write_row('speed', [now, download_speed, recorded_upload, ping,
+                                         int(measurement.overlap), 0])
+        if stats is not None:
+            stats.add(now, {'download': download_speed, 'upload': upload_speed, 'ping': ping})
+        if policy is not None:
+            policy.observe(download_speed)
+
+        if gps_reader is not None:
+            tag = geotag(gps_reader, now, finished)
+            if tag:
+                file_manager.write_row('geo', [now, download_speed, recorded_upload, ping,
+                                               tag.latitude, tag.longitude, tag.error, tag.moved])
+                if tiles is not None:
+                    tiles.add(tag.latitude, tag.longitude,
+                              {'download': download_speed, 'upload': upload_speed, 'ping': ping})
+            else:
+                logger.warning("No GPS fix close enough to geotag the speedtest at %s",
+                               current_time)
+    except SpeedtestTimeout as e:
+        # Record what was measured before the deadline; missing values are NaN.
+        logger.error("Speedtest timed out in the %s phase (%s budget); partial results: %s",
+                     e.phase, e.cause, e.partial)
+        partial = {key: value for key, value in e.partial.items() if value is not None}
+        nan = float('nan')
+        file_manager.write_row('speed', [now, partial.get('download', nan), nan,
+                                         partial.get('ping', nan), int(measurement.overlap),
+                                         PHASES.index(e.phase) + 1])
+    except Exception as e:
+        logger.error("Error during speedtest: %s", e)
+
+
+def run_gps_stage(file_manager, gps_reader):
+    """Record the latest fix from the background GPS reader."""
+    gps_data = gps_reader.latest(max_age=GPS_INTERVAL)
+    if gps_data:
+        gps_timestamp = gps_data[0].strftime("%Y-%m-%d %H:%M:%S")
+        latitude = gps_data[1]
+        longitude = gps_data[2]
+
+        # Write GPS data; the storage backend formats the typed values.
+        file_manager.write_row('gps', [gps_data[0], latitude, longitude])
+
+        # Indicate a successful GPS read with a green LED.
+        gpsled_green()
+        logger.info("GPS data at %s: Latitude=%s, Longitude=%s",
+                    gps_timestamp, latitude, longitude)
+    else:
+        logger.error("GPS data unavailable at %s",
+                     datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def run_track_stage(file_manager, gps_reader, track):
+    """Thin every fix received since the last run and record the points kept."""
+    since = track.last_seen
+    fixes = [fix for fix in gps_reader.between(since or 0, float('inf'))
+             if since is None or fix.timestamp.timestamp() > since]
+    if not fixes:
+        logger.error("GPS data unavailable at %s",
+                     datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        return
+    for fix in fixes:
+        for point in track.add(fix):
+            file_manager.write_row('gps', [point.timestamp, point.latitude, point.longitude])
+    gpsled_green()
+    logger.info("GPS track: %d new fixes; kept %d of %d so far",
+                len(fixes), track.kept, track.seen)
+
+
+def flush_track(file_manager, track):
+    """Record the points still held by the track compressor."""
+    for point in track.flush():
+        file_manager.write_row('gps', [point.timestamp, point.latitude, point.longitude])
+
+
+def run_upload_stage(file_manager, tiles=None, stats=None, summary_prefix=None,
+                     accountant=None):
+    """Seal any due data segments, write tile/statistics summaries and upload them."""
+    try:
+        file_manager.seal_due()
+        if tiles is not None:
+            tiles.write_summary(f"{summary_prefix}-tiles")
+        if stats is not None:
+            stats.write_summary(f"{summary_prefix}-stats")
+        upload_csv_files(include_raw=accountant is None or accountant.allows('raw_upload'))
+        if accountant is not None:
+            accountant.report()
+    except Exception as e:
+        logger.error("Error uploading CSV files: %s", e)
+
+
+def run_latency_summary_stage(prober, summary_prefix):
+    """Write loss, percentile and jitter figures for the latest latency samples."""
+    try:
+        prober.write_summary(f"{summary_prefix}-latency")
+    except Exception as e:
+        logger.error("Error writing latency summary: %s", e)
+
+
+def run_extinction_stage(scheduler):
+    """Stop the scheduler if the device has been marked extinct."""
+    if handle_extinction():
+        logger.info("Extinction detected during operation. Exiting main loop.")
+        scheduler.stop()
 
 
 def main_loop():
@@ -121,109 +231,146 @@ def main_loop():
         # For example, just respond to critical commands but don't collect data
         return
 
-    # Check for active internet connection.
-    if not check_internet():
-        logger.error("Internet not available. Exiting main loop.")
-        return
+    # Book network traffic to each stage and shed optional work as the
+    # monthly data cap (DATA_CAP_MB) is approached.
+    accountant = DataAccountant()
+    if DATA_CAP_MB:
+        accountant.report()
+    accountant.begin('startup')
+
+    # Check for active internet connection. Without one we keep collecting
+    # offline; data is spooled and uploaded once the link returns.
+    online = check_internet()
+    public_ip = None
+    if online:
+        # Retrieve and log public IP.
+        public_ip = get_public_ip()
+        if public_ip:
+            logger.info("Public IP: %s", public_ip)
+        else:
+            logger.warning("Public IP not available.")
+
+        # Check for speedtest-cli upgrade if necessary.
+        if check_speedtest_version():
+            logger.info("Speedtest upgraded. Device may need to reboot soon.")
+            # Optionally, trigger a reboot here.
 
-    # Retrieve and log public IP.
-    public_ip = get_public_ip()
-    if public_ip:
-        logger.info("Public IP: %s", public_ip)
+        # Download activation file from FTP.
+        download_activation_file(DEVICE_ID)
     else:
-        logger.warning("Public IP not available.")
+        logger.warning("Internet not available. Collecting offline using the last known activation status.")
 
-    # Check for speedtest-cli upgrade if necessary.
-    if check_speedtest_version():
-        logger.info("Speedtest upgraded. Device may need to reboot soon.")
-        # Optionally, trigger a reboot here.
+    accountant.end('startup')
 
-    # Download activation file from FTP and verify activation.
-    download_activation_file(DEVICE_ID)
+    # Verify activation (from the freshly downloaded or previously cached file).
     if not check_activation_status(DEVICE_ID):
         logger.error("Device %s not activated. Exiting main loop.", DEVICE_ID)
+        accountant.persist()
         return
 
     # Retrieve a persistent session ID for this deployment.
     session_id = get_session()
     logger.info("Session ID: %s", session_id)
 
-    # Define CSV file paths and headers
+    # Define data file paths and headers (the binary backend swaps .csv for .rec).
+    # Rows go to live files under DATA_DIR/live/ and are sealed into DATA_DIR as
+    # timestamped segments, which are what the uploader sends.
     file_paths = {
         'speed': os.path.join(DATA_DIR, f"{session_id}-speed.csv"),
         'gps': os.path.join(DATA_DIR, f"{session_id}-gps.csv"),
+        'geo': os.path.join(DATA_DIR, f"{session_id}-geo.csv"),
     }
     
-    headers = {
-        'speed': ["timestamp", "download (Mbps)", "upload (Mbps)", "ping (ms)"],
-        'gps': ["timestamp", "latitude", "longitude"],
-    }
-    
+    headers = {file_id: schema.names for file_id, schema in RECORD_SCHEMAS.items()}
+
     # Create file manager and initialize files
-    file_manager = FileManager(file_paths, headers)
+    file_manager = FileManager(file_paths, headers, schemas=RECORD_SCHEMAS,
+                               backends={'gps': 'track'} if GPS_TRACK_ENCODING else None)
     file_manager.initialize_files()
     
-    # Register cleanup function to ensure files are closed properly
+    # Register cleanup function to ensure files are closed properly, and make
+    # service stops (SIGTERM/SIGHUP) run it so buffered rows are drained.
     atexit.register(file_manager.close_all)
+    install_shutdown_handlers()
 
     # Change LED to green to indicate that internet is ready.
-    intled_green()
+    if online:
+        intled_green()
 
-    try:
-        while True:
-            # Check extinction status at the start of each loop
-            if handle_extinction():
-                logger.info("Extinction detected during operation. Exiting main loop.")
-                break
-                
-            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            # Run an internet speed test.
-            try:
-                st = speedtest.Speedtest()
-                st.get_best_server()
-                download_speed = st.download() / 1048576  # Convert to Mbps.
-                upload_speed = st.upload() / 1048576      # Convert to Mbps.
-                ping = st.results.ping
-                logger.info("Speedtest at %s: Download=%.2f Mbps, Upload=%.2f Mbps, Ping=%.2f ms",
-                            current_time, download_speed, upload_speed, ping)
-                
-                # Write speed test results directly to the open file
-                file_manager.write_row('speed', [
-                    current_time, 
-                    f"{download_speed:.2f}", 
-                    f"{upload_speed:.2f}", 
-                    f"{ping:.2f}"
-                ])
-            except Exception as e:
-                logger.error("Error during speedtest: %s", e)
-
-            # Attempt to read GPS data.
-            gps_data = read_gps()
-            if gps_data:
-                gps_timestamp = gps_data[0].strftime("%Y-%m-%d %H:%M:%S")
-                latitude = gps_data[1]
-                longitude = gps_data[2]
-                
-                # Write GPS data directly to the open file
-                file_manager.write_row('gps', [gps_timestamp, latitude, longitude])
-                
-                # Indicate a successful GPS read with a green LED.
-                gpsled_green()
-                logger.info("GPS data at %s: Latitude=%s, Longitude=%s", 
-                           gps_timestamp, latitude, longitude)
-            else:
-                logger.error("GPS data unavailable at %s", current_time)
+    # The GPS port stays open for the whole run; the GPS stage only samples
+    # the reader's latest fix.
+    gps_reader = GPSReader()
+    gps_reader.start()
 
-            # Optionally, upload CSV files to the FTP server.
-            try:
-                upload_csv_files()
-            except Exception as e:
-                logger.error("Error uploading CSV files: %s", e)
+    # Per-area coverage statistics and hourly/daily windows, uploaded as
+    # small JSON summaries.
+    tiles = TileAggregator() if TILE_SUMMARY_MODE != 'off' else None
+    stats = RollingStats() if STATS_SUMMARY_MODE != 'off' else None
+    summary_prefix = os.path.join(DATA_DIR, session_id)
 
-            # Sleep for the configured speed test interval.
-            time.sleep(SPEED_TEST_INTERVAL)
+    # Frequent lightweight RTT probes between speedtests.
+    prober = LatencyProber() if LATENCY_PROBING else None
+    if prober is not None:
+        prober.start()
+
+    # A single long-lived speedtest client reuses its config and server ranking.
+    # Isolated, it runs in a worker process that is killed and respawned when
+    # a test overruns its deadlines.
+    speedtest_engine = SpeedtestWorker() if SPEEDTEST_ISOLATED else create_engine()
+    speedtest_engine.update_public_ip(public_ip)
+    public_ip_resolver.add_listener(lambda old, new: speedtest_engine.update_public_ip(new))
+
+    # Each stage runs as its own task on its own cadence so that a slow
+    # speedtest or upload does not delay GPS sampling.
+    scheduler = Scheduler()
+    scheduler.add_task('extinction',
+                       accountant.wrap('extinction', lambda: run_extinction_stage(scheduler)),
+                       EXTINCTION_CHECK_INTERVAL)
+    # Optionally let result variance, motion and the daily budget set the
+    # speedtest cadence.
+    policy = AdaptiveInterval(gps_reader) if SPEEDTEST_ADAPTIVE else None
+    scheduler.add_task('speedtest',
+                       accountant.wrap('speedtest', lambda: run_speedtest_stage(
+                           file_manager, speedtest_engine, gps_reader, tiles, stats, policy,
+                           accountant)),
+                       policy.interval if policy else SPEED_TEST_INTERVAL,
+                       interval_policy=policy)
+    # With track compression every fix is considered and thinned; otherwise
+    # one fix is sampled per GPS_INTERVAL.
+    track = TrackCompressor() if GPS_TRACK_COMPRESSION else None
+    if track is not None:
+        scheduler.add_task('gps', lambda: run_track_stage(file_manager, gps_reader, track),
+                           GPS_INTERVAL)
+    else:
+        scheduler.add_task('gps', lambda: run_gps_stage(file_manager, gps_reader), GPS_INTERVAL)
+    if prober is not None:
+        scheduler.add_task('latency',
+                           lambda: run_latency_summary_stage(prober, summary_prefix),
+                           LATENCY_SUMMARY_INTERVAL)
+    scheduler.add_task('upload',
+                       accountant.wrap('upload', lambda: run_upload_stage(
+                           file_manager, tiles, stats, summary_prefix, accountant)),
+                       UPLOAD_INTERVAL)
+
+    # On SIGTERM/SIGHUP, seal the data files first, then stop the stages.
+    scheduler.add_shutdown_hook(file_manager.seal_all)
+    install_shutdown_handlers(scheduler.stop)
+
+    try:
+        scheduler.run()
     finally:
+        gps_reader.stop()
+        if prober is not None:
+            prober.stop()
+            run_latency_summary_stage(prober, summary_prefix)
+        if track is not None:
+            flush_track(file_manager, track)
+        if tiles is not None:
+            tiles.persist()
+        accountant.persist()
+        if SPEEDTEST_ISOLATED:
+            speedtest_engine.close()
+        close_session()
         # Ensure files are closed if the loop exits
         file_manager.close_all()
         # Deregister the atexit handler since we've already cleaned up
@@ -0,0 +1,228 @@
+# bob/record_log.py
+"""
+Compact, append-only binary record log.
+
+A log file starts with a versioned header describing its fixed-width record
+layout, followed by records packed with ``struct``. Timestamps are stored as
+epoch seconds (float64) rather than formatted strings, so rows are small and
+cheap to write. ``RecordLogReader`` maps the file with ``mmap`` for fast
+reads, and ``export_csv`` turns a log back into the CSV layout used by the
+``{session_id}-speed.csv`` / ``{session_id}-gps.csv`` files.
+
+Usage:
+    python -m bob.record_log <log.rec> [output.csv]
+"""
+
+import os
+import sys
+import csv
+import json
+import mmap
+import struct
+import datetime
+
+MAGIC = b'BOBREC'
+VERSION = 1
+# magic, version, length of the JSON layout that follows
+_PREAMBLE = struct.Struct('<6sHI')
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def format_value(value, fmt):
+    """
+    Format a field value for CSV output.
+
+    Args:
+        value: Field value (datetime or epoch seconds for timestamps)
+        fmt (str): 'timestamp' for a local-time timestamp, otherwise a format() spec
+
+    Returns:
+        str: The formatted value
+    """
+    if fmt == 'timestamp':
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime.fromtimestamp(value)
+        elif value.tzinfo is not None:
+            # e.g. UTC GPS time; written in local time like every other timestamp
+            value = value.astimezone().replace(tzinfo=None)
+        return value.strftime(TIMESTAMP_FORMAT)
+    return format(value, fmt)
+
+
+class RecordSchema:
+    """
+    Fixed-width record layout shared by the CSV and binary storage backends.
+    """
+    def __init__(self, fields):
+        """
+        Args:
+            fields (list): (name, struct code, csv format) tuples, e.g.
+                ('timestamp', 'd', 'timestamp') or ('download', 'f', '.2f')
+        """
+        self.fields = [tuple(field) for field in fields]
+        self.names = [field[0] for field in self.fields]
+        self.codes = ''.join(field[1] for field in self.fields)
+        self.formats = [field[2] for field in self.fields]
+        self.struct = struct.Struct('<' + self.codes)
+
+    @property
+    def record_size(self):
+        return self.struct.size
+
+    def pack(self, values):
+        """Pack one row; datetimes are stored as epoch seconds."""
+        return self.struct.pack(*[
+            value.timestamp() if isinstance(value, datetime.datetime) else value
+            for value in values
+        ])
+
+    def to_csv_row(self, values):
+        """Format one row of typed values for CSV output."""
+        return [format_value(value, fmt) for value, fmt in zip(values, self.formats)]
+
+    def to_header(self):
+        return {'codes': self.codes, 'fields': self.fields}
+
+    @classmethod
+    def from_header(cls, header):
+        return cls(header['fields'])
+
+    def __eq__(self, other):
+        return isinstance(other, RecordSchema) and self.fields == other.fields
+
+
+def _read_header(f):
+    """
+    Read and validate a log header.
+
+    Returns:
+        tuple: (RecordSchema, offset of the first record)
+    """
+    preamble = f.read(_PREAMBLE.size)
+    if len(preamble) < _PREAMBLE.size:
+        raise ValueError("Record log header is truncated")
+    magic, version, layout_len = _PREAMBLE.unpack(preamble)
+    if magic != MAGIC:
+        raise ValueError("Not a bob record log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported record log version: {version}")
+    layout = json.loads(f.read(layout_len).decode('utf-8'))
+    return RecordSchema.from_header(layout), _PREAMBLE.size + layout_len
+
+
+class RecordLogWriter:
+    """
+    Appends packed records to a log file, writing the header if the file is new.
+    """
+    def __init__(self, path, schema):
+        """
+        Args:
+            path (str): Path of the log file
+            schema (RecordSchema): Record layout
+        """
+        self.path = path
+        self.schema = schema
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                existing, data_offset = _read_header(f)
+            if existing != schema:
+                raise ValueError(f"Record layout of {path} does not match")
+            self.handle = open(path, 'ab')
+            # Drop a torn trailing record left by a crash mid-write.
+            torn = (os.path.getsize(path) - data_offset) % schema.record_size
+            if torn:
+                self.handle.truncate(os.path.getsize(path) - torn)
+            self.created = False
+        else:
+            self.handle = open(path, 'ab')
+            layout = json.dumps(schema.to_header()).encode('utf-8')
+            self.handle.write(_PREAMBLE.pack(MAGIC, VERSION, len(layout)) + layout)
+            self.created = True
+
+    def write_rows(self, rows):
+        """Append rows of typed values."""
+        self.handle.write(b''.join(self.schema.pack(row) for row in rows))
+
+    def flush(self):
+        self.handle.flush()
+
+    def fileno(self):
+        return self.handle.fileno()
+
+    def close(self):
+        self.handle.close()
+
+
+class RecordLogReader:
+    """
+    Read-only, mmap-backed view of a record log.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.schema, self._offset = _read_header(self._file)
+        size = os.fstat(self._file.fileno()).st_size
+        # Ignore a partial record at the end of a file that is still being written.
+        self._count = (size - self._offset) // self.schema.record_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("record index out of range")
+        return self.schema.struct.unpack_from(
+            self._mmap, self._offset + index * self.schema.record_size)
+
+    def __iter__(self):
+        if not self._count:
+            return
+        end = self._offset + self._count * self.schema.record_size
+        view = memoryview(self._mmap)[self._offset:end]
+        try:
+            for record in self.schema.struct.iter_unpack(view):
+                yield record
+        finally:
+            view.release()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_csv(log_path, csv_path=None):
+    """
+    Export a record log to CSV using the layout's field names and formats.
+
+    Args:
+        log_path (str): Path of the record log
+        csv_path (str): Output path; defaults to the log path with a .csv extension
+
+    Returns:
+        str: Path of the written CSV file
+    """
+    if csv_path is None:
+        csv_path = os.path.splitext(log_path)[0] + '.csv'
+    with RecordLogReader(log_path) as reader, open(csv_path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(reader.schema.names)
+        for record in reader:
+            writer.writerow(reader.schema.to_csv_row(record))
+    return csv_path
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m bob.record_log <log.rec> [output.csv]")
+        sys.exit(1)
+    print(export_csv(*sys.argv[1:]))
@@ -0,0 +1,167 @@
+# File: bob/rolling_stats.py
+import os
+import json
+import math
+import time
+import datetime
+import logging
+import threading
+from bob.sketch import Summary
+from bob.config import STATS_WINDOWS, STATS_EWMA_ALPHA, STATS_STATE_FILE
+
+logger = logging.getLogger('bob.rolling_stats')
+
+# Metrics tracked for each speedtest result
+STATS_METRICS = ('download', 'upload', 'ping')
+
+
+def _epoch(when):
+    return when.timestamp() if isinstance(when, datetime.datetime) else when
+
+
+class RollingStats:
+    """
+    Streaming statistics for speedtest results.
+
+    For each window size (e.g. hourly and daily, aligned to UTC) the
+    current window keeps a Summary per metric: count, mean, min/max and a
+    mergeable quantile sketch, so memory is constant however many samples
+    arrive. When a sample falls into a new window the old one is closed and
+    queued; ``write_summary()`` writes the queued windows to a small JSON
+    file for upload. An exponentially weighted mean and variance per metric
+    track the recent level and spread across windows.
+
+    State (open and queued windows, EWMA) is saved after every sample so a
+    restart does not lose the window in progress.
+    """
+    def __init__(self, windows=None, alpha=None, state_path=None):
+        """
+        Args:
+            windows (list): Window sizes in seconds
+            alpha (float): EWMA smoothing factor in (0, 1]
+            state_path (str): File the state is persisted to
+        """
+        self.windows = sorted(windows or STATS_WINDOWS)
+        self.alpha = alpha or STATS_EWMA_ALPHA
+        self.state_path = state_path or STATS_STATE_FILE
+        self.open = {}       # window size -> (start, {metric: Summary})
+        self.closed = []     # serialized windows waiting for the next summary file
+        self.ewma = {}
+        self.ewm_var = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("Ignoring unreadable statistics state %s: %s", self.state_path, e)
+            return
+        for size, window in state.get('open', {}).items():
+            if int(size) in self.windows:
+                self.open[int(size)] = (window['start'],
+                                        {metric: Summary.from_dict(data)
+                                         for metric, data in window['metrics'].items()})
+        self.closed = state.get('closed', [])
+        self.ewma = state.get('ewma', {})
+        self.ewm_var = state.get('ewm_var', {})
+
+    def _close(self, size, start, metrics):
+        self.closed.append({
+            'window': size,
+            'start': start,
+            'end': start + size,
+            'metrics': {metric: summary.to_dict(quantiles=(0.05, 0.5, 0.95))
+                        for metric, summary in metrics.items()},
+            'ewma': dict(self.ewma),
+        })
+
+    def add(self, when, values):
+        """
+        Add one result.
+
+        Args:
+            when (datetime or float): Time of the result
+            values (dict): Metric name -> value, for STATS_METRICS
+        """
+        t = _epoch(when)
+        with self._lock:
+            for size in self.windows:
+                start = math.floor(t / size) * size
+                current = self.open.get(size)
+                if current is not None and current[0] != start:
+                    self._close(size, *current)
+                    current = None
+                if current is None:
+                    current = self.open[size] = (start, {metric: Summary()
+                                                         for metric in STATS_METRICS})
+                for metric in STATS_METRICS:
+                    if values.get(metric) is not None:
+                        current[1][metric].add(values[metric])
+            for metric in STATS_METRICS:
+                value = values.get(metric)
+                if value is None:
+                    continue
+                if metric not in self.ewma:
+                    self.ewma[metric], self.ewm_var[metric] = value, 0.0
+                else:
+                    diff = value - self.ewma[metric]
+                    increment = self.alpha * diff
+                    self.ewma[metric] += increment
+                    self.ewm_var[metric] = ((1 - self.alpha)
+                                            * (self.ewm_var[metric] + diff * increment))
+            self._persist_locked()
+
+    def ewm_std(self, metric):
+        """
+        Returns:
+            float: Exponentially weighted standard deviation, or None before any sample
+        """
+        var = self.ewm_var.get(metric)
+        return math.sqrt(var) if var is not None else None
+
+    def _persist_locked(self):
+        state = {
+            'open': {str(size): {'start': start,
+                                 'metrics': {metric: summary.to_dict(quantiles=())
+                                             for metric, summary in metrics.items()}}
+                     for size, (start, metrics) in self.open.items()},
+            'closed': self.closed,
+            'ewma': self.ewma,
+            'ewm_var': self.ewm_var,
+        }
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, self.state_path)
+
+    def write_summary(self, path_prefix):
+        """
+        Close windows that have ended and write every window closed since the
+        last summary to ``{path_prefix}-{YYYYmmddHHMMSS}.json``.
+
+        Returns:
+            str: Path of the summary file, or None if no window has closed
+        """
+        now = time.time()
+        with self._lock:
+            for size, (start, metrics) in list(self.open.items()):
+                if start + size <= now:
+                    self._close(size, start, metrics)
+                    del self.open[size]
+            if not self.closed:
+                return None
+            windows, self.closed = self.closed, []
+            path = f"{path_prefix}-{time.strftime('%Y%m%d%H%M%S')}.json"
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'generated': time.time(), 'windows': windows}, f,
+                          separators=(',', ':'))
+            os.replace(tmp_path, path)
+            self._persist_locked()
+        logger.info("Wrote summary of %d closed windows to %s", len(windows), path)
+        return path
@@ -0,0 +1,335 @@
+# bob/scheduler.py
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from bob.config import (SCHEDULER_MAX_WORKERS, SCHEDULER_MODE, SCHEDULER_JITTER,
+                        SCHEDULER_SHUTDOWN_TIMEOUT, SCHEDULER_METRICS_INTERVAL,
+                        SCHEDULER_METRICS_FILE)
+
+logger = logging.getLogger('bob.scheduler')
+
+
+class ScheduledTask:
+    """
+    A single stage (collector or uploader) run by the Scheduler on its own cadence.
+    """
+    def __init__(self, name, func, interval, blocking=True, interval_policy=None):
+        """
+        Args:
+            name (str): Name used in log messages and the metrics file
+            func (callable): Function to run each cycle
+            interval (float): Seconds between cycles
+            blocking (bool): Run func in the executor (True) or await it as a coroutine (False)
+            interval_policy (callable): Called with the task after each cycle; returns
+                the interval to use from then on
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.blocking = blocking
+        self.interval_policy = interval_policy
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.skipped_cycles = 0
+        self.first_start = None
+        self.last_start = None
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def record_run(self, started, duration, lateness):
+        """Update timing counters after a cycle has finished."""
+        if self.first_start is None:
+            self.first_start = started
+        self.last_start = started
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.last_lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        if duration > self.interval:
+            self.overruns += 1
+
+    def metrics(self):
+        """
+        Returns:
+            dict: Counters describing how closely the task kept to its cadence
+        """
+        effective_period = None
+        if self.runs > 1 and self.first_start is not None:
+            effective_period = (self.last_start - self.first_start) / (self.runs - 1)
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'overruns': self.overruns,
+            'skipped_cycles': self.skipped_cycles,
+            'effective_period': effective_period,
+            'last_duration': round(self.last_duration, 3),
+            'max_duration': round(self.max_duration, 3),
+            'last_lateness': round(self.last_lateness, 3),
+            'max_lateness': round(self.max_lateness, 3),
+        }
+
+
+class Scheduler:
+    """
+    Runs each registered task as its own asyncio task so that a slow stage
+    (e.g. a speedtest) does not hold back the others. Blocking calls such as
+    speedtest-cli, pyserial and ftplib run on daemon threads, at most
+    ``max_workers`` at a time.
+
+    In 'deadline' mode each task fires on absolute deadlines measured on the
+    monotonic clock (start + k * interval), so the cadence does not drift by
+    the time the work takes. Cycles whose deadline has already passed when a
+    run finishes are skipped and counted rather than run back to back. In
+    'delay' mode the task sleeps for its interval after each run.
+
+    On stop, the shutdown hooks (e.g. sealing the data files) run first.
+    Queued stage calls are then cancelled and in-flight ones get
+    ``shutdown_timeout`` seconds to finish before the scheduler returns
+    without them. Their threads are daemon threads, so a hung stage does
+    not hold up process exit either.
+    """
+    def __init__(self, max_workers=None, mode=None, jitter=None, metrics_file=None,
+                 shutdown_timeout=None, metrics_interval=None):
+        """
+        Args:
+            max_workers (int): Most blocking stages run at once
+            mode (str): 'deadline' or 'delay'
+            jitter (float): Maximum random offset in seconds added to each deadline
+            metrics_file (str): Path of the JSON file holding per-task timing metrics
+            shutdown_timeout (float): Seconds in-flight stages get to finish on stop;
+                0 to not wait for them
+            metrics_interval (float): Seconds between writes of the metrics file; 0 to
+                write it only at shutdown
+        """
+        self.max_workers = max_workers or SCHEDULER_MAX_WORKERS
+        self.mode = mode or SCHEDULER_MODE
+        self.jitter = SCHEDULER_JITTER if jitter is None else jitter
+        self.metrics_file = metrics_file or SCHEDULER_METRICS_FILE
+        self.shutdown_timeout = (SCHEDULER_SHUTDOWN_TIMEOUT if shutdown_timeout is None
+                                 else shutdown_timeout)
+        self.metrics_interval = (SCHEDULER_METRICS_INTERVAL if metrics_interval is None
+                                 else metrics_interval)
+        self.tasks = []
+        self._shutdown_hooks = []
+        self._slots = None
+        self._loop = None
+        self._stop_event = None
+        self._started_at = None
+
+    def add_task(self, name, func, interval, blocking=True, interval_policy=None):
+        """
+        Register a stage to run periodically. With an interval_policy the
+        interval is re-evaluated after every cycle (see ScheduledTask).
+
+        Returns:
+            ScheduledTask: The registered task
+        """
+        task = ScheduledTask(name, func, interval, blocking, interval_policy)
+        self.tasks.append(task)
+        logger.info("Scheduled task '%s' every %s seconds (%s mode)", name, interval, self.mode)
+        return task
+
+    def add_shutdown_hook(self, func):
+        """Call ``func()`` on stop, before waiting for in-flight stages."""
+        self._shutdown_hooks.append(func)
+
+    def stop(self):
+        """
+        Ask the scheduler to stop. Safe to call from any thread or a signal handler.
+
+        Returns:
+            bool: True if a running scheduler was asked to stop
+        """
+        if self._loop is not None and self._stop_event is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+            return True
+        return False
+
+    def is_stopping(self):
+        return self._stop_event is not None and self._stop_event.is_set()
+
+    async def _call_blocking(self, task):
+        """
+        Run a blocking stage on its own daemon thread once a slot is free.
+
+        A ThreadPoolExecutor is not used because its workers are joined at
+        interpreter exit, which would let a hung stage outlast shutdown_timeout.
+        """
+        async with self._slots:
+            if self.is_stopping():
+                return None  # Queued behind other stages when stop() was called.
+            loop = self._loop
+            future = loop.create_future()
+
+            def settle(result, error):
+                if future.done():
+                    return
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+            def target():
+                result, error = None, None
+                try:
+                    result = task.func()
+                except Exception as e:
+                    error = e
+                try:
+                    loop.call_soon_threadsafe(settle, result, error)
+                except RuntimeError:
+                    pass  # The loop has closed; nobody is waiting any more.
+
+            threading.Thread(target=target, name=f'bob-stage-{task.name}', daemon=True).start()
+            return await future
+
+    async def _invoke(self, task):
+        """Run one cycle of a task, logging rather than propagating errors."""
+        task.runs += 1
+        try:
+            if task.blocking:
+                return await self._call_blocking(task)
+            return await task.func()
+        except Exception as e:
+            task.failures += 1
+            logger.error("Task '%s' failed: %s", task.name, e)
+            return None
+
+    async def _wait(self, timeout):
+        """Sleep for up to timeout seconds, returning early if stop() is called."""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            pass
+
+    def _jitter(self):
+        return random.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+
+    async def _run_task(self, task):
+        loop = self._loop
+        # Deadlines are absolute on the loop's monotonic clock; jitter is
+        # applied to each firing without moving the underlying grid.
+        base = loop.time()
+        cycle = 0
+        target = base + self._jitter()
+        await self._wait(target - loop.time())
+        while not self.is_stopping():
+            started = loop.time()
+            lateness = max(0.0, started - target) if self.mode == 'deadline' else 0.0
+            await self._invoke(task)
+            duration = loop.time() - started
+            task.record_run(started, duration, lateness)
+            if duration > task.interval:
+                logger.warning("Task '%s' overran its %ss interval (took %.1fs)",
+                               task.name, task.interval, duration)
+            if self.is_stopping():
+                break
+
+            if task.interval_policy is not None:
+                interval = self._next_interval(task)
+                if interval != task.interval:
+                    logger.info("Task '%s' interval changed from %ss to %ss",
+                                task.name, task.interval, interval)
+                    # Restart the deadline grid from this cycle's deadline.
+                    base = base + cycle * task.interval
+                    cycle = 0
+                    task.interval = interval
+
+            if self.mode == 'deadline':
+                cycle += 1
+                now = loop.time()
+                next_deadline = base + cycle * task.interval
+                if now > next_deadline:
+                    missed = math.floor((now - next_deadline) / task.interval) + 1
+                    task.skipped_cycles += missed
+                    cycle += missed
+                    next_deadline = base + cycle * task.interval
+                    logger.warning("Task '%s' skipped %d cycle(s)", task.name, missed)
+                target = next_deadline + self._jitter()
+            else:
+                target = loop.time() + task.interval
+            await self._wait(target - loop.time())
+
+    def _next_interval(self, task):
+        try:
+            interval = task.interval_policy(task)
+        except Exception as e:
+            logger.error("Interval policy for task '%s' failed: %s", task.name, e)
+            return task.interval
+        return interval if interval and interval > 0 else task.interval
+
+    def metrics(self):
+        """
+        Returns:
+            dict: Scheduler-wide metrics with one entry per task
+        """
+        return {
+            'mode': self.mode,
+            'jitter': self.jitter,
+            'started_at': self._started_at,
+            'updated_at': time.time(),
+            'tasks': {task.name: task.metrics() for task in self.tasks},
+        }
+
+    async def _write_metrics_periodically(self):
+        # A fixed cadence keeps SD card writes independent of how many tasks run.
+        if not self.metrics_interval:
+            return
+        while True:
+            await self._wait(self.metrics_interval)
+            if self.is_stopping():
+                return
+            self.write_metrics()
+
+    def write_metrics(self):
+        """Atomically write the current metrics to the metrics file."""
+        tmp_path = self.metrics_file + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.metrics(), f, indent=2)
+            os.replace(tmp_path, self.metrics_file)
+        except Exception as e:
+            logger.error("Failed to write scheduler metrics to %s: %s", self.metrics_file, e)
+
+    async def run_async(self):
+        """Run all registered tasks until stop() is called."""
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._started_at = time.time()
+        self._slots = asyncio.Semaphore(self.max_workers)
+        runners = [asyncio.ensure_future(self._run_task(task)) for task in self.tasks]
+        metrics_writer = asyncio.ensure_future(self._write_metrics_periodically())
+        try:
+            await self._stop_event.wait()
+        finally:
+            self._stop_event.set()
+            metrics_writer.cancel()
+            # Make collected data durable before anything that can hang.
+            for hook in self._shutdown_hooks:
+                try:
+                    hook()
+                except Exception as e:
+                    logger.error("Shutdown hook failed: %s", e)
+            if runners:
+                _, pending = await asyncio.wait(runners, timeout=self.shutdown_timeout)
+                if pending:
+                    logger.warning("%d task(s) still running after %ss; not waiting for them.",
+                                   len(pending), self.shutdown_timeout)
+                    for runner in pending:
+                        runner.cancel()
+            self.write_metrics()
+            logger.info("Scheduler stopped.")
+
+    def run(self):
+        """Blocking entry point; returns once the scheduler has stopped."""
+        asyncio.run(self.run_async())
@@ -0,0 +1,153 @@
+# File: bob/sketch.py
+"""
+Mergeable streaming summaries.
+
+``QuantileSketch`` is a DDSketch-style quantile sketch: values are counted in
+logarithmically sized buckets, so any quantile is returned within a fixed
+relative error (1% by default) and two sketches merge by adding their bucket
+counts. Memory is bounded by ``max_bins``; when it is exceeded the lowest
+buckets are collapsed, which only affects the accuracy of the lowest quantiles.
+
+``Summary`` adds count, mean, min and max on top of a sketch.
+"""
+
+import math
+
+DEFAULT_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 512
+
+
+class QuantileSketch:
+    """Relative-error quantile sketch for non-negative values."""
+    __slots__ = ('accuracy', 'max_bins', '_gamma_log', 'bins', 'zeros', 'count')
+
+    def __init__(self, accuracy=DEFAULT_ACCURACY, max_bins=DEFAULT_MAX_BINS):
+        """
+        Args:
+            accuracy (float): Relative error bound for quantiles, e.g. 0.01
+            max_bins (int): Bucket limit
+        """
+        self.accuracy = accuracy
+        self.max_bins = max_bins
+        self._gamma_log = math.log((1 + accuracy) / (1 - accuracy))
+        self.bins = {}
+        self.zeros = 0   # values <= 0 (e.g. a failed download)
+        self.count = 0
+
+    def add(self, value, weight=1):
+        self.count += weight
+        if value <= 0:
+            self.zeros += weight
+            return
+        index = math.ceil(math.log(value) / self._gamma_log)
+        self.bins[index] = self.bins.get(index, 0) + weight
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the lowest buckets together until the sketch fits in max_bins."""
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            self.bins[target] += self.bins.pop(index)
+
+    def merge(self, other):
+        """Add another sketch's counts to this one (accuracies must match)."""
+        if other.accuracy != self.accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        """
+        Args:
+            q (float): Quantile in [0, 1]
+
+        Returns:
+            float: Estimated value, or None if the sketch is empty
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i] in relative terms.
+                return 2 * math.exp(index * self._gamma_log) / (1 + math.exp(self._gamma_log))
+        return 2 * math.exp(max(self.bins) * self._gamma_log) / (1 + math.exp(self._gamma_log))
+
+    def to_dict(self):
+        return {'accuracy': self.accuracy, 'zeros': self.zeros,
+                'bins': {str(index): count for index, count in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data, max_bins=DEFAULT_MAX_BINS):
+        sketch = cls(data['accuracy'], max_bins)
+        sketch.zeros = data['zeros']
+        sketch.bins = {int(index): count for index, count in data['bins'].items()}
+        sketch.count = sketch.zeros + sum(sketch.bins.values())
+        return sketch
+
+
+class Summary:
+    """Count, mean, min, max and a quantile sketch for one stream of values."""
+    __slots__ = ('count', 'total', 'min', 'max', 'sketch')
+
+    def __init__(self, accuracy=DEFAULT_ACCURACY):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(accuracy)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        if other.count:
+            self.count += other.count
+            self.total += other.total
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+            self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def to_dict(self, quantiles=(0.1, 0.5, 0.9)):
+        """Serialize, including the sketch so summaries can be merged later."""
+        data = {'count': self.count, 'sum': self.total, 'min': self.min, 'max': self.max,
+                'sketch': self.sketch.to_dict()}
+        if self.count:
+            data['mean'] = self.mean
+            for q in quantiles:
+                data[f"p{int(q * 100)}"] = self.quantile(q)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data['sketch']['accuracy'])
+        summary.count = data['count']
+        summary.total = data['sum']
+        summary.min = data['min']
+        summary.max = data['max']
+        summary.sketch = QuantileSketch.from_dict(data['sketch'])
+        return summary
@@ -0,0 +1,222 @@
+# File: bob/speedtest_worker.py
+import time
+import logging
+import threading
+import multiprocessing
+from bob.config import (SPEEDTEST_SETUP_TIMEOUT, SPEEDTEST_DOWNLOAD_TIMEOUT,
+                        SPEEDTEST_UPLOAD_TIMEOUT, SPEEDTEST_TOTAL_TIMEOUT)
+
+logger = logging.getLogger('bob.speedtest_worker')
+
+# Phases of a test, in order; a timeout records the one that overran.
+PHASES = ('setup', 'download', 'upload')
+# Seconds a worker gets to exit after SIGTERM before it is killed
+KILL_GRACE = 2
+
+
+class SpeedtestTimeout(Exception):
+    """A speedtest overran its phase or total time budget; the worker was killed."""
+    def __init__(self, phase, cause, partial):
+        """
+        Args:
+            phase (str): Phase that was running ('setup', 'download' or 'upload')
+            cause (str): 'phase' if the phase budget ran out, 'total' for the overall budget
+            partial (dict): Results measured before the timeout
+        """
+        super().__init__(f"speedtest {phase} phase timed out ({cause} budget)")
+        self.phase = phase
+        self.cause = cause
+        self.partial = partial
+
+
+class SpeedtestWorkerError(Exception):
+    """The worker process died or the test raised inside it."""
+
+
+class _PipeHandler(logging.Handler):
+    """Forwards the worker's log records to the parent over the pipe."""
+    def __init__(self, conn, lock):
+        super().__init__()
+        self.conn = conn
+        self.send_lock = lock
+
+    def emit(self, record):
+        try:
+            with self.send_lock:
+                self.conn.send(('log', record.name, record.levelno, record.getMessage()))
+        except Exception:
+            pass
+
+
+def _worker_main(conn, engine_factory=None):
+    """
+    Worker process loop: keeps one engine (for speedtest-cli, with its cached
+    config and server ranking) and runs a test for each request from the parent.
+    """
+    lock = threading.Lock()
+    bob_logger = logging.getLogger('bob')
+    for handler in bob_logger.handlers[:]:
+        bob_logger.removeHandler(handler)
+    bob_logger.addHandler(_PipeHandler(conn, lock))
+    bob_logger.setLevel(logging.INFO)
+    bob_logger.propagate = False
+
+    if engine_factory is None:
+        from bob.speedtest_engine import create_engine
+        engine_factory = create_engine
+    engine = engine_factory()
+
+    def send(*message):
+        with lock:
+            conn.send(message)
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request[0] == 'stop':
+            return
+        _, upload, public_ip = request
+        engine.update_public_ip(public_ip)
+        try:
+            result = engine.run(upload=upload,
+                                progress=lambda phase, partial: send('phase', phase, partial))
+            send('result', result)
+        except Exception as e:
+            send('error', f"{type(e).__name__}: {e}")
+
+
+class SpeedtestWorker:
+    """
+    Runs the speedtest engine (see create_engine()) in a reusable subprocess
+    under hard deadlines.
+
+    speedtest-cli can block indefinitely on a stalled server or a half-open
+    connection. Each phase (setup, download, upload) gets its own time budget
+    and the whole test a total budget. When either runs out the worker is
+    killed, ``SpeedtestTimeout`` reports the phase, the cause and whatever
+    was measured, and a fresh worker is spawned for the next test. The worker
+    is otherwise kept between tests so the engine's cached configuration and
+    server ranking survive. ``run()`` has the same signature and result as
+    ``SpeedtestEngine.run()``.
+    """
+    def __init__(self, setup_timeout=None, download_timeout=None, upload_timeout=None,
+                 total_timeout=None, engine_factory=None):
+        """
+        Args:
+            setup_timeout (float): Seconds allowed for config download and server selection
+            download_timeout (float): Seconds allowed for the download phase
+            upload_timeout (float): Seconds allowed for the upload phase
+            total_timeout (float): Seconds allowed for the whole test
+            engine_factory (callable): Picklable callable that builds the engine in
+                the worker; defaults to create_engine()
+        """
+        self.budgets = {
+            'setup': setup_timeout or SPEEDTEST_SETUP_TIMEOUT,
+            'download': download_timeout or SPEEDTEST_DOWNLOAD_TIMEOUT,
+            'upload': upload_timeout or SPEEDTEST_UPLOAD_TIMEOUT,
+        }
+        self.total_timeout = total_timeout or SPEEDTEST_TOTAL_TIMEOUT
+        self.engine_factory = engine_factory
+        # spawn rather than fork: the parent runs GPS, scheduler and upload threads.
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._public_ip = None
+        self.spawns = 0
+        self.timeouts = 0
+
+    def update_public_ip(self, ip):
+        """Pass the device's public IP to the engine with the next test."""
+        if ip:
+            self._public_ip = ip
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(target=_worker_main,
+                                              args=(child_conn, self.engine_factory),
+                                              name='bob-speedtest', daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self.spawns += 1
+        logger.info("Started speedtest worker (pid %d).", self._process.pid)
+
+    def _kill(self):
+        """Stop the worker now; the next test spawns a new one."""
+        if self._process is None:
+            return
+        self._process.terminate()
+        self._process.join(KILL_GRACE)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+        self._process = self._conn = None
+
+    def run(self, upload=True):
+        """
+        Run one speed test in the worker.
+
+        Args:
+            upload (bool): False to skip the upload phase
+
+        Returns:
+            dict: As returned by SpeedtestEngine.run()
+
+        Raises:
+            SpeedtestTimeout: A phase or the whole test overran its budget
+            SpeedtestWorkerError: The test failed or the worker died
+        """
+        if self._process is None or not self._process.is_alive():
+            if self._process is not None:
+                logger.warning("Speedtest worker exited (code %s); respawning.",
+                               self._process.exitcode)
+                self._kill()
+            self._spawn()
+
+        start = time.monotonic()
+        total_deadline = start + self.total_timeout
+        phase = 'setup'
+        phase_deadline = start + self.budgets[phase]
+        partial = {}
+        self._conn.send(('run', upload, self._public_ip))
+        while True:
+            deadline = min(phase_deadline, total_deadline)
+            try:
+                ready = self._conn.poll(max(0.0, deadline - time.monotonic()))
+                message = self._conn.recv() if ready else None
+            except (EOFError, OSError):
+                code = self._process.exitcode
+                self._kill()
+                raise SpeedtestWorkerError(f"speedtest worker died during {phase} (code {code})")
+            if message is None:
+                cause = 'phase' if phase_deadline <= total_deadline else 'total'
+                self.timeouts += 1
+                logger.error("Speedtest %s phase overran its %s budget after %.1fs; "
+                             "killing worker.", phase, cause, time.monotonic() - start)
+                self._kill()
+                raise SpeedtestTimeout(phase, cause, partial)
+            kind = message[0]
+            if kind == 'log':
+                logging.getLogger(message[1]).log(message[2], message[3])
+            elif kind == 'phase':
+                phase = message[1]
+                partial.update(message[2])
+                phase_deadline = time.monotonic() + self.budgets[phase]
+            elif kind == 'result':
+                return message[1]
+            elif kind == 'error':
+                raise SpeedtestWorkerError(message[1])
+
+    def close(self):
+        """Ask the worker to exit, killing it if it does not."""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(('stop',))
+            self._process.join(KILL_GRACE)
+        except (OSError, ValueError):
+            pass
+        self._kill()
@@ -0,0 +1,176 @@
+# File: bob/spool.py
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+from bob.config import SPOOL_DB_FILE, SPOOL_BACKOFF_BASE, SPOOL_BACKOFF_MAX
+
+logger = logging.getLogger('bob.spool')
+
+# Lower values are sent first.
+PRIORITY_CONTROL = 0   # activation/deactivation and extinction notices
+PRIORITY_SUMMARY = 5   # tile/statistics summaries
+PRIORITY_DATA = 10     # sealed speed/GPS segments
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    remote_dir TEXT NOT NULL,
+    remote_name TEXT NOT NULL,
+    codec TEXT NOT NULL DEFAULT 'none',
+    priority INTEGER NOT NULL,
+    delete_after INTEGER NOT NULL DEFAULT 1,
+    resume INTEGER NOT NULL DEFAULT 1,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT,
+    UNIQUE (path, remote_dir, remote_name)
+);
+CREATE INDEX IF NOT EXISTS spool_due ON spool (priority, next_attempt, created_at);
+"""
+
+# Columns added after the first release, with their definitions, so that
+# spools created by older versions are upgraded in place.
+_ADDED_COLUMNS = {
+    'resume': "INTEGER NOT NULL DEFAULT 1",
+}
+
+
+class SpoolItem:
+    """A file waiting to be uploaded."""
+    __slots__ = ('id', 'path', 'remote_dir', 'remote_name', 'codec', 'priority',
+                 'delete_after', 'resume', 'attempts', 'next_attempt', 'created_at', 'last_error')
+
+    def __init__(self, row):
+        for name, value in zip(self.__slots__, row):
+            setattr(self, name, value)
+
+
+class UploadSpool:
+    """
+    Durable, crash-safe queue of outgoing files backed by SQLite in WAL mode.
+
+    Files stay on disk until their upload is confirmed, so the device can keep
+    collecting while offline. Failed items are retried with exponential
+    backoff; control notices (PRIORITY_CONTROL) are always sent before bulk
+    data. When connectivity returns, reset_backoff() makes the whole backlog
+    due at once so it drains at full speed.
+    """
+    def __init__(self, path=None, backoff_base=None, backoff_max=None):
+        """
+        Args:
+            path (str): SQLite database file
+            backoff_base (float): Delay in seconds after the first failure
+            backoff_max (float): Upper bound on the retry delay
+        """
+        self.path = path or SPOOL_DB_FILE
+        self.backoff_base = backoff_base or SPOOL_BACKOFF_BASE
+        self.backoff_max = backoff_max or SPOOL_BACKOFF_MAX
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(spool)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE spool ADD COLUMN {name} {definition}")
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def enqueue(self, path, remote_dir, remote_name=None, codec='none',
+                priority=PRIORITY_DATA, delete_after=True, resume=True):
+        """
+        Add a file to the spool. Enqueuing the same file twice is a no-op.
+
+        Args:
+            path (str): Local file to upload
+            remote_dir (str): Remote directory to upload into
+            remote_name (str): Remote filename; defaults to the local basename
+            codec (str): Compression codec for the upload (see bob.compression)
+            priority (int): PRIORITY_CONTROL or PRIORITY_DATA
+            delete_after (bool): Remove the local file once the upload is confirmed
+            resume (bool): Allow resuming a partial upload; False always replaces the
+                remote file from the start (for fixed-name files such as notices)
+        """
+        now = time.time()
+        self._execute(
+            "INSERT OR IGNORE INTO spool (path, remote_dir, remote_name, codec, priority,"
+            " delete_after, resume, next_attempt, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, remote_dir, remote_name or os.path.basename(path), codec, priority,
+             int(delete_after), int(resume), now, now))
+
+    def due(self, limit=None, now=None, max_priority=None):
+        """
+        Args:
+            max_priority (int): Only return items at this priority or more urgent
+
+        Returns:
+            list: SpoolItems ready to be sent, highest priority and oldest first
+        """
+        sql = "SELECT " + ", ".join(SpoolItem.__slots__) + " FROM spool WHERE next_attempt <= ?"
+        params = [time.time() if now is None else now]
+        if max_priority is not None:
+            sql += " AND priority <= ?"
+            params.append(max_priority)
+        sql += " ORDER BY priority, created_at, id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [SpoolItem(row) for row in self._execute(sql, params)]
+
+    def mark_done(self, item):
+        """Remove a confirmed upload from the spool and, if requested, delete the file."""
+        self._execute("DELETE FROM spool WHERE id = ?", (item.id,))
+        if item.delete_after:
+            try:
+                os.remove(item.path)
+                logger.info("Deleted local file: %s", item.path)
+            except FileNotFoundError:
+                pass
+
+    def mark_failed(self, item, error):
+        """Record a failed attempt and schedule a retry with exponential backoff."""
+        attempts = item.attempts + 1
+        delay = min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max)
+        delay *= random.uniform(0.8, 1.2)  # Spread out retries across the fleet.
+        self._execute(
+            "UPDATE spool SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+            (attempts, time.time() + delay, str(error)[:500], item.id))
+        logger.warning("Upload of %s failed (attempt %d); retrying in %.0fs: %s",
+                       item.path, attempts, delay, error)
+
+    def drop(self, item):
+        """Remove an item whose local file no longer exists."""
+        self._execute("DELETE FROM spool WHERE id = ?", (item.id,))
+
+    def reset_backoff(self):
+        """Make every item due now, e.g. once connectivity has returned."""
+        self._execute("UPDATE spool SET next_attempt = ? WHERE next_attempt > ?",
+                      (time.time(), time.time()))
+
+    def pending_count(self):
+        return self._execute("SELECT COUNT(*) FROM spool")[0][0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Shared spool used by the uploader and activation modules.
+upload_spool = UploadSpool()
@@ -0,0 +1,364 @@
+# bob/throughput.py
+"""
+In-house multi-stream TCP throughput test.
+
+``ThroughputEngine`` measures download and upload speed against a
+``ThroughputServer`` over ``streams`` parallel TCP connections. Each
+direction stops at whichever comes first:
+
+- the transfer rate has stabilized: over the last ``stable_window`` seconds
+  of quarter-second samples, the mean rates of the first and second halves
+  differ by at most ``stable_tolerance``,
+- ``duration`` seconds have passed,
+- ``max_bytes`` have been moved.
+
+The protocol is one request line per connection:
+
+    PING\\n              -> PONG\\n
+    DOWNLOAD <bytes>\\n  -> <bytes> of payload
+    UPLOAD <bytes>\\n    <- up to <bytes> of payload, then OK <received>\\n
+
+so the server is small enough to run next to the device for load tests and
+regression benchmarks on loopback. Unknown commands, and sizes that are not
+a whole number of at most MAX_REQUEST_BYTES, get ``ERR <reason>\\n``.
+
+Usage:
+    python -m bob.throughput serve [--host HOST] [--port PORT]
+    python -m bob.throughput bench [--streams N] [--duration S] [--max-mb MB]
+"""
+
+import os
+import time
+import socket
+import logging
+import argparse
+import statistics
+import threading
+import socketserver
+from bob.config import (THROUGHPUT_SERVER, THROUGHPUT_PORT, THROUGHPUT_STREAMS,
+                        THROUGHPUT_DURATION, THROUGHPUT_MAX_BYTES, THROUGHPUT_STABLE_WINDOW,
+                        THROUGHPUT_STABLE_TOLERANCE)
+
+logger = logging.getLogger('bob.throughput')
+
+CHUNK_SIZE = 64 * 1024
+# Seconds between throughput samples
+SAMPLE_INTERVAL = 0.25
+# Samples ignored at the start of each direction while TCP ramps up
+WARMUP_SAMPLES = 2
+CONNECT_TIMEOUT = 10
+IO_TIMEOUT = 10
+PING_COUNT = 5
+# Largest DOWNLOAD or UPLOAD size the server accepts in one request
+MAX_REQUEST_BYTES = 1 << 30
+
+_PAYLOAD = os.urandom(CHUNK_SIZE)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Unbuffered, so reading the request line cannot swallow upload payload
+    # that arrived in the same segment.
+    rbufsize = 0
+
+    def _reject(self, reason):
+        logger.warning("Rejected throughput request from %s: %s", self.client_address[0], reason)
+        try:
+            self.wfile.write(f'ERR {reason}\n'.encode('ascii'))
+        except OSError:
+            pass
+
+    def handle(self):
+        try:
+            request = self.rfile.readline(64).decode('ascii').split()
+        except (OSError, UnicodeDecodeError):
+            return
+        if not request:
+            return
+        command = request[0]
+        if command not in ('PING', 'DOWNLOAD', 'UPLOAD'):
+            self._reject("unknown command")
+            return
+        size = 0
+        if command != 'PING':
+            if len(request) != 2 or not request[1].isdigit():
+                self._reject("size must be a whole number of bytes")
+                return
+            size = int(request[1])
+            if size > MAX_REQUEST_BYTES:
+                self._reject(f"size exceeds {MAX_REQUEST_BYTES} bytes")
+                return
+        try:
+            if command == 'PING':
+                self.wfile.write(b'PONG\n')
+            elif command == 'DOWNLOAD':
+                view = memoryview(_PAYLOAD)
+                while size > 0:
+                    n = min(size, CHUNK_SIZE)
+                    self.connection.sendall(view[:n])
+                    size -= n
+            elif command == 'UPLOAD':
+                buffer = bytearray(CHUNK_SIZE)
+                received = 0
+                while received < size:
+                    n = self.connection.recv_into(buffer, min(CHUNK_SIZE, size - received))
+                    if not n:
+                        break
+                    received += n
+                self.wfile.write(f'OK {received}\n'.encode('ascii'))
+        except OSError:
+            # The client closes streams early once the rate has stabilized.
+            pass
+
+
+class ThroughputServer(socketserver.ThreadingTCPServer):
+    """Companion server for ThroughputEngine, one thread per connection."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='0.0.0.0', port=None):
+        super().__init__((host, port if port is not None else THROUGHPUT_PORT), _Handler)
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, name='bob-throughput-server',
+                                        daemon=True)
+        self._thread.start()
+        logger.info("Throughput server listening on %s:%d", *self.server_address[:2])
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class ThroughputEngine:
+    """
+    Multi-stream TCP throughput test with early termination and a byte
+    budget. ``run()`` returns the same result as SpeedtestEngine.run(), so
+    the engine can stand in for speedtest-cli (SPEEDTEST_BACKEND=native).
+    """
+    def __init__(self, server=None, port=None, streams=None, duration=None, max_bytes=None,
+                 stable_window=None, stable_tolerance=None):
+        """
+        Args:
+            server (str): Host running ThroughputServer
+            port (int): Server port
+            streams (int): Parallel TCP connections per direction
+            duration (float): Longest time spent on each direction, in seconds
+            max_bytes (int): Byte budget for each direction
+            stable_window (float): Seconds of steady samples that end a direction early
+            stable_tolerance (float): Largest relative change between the window's halves
+        """
+        self.server = server or THROUGHPUT_SERVER
+        self.port = port or THROUGHPUT_PORT
+        self.streams = streams or THROUGHPUT_STREAMS
+        self.duration = duration or THROUGHPUT_DURATION
+        self.max_bytes = max_bytes or THROUGHPUT_MAX_BYTES
+        self.stable_window = stable_window or THROUGHPUT_STABLE_WINDOW
+        self.stable_tolerance = stable_tolerance or THROUGHPUT_STABLE_TOLERANCE
+        self.last_bytes = 0
+
+    def update_public_ip(self, ip):
+        """Accepted for compatibility with SpeedtestEngine; the server is fixed."""
+
+    def _connect(self, request):
+        sock = socket.create_connection((self.server, self.port), timeout=CONNECT_TIMEOUT)
+        sock.settimeout(IO_TIMEOUT)
+        sock.sendall(request.encode('ascii'))
+        return sock
+
+    def ping(self):
+        """
+        Returns:
+            float: Median request round trip in ms over PING_COUNT connections
+        """
+        times = []
+        for _ in range(PING_COUNT):
+            start = time.perf_counter()
+            with self._connect('PING\n') as sock:
+                if sock.recv(16) != b'PONG\n':
+                    raise ConnectionError("Unexpected ping reply from throughput server")
+            times.append((time.perf_counter() - start) * 1000)
+        return statistics.median(times)
+
+    def _download_stream(self, index, size, counters, stop):
+        buffer = bytearray(CHUNK_SIZE)
+        with self._connect(f'DOWNLOAD {size}\n') as sock:
+            while not stop.is_set():
+                n = sock.recv_into(buffer)
+                if not n:
+                    return
+                counters[index] += n
+
+    def _upload_stream(self, index, size, counters, stop):
+        view = memoryview(_PAYLOAD)
+        with self._connect(f'UPLOAD {size}\n') as sock:
+            sent = 0
+            while sent < size and not stop.is_set():
+                n = sock.send(view[:min(CHUNK_SIZE, size - sent)])
+                sent += n
+                counters[index] += n
+
+    def _stable(self, rates):
+        window = max(2, int(self.stable_window / SAMPLE_INTERVAL))
+        if len(rates) < window:
+            return None
+        recent = rates[-window:]
+        half = window // 2
+        first = sum(recent[:half]) / half
+        second = sum(recent[half:]) / (window - half)
+        mean = sum(recent) / window
+        # Comparing halves rather than single samples tolerates the jitter of
+        # short sampling intervals while still catching a rising rate.
+        if mean and abs(second - first) / mean <= self.stable_tolerance:
+            return mean
+        return None
+
+    def measure(self, direction):
+        """
+        Measure one direction.
+
+        Args:
+            direction (str): 'download' or 'upload'
+
+        Returns:
+            dict: bits_per_second, bytes, elapsed, stable (True if it stopped early)
+        """
+        target = self._download_stream if direction == 'download' else self._upload_stream
+        counters = [0] * self.streams
+        errors = []
+        stop = threading.Event()
+        per_stream = min(self.max_bytes // self.streams, MAX_REQUEST_BYTES)
+
+        def stream(index):
+            try:
+                target(index, per_stream, counters, stop)
+            except OSError as e:
+                if not stop.is_set():
+                    errors.append(e)
+
+        threads = [threading.Thread(target=stream, args=(i,), name=f'bob-{direction}-{i}',
+                                    daemon=True) for i in range(self.streams)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        rates = []
+        stable_rate = None
+        previous_total, previous_time = 0, start
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(SAMPLE_INTERVAL)
+            now = time.monotonic()
+            total = sum(counters)
+            rates.append((total - previous_total) * 8 / (now - previous_time))
+            previous_total, previous_time = total, now
+            stable_rate = self._stable(rates[WARMUP_SAMPLES:])
+            if stable_rate is not None or now - start >= self.duration or total >= self.max_bytes:
+                break
+        stop.set()
+        for thread in threads:
+            thread.join(IO_TIMEOUT)
+        elapsed = time.monotonic() - start
+        total = sum(counters)
+        if errors and not total:
+            raise errors[0]
+        if stable_rate is not None:
+            rate = stable_rate
+        else:
+            # Average over the samples after the ramp-up when there are any.
+            measured = rates[WARMUP_SAMPLES:]
+            rate = sum(measured) / len(measured) if measured else total * 8 / elapsed
+        return {'bits_per_second': rate, 'bytes': total, 'elapsed': elapsed,
+                'stable': stable_rate is not None}
+
+    def run(self, upload=True, progress=None):
+        """
+        Run one test: ping, download and (optionally) upload.
+
+        Args:
+            upload (bool): False to skip the upload phase
+            progress (callable): Called as ``progress(phase, partial)`` when a phase starts
+
+        Returns:
+            dict: download and upload in Mbps (upload None if skipped), ping in
+            ms, the server used, setup_time, time_saved and the bytes used
+        """
+        setup_start = time.monotonic()
+        ping = self.ping()
+        setup_time = time.monotonic() - setup_start
+        server = f"{self.server}:{self.port}"
+        if progress:
+            progress('download', {'ping': ping, 'server': server})
+        down = self.measure('download')
+        download = down['bits_per_second'] / 1048576  # Convert to Mbps.
+        used = down['bytes']
+        if upload:
+            if progress:
+                progress('upload', {'download': download})
+            up = self.measure('upload')
+            used += up['bytes']
+            upload = up['bits_per_second'] / 1048576  # Convert to Mbps.
+        else:
+            upload = None
+        self.last_bytes = used
+        logger.info("Throughput test against %s used %.1f MB (download %.1fs%s)",
+                    server, used / 1048576, down['elapsed'],
+                    ", stabilized early" if down['stable'] else "")
+        return {
+            'download': download,
+            'upload': upload,
+            'ping': ping,
+            'server': server,
+            'setup_time': setup_time,
+            'time_saved': 0.0,
+            'bytes': used,
+        }
+
+
+def benchmark(streams=None, duration=None, max_bytes=None):
+    """
+    Run the engine against a ThroughputServer on loopback.
+
+    Returns:
+        dict: The engine's result
+    """
+    server = ThroughputServer('127.0.0.1', 0).start()
+    try:
+        engine = ThroughputEngine('127.0.0.1', server.port, streams=streams, duration=duration,
+                                  max_bytes=max_bytes)
+        return engine.run()
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="bob throughput server and loopback benchmark")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="run the companion server")
+    serve.add_argument('--host', default='0.0.0.0')
+    serve.add_argument('--port', type=int, default=THROUGHPUT_PORT)
+    bench = commands.add_parser('bench', help="benchmark the engine on loopback")
+    bench.add_argument('--streams', type=int)
+    bench.add_argument('--duration', type=float)
+    bench.add_argument('--max-mb', type=float)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        logging.basicConfig(level=logging.INFO)
+        with ThroughputServer(args.host, args.port) as server:
+            print(f"Serving throughput tests on {args.host}:{server.port}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    else:
+        result = benchmark(args.streams, args.duration,
+                           int(args.max_mb * 1048576) if args.max_mb else None)
+        print(f"download {result['download']:.1f} Mbps, upload {result['upload']:.1f} Mbps, "
+              f"ping {result['ping']:.2f} ms, {result['bytes'] / 1048576:.1f} MB used")
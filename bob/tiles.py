@@ -0,0 +1,185 @@
+# File: bob/tiles.py
+import os
+import json
+import math
+import time
+import logging
+import threading
+from bob.sketch import Summary
+from bob.config import (TILE_SCHEME, TILE_PRECISION, TILE_GRID_SIZE, TILE_STATE_FILE,
+                        TILE_PERSIST_INTERVAL)
+
+logger = logging.getLogger('bob.tiles')
+
+TILE_SCHEMES = ('geohash', 'grid')
+# Metrics aggregated per tile
+TILE_METRICS = ('download', 'upload', 'ping')
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(latitude, longitude, precision=6):
+    """
+    Encode a position as a geohash of the given number of characters
+    (6 characters is roughly 1.2 km x 0.6 km).
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def grid_tile(latitude, longitude, size=0.01):
+    """Key of the fixed-size lat/lon grid cell (size in degrees) containing a position."""
+    return f"{math.floor(latitude / size)}:{math.floor(longitude / size)}"
+
+
+class TileAggregator:
+    """
+    Incremental per-tile coverage statistics for geotagged speed results.
+
+    Each tile keeps a Summary (count, mean, min, max and a mergeable quantile
+    sketch) per metric, so memory grows with the area covered rather than the
+    number of samples. The index is persisted to ``state_path`` every
+    ``persist_interval`` seconds and reloaded on start. ``write_summary()``
+    writes the tiles that changed since the previous summary to a small JSON
+    file for upload.
+    """
+    def __init__(self, scheme=None, precision=None, grid_size=None, state_path=None,
+                 persist_interval=None):
+        """
+        Args:
+            scheme (str): 'geohash' or 'grid'
+            precision (int): Geohash length
+            grid_size (float): Grid cell size in degrees
+            state_path (str): File the index is persisted to
+            persist_interval (float): Seconds between persists
+        """
+        self.scheme = scheme or TILE_SCHEME
+        if self.scheme not in TILE_SCHEMES:
+            raise ValueError(f"Unknown tile scheme: {self.scheme}")
+        self.precision = precision or TILE_PRECISION
+        self.grid_size = grid_size or TILE_GRID_SIZE
+        self.state_path = state_path or TILE_STATE_FILE
+        self.persist_interval = persist_interval or TILE_PERSIST_INTERVAL
+        self.tiles = {}
+        self._dirty = set()      # tiles changed since the last summary
+        self._unsaved = False
+        self._last_persist = time.monotonic()
+        self._lock = threading.Lock()
+        self._load()
+
+    def tile_key(self, latitude, longitude):
+        if self.scheme == 'geohash':
+            return geohash(latitude, longitude, self.precision)
+        return grid_tile(latitude, longitude, self.grid_size)
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("Ignoring unreadable tile state %s: %s", self.state_path, e)
+            return
+        if state.get('scheme') != self.scheme or state.get('precision') != self._precision_key():
+            logger.info("Tile scheme changed; starting a new tile index.")
+            return
+        self.tiles = {key: {metric: Summary.from_dict(data) for metric, data in metrics.items()}
+                      for key, metrics in state['tiles'].items()}
+        self._dirty = set(state.get('dirty', []))
+        logger.info("Loaded %d tiles from %s", len(self.tiles), self.state_path)
+
+    def _precision_key(self):
+        return self.precision if self.scheme == 'geohash' else self.grid_size
+
+    def add(self, latitude, longitude, values):
+        """
+        Add one geotagged result.
+
+        Args:
+            latitude (float): Latitude in degrees
+            longitude (float): Longitude in degrees
+            values (dict): Metric name -> value, for TILE_METRICS
+        """
+        key = self.tile_key(latitude, longitude)
+        with self._lock:
+            tile = self.tiles.get(key)
+            if tile is None:
+                tile = self.tiles[key] = {metric: Summary() for metric in TILE_METRICS}
+            for metric in TILE_METRICS:
+                if values.get(metric) is not None:
+                    tile[metric].add(values[metric])
+            self._dirty.add(key)
+            self._unsaved = True
+            due = time.monotonic() - self._last_persist >= self.persist_interval
+        if due:
+            self.persist()
+        return key
+
+    def persist(self):
+        """Atomically write the tile index to the state file."""
+        with self._lock:
+            if not self._unsaved:
+                return
+            state = {
+                'scheme': self.scheme,
+                'precision': self._precision_key(),
+                'tiles': {key: {metric: stats.to_dict(quantiles=())
+                                for metric, stats in metrics.items()}
+                          for key, metrics in self.tiles.items()},
+                'dirty': sorted(self._dirty),
+            }
+            self._unsaved = False
+            self._last_persist = time.monotonic()
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f, separators=(',', ':'))
+            os.replace(tmp_path, self.state_path)
+
+    def write_summary(self, path_prefix):
+        """
+        Write the cumulative statistics of every tile changed since the last
+        summary to ``{path_prefix}-{YYYYmmddHHMMSS}.json``.
+
+        Returns:
+            str: Path of the summary file, or None if no tile changed
+        """
+        with self._lock:
+            if not self._dirty:
+                return None
+            summary = {
+                'scheme': self.scheme,
+                'precision': self._precision_key(),
+                'generated': time.time(),
+                'tiles': {key: {metric: stats.to_dict()
+                                for metric, stats in self.tiles[key].items()}
+                          for key in sorted(self._dirty)},
+            }
+            self._dirty.clear()
+            self._unsaved = True
+        path = f"{path_prefix}-{time.strftime('%Y%m%d%H%M%S')}.json"
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(summary, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        self.persist()
+        logger.info("Wrote summary of %d tiles to %s", len(summary['tiles']), path)
+        return path
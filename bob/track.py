@@ -0,0 +1,316 @@
+# bob/track.py
+"""
+GPS track compression.
+
+``TrackCompressor`` thins a stream of fixes before it is stored: a fix is
+dropped while the device has moved less than ``min_distance`` metres from
+the last kept point (with one point kept at least every ``max_interval``
+seconds), and each window of kept points is simplified with Douglas-Peucker
+within ``tolerance`` metres. Every recorded fix therefore lies within
+``min_distance + tolerance`` metres of the stored track.
+
+``TrackLogWriter`` stores the result compactly: each field is quantized
+(timestamps to milliseconds, coordinates to 1e-7 degrees) and written as the
+zigzag varint delta from the previous row, so a slowly moving device costs a
+few bytes per point. ``export_csv`` turns a track log back into CSV.
+
+Usage:
+    python -m bob.track <track.trk> [output.csv]
+"""
+
+import os
+import sys
+import csv
+import json
+import math
+import struct
+import datetime
+from bob.record_log import RecordSchema
+from bob.config import (GPS_TRACK_MIN_DISTANCE, GPS_TRACK_MAX_INTERVAL, GPS_TRACK_TOLERANCE,
+                        GPS_TRACK_WINDOW)
+
+MAGIC = b'BOBTRK'
+VERSION = 1
+# magic, version, length of the JSON layout that follows
+_PREAMBLE = struct.Struct('<6sHI')
+EARTH_RADIUS = 6371000.0  # metres
+
+
+def _epoch(value):
+    return value.timestamp() if isinstance(value, datetime.datetime) else value
+
+
+def _project(lat, lon, origin_lat, origin_lon):
+    """Equirectangular projection to metres around an origin; fine over a few km."""
+    x = math.radians(lon - origin_lon) * EARTH_RADIUS * math.cos(math.radians(origin_lat))
+    y = math.radians(lat - origin_lat) * EARTH_RADIUS
+    return x, y
+
+
+def distance(a, b):
+    """
+    Args:
+        a, b: (latitude, longitude) pairs in degrees
+
+    Returns:
+        float: Approximate distance in metres
+    """
+    x, y = _project(b[0], b[1], a[0], a[1])
+    return math.hypot(x, y)
+
+
+def douglas_peucker(points, tolerance):
+    """
+    Simplify a polyline.
+
+    Args:
+        points (list): Items whose [1] and [2] are latitude and longitude
+        tolerance (float): Largest allowed distance in metres from a dropped
+            point to the simplified line
+
+    Returns:
+        list: The retained points, in order (always includes the end points)
+    """
+    if len(points) < 3:
+        return list(points)
+    origin = points[0]
+    xy = [_project(p[1], p[2], origin[1], origin[2]) for p in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = xy[first], xy[last]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        worst, worst_index = -1.0, None
+        for i in range(first + 1, last):
+            px, py = xy[i]
+            if length_sq:
+                t = max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+                d = math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+            else:
+                d = math.hypot(px - x1, py - y1)
+            if d > worst:
+                worst, worst_index = d, i
+        if worst_index is not None and worst > tolerance:
+            keep[worst_index] = True
+            stack.append((first, worst_index))
+            stack.append((worst_index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+class TrackCompressor:
+    """
+    Online track thinning: distance/time thresholding followed by
+    Douglas-Peucker over windows of ``window`` points. The last point of each
+    window starts the next one, so window boundaries do not add error.
+    """
+    def __init__(self, min_distance=None, max_interval=None, tolerance=None, window=None):
+        """
+        Args:
+            min_distance (float): Metres the device must move before a fix is kept
+            max_interval (float): Seconds after which a fix is kept even when stationary
+            tolerance (float): Douglas-Peucker tolerance in metres
+            window (int): Points simplified at a time
+        """
+        self.min_distance = GPS_TRACK_MIN_DISTANCE if min_distance is None else min_distance
+        self.max_interval = max_interval or GPS_TRACK_MAX_INTERVAL
+        self.tolerance = GPS_TRACK_TOLERANCE if tolerance is None else tolerance
+        self.window = max(3, window or GPS_TRACK_WINDOW)
+        self._buffer = []
+        self._last = None
+        self.last_seen = None   # epoch seconds of the newest fix added
+        self.seen = 0
+        self.kept = 0
+
+    def add(self, fix):
+        """
+        Add a fix (timestamp, latitude, longitude, ...).
+
+        Returns:
+            list: Points that are now final and can be stored
+        """
+        self.seen += 1
+        self.last_seen = _epoch(fix[0])
+        if self._last is not None:
+            moved = distance(self._last[1:3], fix[1:3])
+            elapsed = _epoch(fix[0]) - _epoch(self._last[0])
+            if moved < self.min_distance and elapsed < self.max_interval:
+                return []
+        self._last = fix
+        self._buffer.append(fix)
+        if len(self._buffer) < self.window:
+            return []
+        simplified = douglas_peucker(self._buffer, self.tolerance)
+        self._buffer = [simplified[-1]]
+        return self._emit(simplified[:-1])
+
+    def flush(self):
+        """
+        Returns:
+            list: All remaining points, simplified
+        """
+        simplified = douglas_peucker(self._buffer, self.tolerance)
+        self._buffer = []
+        return self._emit(simplified)
+
+    def _emit(self, points):
+        self.kept += len(points)
+        return points
+
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def _encode_varint(n, out):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _default_scales(schema):
+    # Timestamps in milliseconds, everything else (coordinates) in 1e-7 units.
+    return [1000 if fmt == 'timestamp' else 10 ** 7 for fmt in schema.formats]
+
+
+def _read_header(f):
+    """
+    Returns:
+        tuple: (RecordSchema, scales, offset of the first row)
+    """
+    preamble = f.read(_PREAMBLE.size)
+    if len(preamble) < _PREAMBLE.size:
+        raise ValueError("Track log header is truncated")
+    magic, version, layout_len = _PREAMBLE.unpack(preamble)
+    if magic != MAGIC:
+        raise ValueError("Not a bob track log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported track log version: {version}")
+    layout = json.loads(f.read(layout_len).decode('utf-8'))
+    return RecordSchema(layout['fields']), layout['scales'], _PREAMBLE.size + layout_len
+
+
+def _decode_rows(data, width):
+    """
+    Decode delta-encoded rows of quantized integers.
+
+    Returns:
+        tuple: (list of rows, number of bytes making up complete rows)
+    """
+    rows = []
+    previous = [0] * width
+    row, value, shift, complete = [], 0, 0, 0
+    for pos, byte in enumerate(data):
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        row.append(previous[len(row)] + _unzigzag(value))
+        value, shift = 0, 0
+        if len(row) == width:
+            rows.append(row)
+            previous, row = row, []
+            complete = pos + 1
+    return rows, complete
+
+
+class TrackLogWriter:
+    """
+    Appends rows to a delta/varint track log, writing the header if the file
+    is new. Exposes the same interface as the other FileManager sinks.
+    """
+    def __init__(self, path, schema):
+        """
+        Args:
+            path (str): Path of the track log
+            schema (RecordSchema): Row layout (timestamp and coordinate fields)
+        """
+        self.path = path
+        self.schema = schema
+        self.scales = _default_scales(schema)
+        self._previous = [0] * len(self.scales)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                existing, scales, data_offset = _read_header(f)
+                data = f.read()
+            if existing != schema or scales != self.scales:
+                raise ValueError(f"Track layout of {path} does not match")
+            rows, complete = _decode_rows(data, len(scales))
+            if rows:
+                self._previous = rows[-1]
+            self.handle = open(path, 'ab')
+            if complete < len(data):
+                # Drop a torn trailing row left by a crash mid-write.
+                self.handle.truncate(data_offset + complete)
+            self.created = False
+        else:
+            self.handle = open(path, 'ab')
+            layout = json.dumps({'fields': schema.fields, 'scales': self.scales}).encode('utf-8')
+            self.handle.write(_PREAMBLE.pack(MAGIC, VERSION, len(layout)) + layout)
+            self.created = True
+
+    def write_rows(self, rows):
+        """Append rows of typed values."""
+        out = bytearray()
+        for row in rows:
+            quantized = [int(round(_epoch(value) * scale)) for value, scale in zip(row, self.scales)]
+            for value, previous in zip(quantized, self._previous):
+                _encode_varint(_zigzag(value - previous), out)
+            self._previous = quantized
+        self.handle.write(out)
+
+    def flush(self):
+        self.handle.flush()
+
+    def fileno(self):
+        return self.handle.fileno()
+
+    def close(self):
+        self.handle.close()
+
+
+def read_track(path):
+    """
+    Returns:
+        tuple: (RecordSchema, list of rows with timestamps as epoch seconds)
+    """
+    with open(path, 'rb') as f:
+        schema, scales, _ = _read_header(f)
+        rows, _ = _decode_rows(f.read(), len(scales))
+    return schema, [[value / scale for value, scale in zip(row, scales)] for row in rows]
+
+
+def export_csv(track_path, csv_path=None):
+    """
+    Export a track log to CSV using the layout's field names and formats.
+
+    Args:
+        track_path (str): Path of the track log
+        csv_path (str): Output path; defaults to the track path with a .csv extension
+
+    Returns:
+        str: Path of the written CSV file
+    """
+    if csv_path is None:
+        csv_path = os.path.splitext(track_path)[0] + '.csv'
+    schema, rows = read_track(track_path)
+    with open(csv_path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(schema.names)
+        for row in rows:
+            writer.writerow(schema.to_csv_row(row))
+    return csv_path
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m bob.track <track.trk> [output.csv]")
+        sys.exit(1)
+    print(export_csv(*sys.argv[1:]))
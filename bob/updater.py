@@ -5,7 +5,7 @@ from decimal import Decimal
 import glob
 import os
 import shutil
-from .ftp_client import FTPClient
+from .ftp_client import ftp_pool
 from .config import VERSIONS_DIR, DATA_DIR, BASE_DIR
 from .process_utils import reboot_device
 from .logger import logger
@@ -49,12 +49,11 @@ def download_update() -> str:
     """
     Download the updated main file from FTP and return its local path.
     """
-    ftp_client = FTPClient()
-    ftp_client.change_directory(FTP_DETAILS['target_down'])
     remote_file = "mainBOBv2.10.py"
     local_file = os.path.join(VERSIONS_DIR, remote_file)
-    ftp_client.download_file(remote_file, local_file)
-    ftp_client.quit()
+    with ftp_pool.lease() as ftp_client:
+        ftp_client.change_directory(FTP_DETAILS['target_down'])
+        ftp_client.download_file(remote_file, local_file)
     return local_file
 
 def install_update(new_file: str, old_file: str):
@@ -0,0 +1,5 @@
+#!/usr/bin/env python3
+from bob.gps import benchmark
+
+if __name__ == '__main__':
+    print("NMEA parser: %.0f sentences/s" % benchmark())
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+from bob.throughput import benchmark
+
+if __name__ == '__main__':
+    result = benchmark()
+    print("Loopback throughput: download %.1f Mbps, upload %.1f Mbps, %.1f MB used"
+          % (result['download'], result['upload'], result['bytes'] / 1048576))
@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# bob.config creates BASE_DIR and its data and log directories on import;
+# keep them in a scratch directory unless the caller picked one.
+os.environ.setdefault('BOB_BASE_DIR', tempfile.mkdtemp(prefix='bob-tests-'))
@@ -0,0 +1,81 @@
+# tests/test_adaptive.py
+import json
+import datetime
+
+import pytest
+
+from bob.adaptive import AdaptiveInterval
+
+
+class FakeGPS:
+    def __init__(self):
+        self.position = (51.5, -0.12)
+
+    def latest(self):
+        class Fix:
+            latitude, longitude = self.position
+        return Fix
+
+
+@pytest.fixture
+def policy(tmp_path):
+    return AdaptiveInterval(initial=600, min_interval=60, max_interval=3600, daily_budget=0,
+                            stable_cv=0.1, unstable_cv=0.5, move_distance=500,
+                            state_path=str(tmp_path / 'adaptive.json'))
+
+
+def run_test(policy, download):
+    policy.record_test()
+    policy.observe(download)
+    return policy()
+
+
+def test_interval_grows_while_results_are_steady(policy):
+    intervals = [run_test(policy, 50.0) for _ in range(6)]
+    assert intervals[:2] == [600, 600]   # variation not trusted yet
+    assert intervals[2:] == [900, 1350, 2025, 3038]
+
+
+def test_interval_shrinks_while_results_vary(policy):
+    intervals = [run_test(policy, download) for download in (50.0, 5.0, 80.0, 2.0, 90.0)]
+    assert intervals[-1] < 600
+    assert min(intervals) >= 60
+
+
+def test_movement_resets_to_the_minimum(policy):
+    gps = policy.gps_reader = FakeGPS()
+    assert run_test(policy, 50.0) == 600
+    gps.position = (51.51, -0.12)   # about 1.1 km north
+    assert run_test(policy, 50.0) == 60
+
+
+def test_skipped_cycles_do_not_count_or_adapt(policy):
+    for _ in range(4):
+        run_test(policy, 50.0)
+    interval = policy.interval
+    for _ in range(5):
+        assert policy() == interval
+    assert policy.tests_today == 4
+
+
+def seconds_until_utc_midnight():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1),
+                                         datetime.time(), tzinfo=datetime.timezone.utc)
+    return (midnight - now).total_seconds()
+
+
+def test_spent_budget_waits_for_the_next_day(policy):
+    policy.daily_budget = 2
+    run_test(policy, 50.0)
+    assert run_test(policy, 50.0) >= seconds_until_utc_midnight()
+    # The stretched interval is not carried into tomorrow.
+    assert policy.interval <= policy.max_interval
+
+
+def test_test_count_survives_a_restart(policy):
+    run_test(policy, 50.0)
+    run_test(policy, 50.0)
+    with open(policy.state_path) as f:
+        assert json.load(f)['tests'] == 2
+    assert AdaptiveInterval(state_path=policy.state_path).tests_today == 2
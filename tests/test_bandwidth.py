@@ -0,0 +1,135 @@
+# tests/test_bandwidth.py
+import os
+import json
+import time
+import threading
+
+import pytest
+
+from bob.bandwidth import BandwidthCoordinator, TokenBucket
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    """Unlimited coordinator without quiet windows; tests set the ones they need."""
+    return BandwidthCoordinator(rate_limit=0, burst=1024, quiet_before=0, quiet_after=0,
+                                max_wait=5, state_file=str(tmp_path / 'bandwidth.json'))
+
+
+def test_token_bucket_enforces_the_rate():
+    bucket = TokenBucket(rate=100000, burst=10000)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.consume(10000)
+    # The first 10000 bytes come from the burst; the rest take 0.4s at 100kB/s.
+    assert 0.35 <= time.monotonic() - start < 1.0
+
+
+def test_unlimited_bucket_never_sleeps():
+    bucket = TokenBucket(rate=0, burst=1)
+    start = time.monotonic()
+    bucket.consume(10 ** 9)
+    assert time.monotonic() - start < 0.05
+
+
+def test_measurement_holds_new_transfers(coordinator):
+    coordinator.quiet_after = 0.3
+    started = []
+
+    def background():
+        with coordinator.transfer():
+            started.append(time.monotonic())
+
+    with coordinator.measurement() as m:
+        thread = threading.Thread(target=background)
+        thread.start()
+        time.sleep(0.2)
+        assert not started
+        ended = time.monotonic()
+    thread.join(2)
+    assert started and started[0] - ended >= 0.25
+    assert not m.overlap
+
+
+def test_measurement_waits_for_running_transfers(coordinator):
+    release = threading.Event()
+
+    def background():
+        with coordinator.transfer():
+            release.wait(2)
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    time.sleep(0.05)
+    threading.Timer(0.3, release.set).start()
+    with coordinator.measurement() as m:
+        pass
+    thread.join(2)
+    assert m.waited >= 0.25
+    assert not m.overlap
+
+
+def test_overlap_is_flagged_after_max_wait(coordinator):
+    coordinator.max_wait = 0.1
+    release = threading.Event()
+    holding = threading.Event()
+
+    def background():
+        with coordinator.transfer():
+            holding.set()
+            release.wait(2)
+            coordinator.throttle(500)
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    holding.wait(1)
+    with coordinator.measurement() as m:
+        release.set()
+        thread.join(2)
+    assert m.overlap
+    assert m.overlap_bytes == 500
+
+
+def test_state_is_published_for_other_processes(coordinator):
+    coordinator.quiet_after = 30
+    with coordinator.measurement():
+        with open(coordinator.state_file) as f:
+            state = json.load(f)
+        assert state['pid'] == os.getpid() and state['measuring']
+    with open(coordinator.state_file) as f:
+        state = json.load(f)
+    assert not state['measuring']
+    assert state['quiet_until'] - time.time() > 25
+    # The publishing process does not hold itself back through the file.
+    assert coordinator._held_elsewhere() == 0
+
+
+def write_state(path, **state):
+    with open(path, 'w') as f:
+        json.dump(dict({'since': time.time(), 'quiet_until': 0}, **state), f)
+
+
+def test_transfer_waits_for_another_process(coordinator):
+    write_state(coordinator.state_file, pid=os.getppid(), measuring=True)
+    assert coordinator._held_elsewhere() > 0
+    write_state(coordinator.state_file, pid=os.getppid(), measuring=False,
+                quiet_until=time.time() + 0.3)
+    start = time.monotonic()
+    with coordinator.transfer():
+        pass
+    assert time.monotonic() - start >= 0.25
+
+
+def test_dead_or_stale_state_is_ignored(coordinator):
+    dead = os.fork()
+    if not dead:
+        os._exit(0)
+    os.waitpid(dead, 0)
+    write_state(coordinator.state_file, pid=dead, measuring=True)
+    assert coordinator._held_elsewhere() == 0
+    write_state(coordinator.state_file, pid=os.getppid(), measuring=True,
+                since=time.time() - 7200)
+    assert coordinator._held_elsewhere() == 0
+    with open(coordinator.state_file, 'w') as f:
+        f.write('{truncated')
+    assert coordinator._held_elsewhere() == 0
@@ -0,0 +1,75 @@
+# tests/test_compression.py
+import io
+import os
+import gzip
+
+import pytest
+
+from bob import compression
+from bob.compression import CompressingReader, resolve_codec
+
+DATA = b'timestamp,download,upload\n' + b''.join(
+    b'2024-03-01 12:%02d:00,%d.5,%d.25\n' % (i % 60, i, i // 2) for i in range(5000))
+
+
+def read_all(reader, size=4096):
+    chunks = []
+    while True:
+        chunk = reader.read(size)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+def test_gzip_stream_round_trips_and_shrinks():
+    reader = CompressingReader(io.BytesIO(DATA), 'gzip', chunk_size=1000)
+    compressed = read_all(reader)
+    assert gzip.decompress(compressed) == DATA
+    stats = reader.stats()
+    assert stats['bytes_in'] == len(DATA)
+    assert stats['bytes_out'] == len(compressed)
+    assert stats['ratio'] < 0.5
+
+
+def test_output_is_deterministic():
+    first = read_all(CompressingReader(io.BytesIO(DATA), 'gzip'))
+    second = read_all(CompressingReader(io.BytesIO(DATA), 'gzip'))
+    assert first == second
+
+
+@pytest.mark.parametrize('codec', ['none', 'gzip'])
+def test_skip_resumes_the_same_stream(codec):
+    whole = read_all(CompressingReader(io.BytesIO(DATA), codec))
+    offset = len(whole) // 3
+    reader = CompressingReader(io.BytesIO(DATA), codec, chunk_size=777)
+    assert reader.skip(offset) == offset
+    assert read_all(reader) == whole[offset:]
+
+
+def test_skip_past_the_end():
+    reader = CompressingReader(io.BytesIO(b'abc'), 'none')
+    assert reader.skip(10) == 3
+    assert reader.exhausted()
+
+
+def test_exhausted_does_not_lose_data():
+    reader = CompressingReader(io.BytesIO(DATA), 'gzip')
+    assert not reader.exhausted()
+    assert gzip.decompress(read_all(reader)) == DATA
+    assert reader.exhausted()
+
+
+def test_resolve_codec(monkeypatch):
+    assert resolve_codec('gzip') == 'gzip'
+    assert resolve_codec('none') == 'none'
+    with pytest.raises(ValueError):
+        resolve_codec('bz2')
+    monkeypatch.setattr(compression, 'zstandard', None)
+    assert resolve_codec('zstd') == 'gzip'
+
+
+def test_zstd_round_trip():
+    zstandard = pytest.importorskip('zstandard')
+    raw = os.urandom(1000) + DATA
+    compressed = read_all(CompressingReader(io.BytesIO(raw), 'zstd'))
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(compressed) == raw
@@ -0,0 +1,111 @@
+# tests/test_data_cap.py
+import datetime
+
+import pytest
+
+pytest.importorskip('psutil')
+
+from bob.data_cap import DataAccountant, OTHER, _billing_start  # noqa: E402
+
+MB = 1024 * 1024
+
+
+class CountingAccountant(DataAccountant):
+    """DataAccountant reading scripted interface counters instead of psutil."""
+    def __init__(self, counters, **kwargs):
+        self.counters = counters
+        super().__init__(**kwargs)
+
+    def _read_counters(self):
+        return dict(self.counters)
+
+
+@pytest.fixture
+def accountant(tmp_path):
+    accountant = CountingAccountant({'wwan0': (1000, 5000)}, budget=100 * MB, reset_day=1,
+                                    interfaces=[], state_path=str(tmp_path / 'usage.json'))
+    accountant.thresholds = {'speedtest_upload': 0.5, 'raw_upload': 0.7, 'speedtest': 0.9}
+    return accountant
+
+
+def today(accountant):
+    return accountant.days.get(datetime.date.today().isoformat(), {})
+
+
+def test_traffic_is_booked_to_the_running_stage(accountant):
+    accountant.begin('upload')
+    accountant.counters['wwan0'] = (1000 + 300, 5000 + 100)
+    accountant.end('upload')
+    assert today(accountant) == {'upload': {'sent': 300, 'recv': 100}}
+
+
+def test_overlapping_stages_split_the_traffic(accountant):
+    accountant.begin('speedtest')
+    accountant.begin('upload')
+    accountant.counters['wwan0'] = (1000 + 301, 5000 + 1001)
+    accountant.end('upload')
+    usage = today(accountant)
+    assert usage['speedtest'] == {'sent': 151, 'recv': 501}
+    assert usage['upload'] == {'sent': 150, 'recv': 500}
+
+
+def test_traffic_between_stages_goes_to_other(accountant):
+    accountant.counters['wwan0'] = (1500, 5500)
+    accountant.begin('gps')
+    accountant.end('gps')
+    assert today(accountant) == {OTHER: {'sent': 500, 'recv': 500}}
+
+
+def test_new_interface_starts_from_its_first_reading(accountant):
+    accountant.begin('upload')
+    accountant.counters['wlan0'] = (80 * MB, 90 * MB)   # traffic since boot
+    accountant.end('upload')
+    assert today(accountant) == {}
+    accountant.begin('upload')
+    accountant.counters['wlan0'] = (80 * MB + 10, 90 * MB + 20)
+    accountant.end('upload')
+    assert today(accountant) == {'upload': {'sent': 10, 'recv': 20}}
+
+
+def test_reset_counters_count_from_zero(accountant):
+    accountant.counters['wwan0'] = (40, 60)   # modem replugged
+    accountant.begin('upload')
+    accountant.end('upload')
+    assert today(accountant) == {OTHER: {'sent': 40, 'recv': 60}}
+
+
+def test_work_is_shed_as_the_budget_is_used(accountant):
+    def use(mb):
+        sent, recv = accountant.counters['wwan0']
+        accountant.counters['wwan0'] = (sent, recv + mb * MB)
+
+    assert accountant.allows('speedtest_upload')
+    use(60)
+    assert not accountant.allows('speedtest_upload')
+    assert accountant.allows('raw_upload')
+    use(20)
+    assert not accountant.allows('raw_upload')
+    assert accountant.allows('speedtest')
+    use(15)
+    assert not accountant.allows('speedtest')
+    assert accountant.used_fraction() == pytest.approx(0.95, abs=0.01)
+
+
+def test_usage_survives_a_restart(accountant):
+    accountant.begin('upload')
+    accountant.counters['wwan0'] = (1300, 5100)
+    accountant.end('upload')
+    accountant.persist()
+    reloaded = CountingAccountant({'wwan0': (1300, 5100)}, budget=100 * MB, reset_day=1,
+                                  interfaces=[], state_path=accountant.state_path)
+    assert reloaded.period_usage() == {'upload': 400}
+
+
+@pytest.mark.parametrize('day, reset_day, start', [
+    (datetime.date(2024, 3, 15), 1, datetime.date(2024, 3, 1)),
+    (datetime.date(2024, 3, 15), 20, datetime.date(2024, 2, 20)),
+    (datetime.date(2024, 1, 5), 10, datetime.date(2023, 12, 10)),
+    (datetime.date(2024, 3, 20), 20, datetime.date(2024, 3, 20)),
+])
+def test_billing_start(day, reset_day, start):
+    assert _billing_start(day, reset_day) == start
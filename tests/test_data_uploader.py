@@ -0,0 +1,170 @@
+# tests/test_data_uploader.py
+import errno
+import ftplib
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip('requests')
+
+from bob import data_uploader  # noqa: E402
+from bob.data_uploader import drain_spool  # noqa: E402
+from bob.spool import UploadSpool, PRIORITY_CONTROL, PRIORITY_DATA  # noqa: E402
+
+
+class FakeClient:
+    """Leased connection that records uploads in the shared server dict."""
+    def __init__(self, server):
+        self.server = server
+
+    def change_directory(self, directory):
+        self.directory = directory
+
+    def upload_file(self, local_filepath, remote_filename, resume=False, codec='none',
+                    level=None):
+        error = self.server.errors.get(remote_filename)
+        if error is not None:
+            raise error
+        with open(local_filepath, 'rb') as f:
+            data = f.read()
+        with self.server.lock:
+            self.server.files[f"{self.directory}/{remote_filename}"] = data
+            self.server.resumed[remote_filename] = resume
+        time.sleep(self.server.delay)
+        return {'bytes_sent': len(data)}
+
+
+class FakePool:
+    def __init__(self):
+        self.files = {}
+        self.resumed = {}
+        self.errors = {}
+        self.delay = 0.0
+        self.leases = 0
+        self.lock = threading.Lock()
+
+    def ensure_capacity(self, size):
+        pass
+
+    @contextmanager
+    def lease(self):
+        with self.lock:
+            self.leases += 1
+        yield FakeClient(self)
+
+
+class FakeConnectivity:
+    def __init__(self):
+        self.reports = []
+
+    def report(self, online, via=None):
+        self.reports.append(online)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakePool()
+    monkeypatch.setattr(data_uploader, 'ftp_pool', server)
+    monkeypatch.setattr(data_uploader, 'connectivity', FakeConnectivity())
+    monkeypatch.setattr(data_uploader, '_link_failed', False)
+    return server
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = UploadSpool(str(tmp_path / 'spool.db'), backoff_base=60, backoff_max=600)
+    yield spool
+    spool.close()
+
+
+@pytest.fixture
+def files(tmp_path, spool):
+    """Six spooled data files, a.csv to f.csv."""
+    paths = {}
+    for name in 'abcdef':
+        path = tmp_path / f'{name}.csv'
+        path.write_text(f'{name}-data')
+        spool.enqueue(str(path), '/up')
+        paths[f'{name}.csv'] = path
+    return paths
+
+
+def test_files_are_deleted_once_uploaded(server, spool, files, tmp_path):
+    notice = tmp_path / 'activate-1.txt'
+    notice.write_text('BOB SAYS DEACTIVATE!!!')
+    spool.enqueue(str(notice), '/activate', priority=PRIORITY_CONTROL, delete_after=False,
+                  resume=False)
+    assert drain_spool(spool, workers=3) == 7
+    assert server.files['/up/a.csv'] == b'a-data'
+    assert server.files['/activate/activate-1.txt'] == b'BOB SAYS DEACTIVATE!!!'
+    assert not any(path.exists() for path in files.values())
+    assert notice.exists()
+    assert spool.pending_count() == 0
+    assert data_uploader.connectivity.reports == [True]
+
+
+def test_resume_follows_the_spool_item(server, spool, files, tmp_path, monkeypatch):
+    monkeypatch.setattr(data_uploader, 'FTP_RESUME_UPLOADS', True)
+    notice = tmp_path / 'activate-1.txt'
+    notice.write_text('activated')
+    spool.enqueue(str(notice), '/activate', priority=PRIORITY_CONTROL, resume=False)
+    drain_spool(spool, workers=2)
+    assert server.resumed['activate-1.txt'] is False
+    assert server.resumed['a.csv'] is True
+
+
+def test_failed_items_back_off_and_keep_their_files(server, spool, files):
+    server.errors['c.csv'] = ftplib.error_perm('553 Could not create file')
+    assert drain_spool(spool, workers=2) == 5
+    assert files['c.csv'].exists()
+    item, = spool.due(now=time.time() + 3600)
+    assert (item.remote_name, item.attempts) == ('c.csv', 1)
+    assert item.next_attempt > time.time() + 30
+    assert spool.due() == []
+    assert data_uploader.connectivity.reports == [True]
+
+
+def test_local_file_errors_are_per_item(server, spool, files):
+    server.errors['b.csv'] = PermissionError(errno.EACCES, 'Permission denied')
+    assert drain_spool(spool, workers=2) == 5
+    assert not data_uploader._link_failed
+
+
+def test_link_error_stops_every_worker(server, spool, files):
+    server.delay = 0.05
+    server.errors['b.csv'] = OSError(errno.ENETUNREACH, 'Network is unreachable')
+    uploaded = drain_spool(spool, workers=2)
+    # The other worker finishes the file it was sending and takes no more.
+    assert uploaded <= 2
+    assert spool.pending_count() == 6 - uploaded
+    assert data_uploader._link_failed
+    assert data_uploader.connectivity.reports[-1] is False
+
+    # The next drain that gets a connection makes the whole backlog due again.
+    del server.errors['b.csv']
+    assert drain_spool(spool, workers=2) == 6 - uploaded
+    assert not data_uploader._link_failed
+    assert spool.pending_count() == 0
+
+
+def test_max_priority_leaves_bulk_data_spooled(server, spool, files, tmp_path):
+    notice = tmp_path / 'extinct-1.txt'
+    notice.write_text('EXTINCT!')
+    spool.enqueue(str(notice), '/up', priority=PRIORITY_CONTROL, delete_after=False)
+    assert drain_spool(spool, workers=2, max_priority=PRIORITY_CONTROL) == 1
+    assert list(server.files) == ['/up/extinct-1.txt']
+    assert all(item.priority == PRIORITY_DATA for item in spool.due())
+    assert spool.pending_count() == 6
+
+
+def test_backlog_is_due_again_when_the_link_comes_back(spool, files, monkeypatch):
+    monkeypatch.setattr(data_uploader, 'upload_spool', spool)
+    for item in spool.due():
+        spool.mark_failed(item, 'Network is unreachable')
+    assert spool.due() == []
+    data_uploader._on_link_change(False)
+    assert spool.due() == []
+    data_uploader._on_link_change(True)
+    assert len(spool.due()) == 6
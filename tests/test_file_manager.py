@@ -0,0 +1,158 @@
+# tests/test_file_manager.py
+import os
+import csv
+import time
+import datetime
+
+import pytest
+
+from bob.file_manager import FileManager
+from bob.record_log import RecordSchema, RecordLogReader
+
+HEADERS = {'speed': ['timestamp', 'download (Mbps)']}
+SCHEMAS = {'speed': RecordSchema([("timestamp", 'd', 'timestamp'),
+                                  ("download (Mbps)", 'f', '.2f')])}
+
+
+@pytest.fixture
+def file_paths(tmp_path):
+    return {'speed': str(tmp_path / 'speed.csv')}
+
+
+@pytest.fixture
+def manager(file_paths):
+    """CSV manager committing every row; tests change the policy and limits as needed."""
+    manager = FileManager(file_paths, HEADERS, backend='csv', policy='row', fsync=False,
+                          segment_max_age=3600, segment_max_bytes=1 << 20)
+    manager.initialize_files()
+    yield manager
+    manager.close_all()
+
+
+def row(i):
+    return [f"2024-03-01 12:{i:02d}:00", f"{i}.5"]
+
+
+def read_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def sealed(tmp_path, extension='.csv'):
+    """Sealed segments in the order they were sealed (speed-{stamp}[-{counter}]{ext})."""
+    def order(path):
+        stamp, _, counter = path.stem[len('speed-'):].partition('-')
+        return stamp, int(counter or 0)
+    return [str(p) for p in sorted(tmp_path.glob(f'speed-*{extension}'), key=order)]
+
+
+def test_row_policy_commits_immediately(manager):
+    manager.write_row('speed', row(1))
+    assert read_csv(manager.live_paths['speed']) == [HEADERS['speed'], row(1)]
+
+
+def test_count_policy_buffers_rows(manager):
+    manager.policy, manager.every_rows = 'count', 3
+    live = manager.live_paths['speed']
+    manager.write_row('speed', row(1))
+    manager.write_row('speed', row(2))
+    assert read_csv(live) == [HEADERS['speed']]
+    manager.write_row('speed', row(3))
+    assert len(read_csv(live)) == 4
+
+
+def test_interval_policy_commits_in_the_background(file_paths):
+    manager = FileManager(file_paths, HEADERS, backend='csv', policy='interval', interval=0.1,
+                          fsync=False)
+    manager.initialize_files()
+    manager.write_row('speed', row(1))
+    time.sleep(0.3)
+    assert read_csv(manager.live_paths['speed'])[-1] == row(1)
+    manager.close_all()
+
+
+def test_shutdown_policy_writes_on_close(manager, tmp_path):
+    manager.policy = 'shutdown'
+    for i in range(5):
+        manager.write_row('speed', row(i))
+    assert read_csv(manager.live_paths['speed']) == [HEADERS['speed']]
+    manager.close_all()
+    [path] = sealed(tmp_path)
+    assert read_csv(path)[1:] == [row(i) for i in range(5)]
+    assert not os.path.exists(manager.live_paths['speed'])
+
+
+def test_unknown_file_id_is_rejected(manager):
+    assert not manager.write_row('gps', row(1))
+
+
+def test_invalid_configuration(file_paths):
+    with pytest.raises(ValueError):
+        FileManager(file_paths, HEADERS, backend='csv', policy='sometimes')
+    with pytest.raises(ValueError):
+        FileManager(file_paths, HEADERS, backend='parquet')
+    with pytest.raises(ValueError):
+        FileManager(file_paths, HEADERS, backend='binary')
+
+
+def test_segment_sealed_by_size(manager, tmp_path):
+    manager.segment_max_bytes = 100
+    for i in range(10):
+        manager.write_row('speed', row(i))
+    manager.close_all()
+    segments = sealed(tmp_path)
+    assert len(segments) > 1
+    rows = []
+    for path in segments:
+        content = read_csv(path)
+        assert content[0] == HEADERS['speed']
+        rows += content[1:]
+    assert rows == [row(i) for i in range(10)]
+
+
+def test_seal_due_rotates_by_age(manager, tmp_path):
+    manager.segment_max_age = 0.1
+    manager.seal_due()
+    assert not sealed(tmp_path)
+    manager.write_row('speed', row(1))
+    time.sleep(0.15)
+    manager.seal_due()
+    assert len(sealed(tmp_path)) == 1
+    # A fresh live segment is open for the next rows.
+    manager.write_row('speed', row(2))
+    assert read_csv(manager.live_paths['speed']) == [HEADERS['speed'], row(2)]
+
+
+def test_seal_all_skips_empty_segments(manager, tmp_path):
+    manager.seal_all()
+    assert not sealed(tmp_path)
+    manager.write_row('speed', row(1))
+    manager.seal_all()
+    manager.seal_all()
+    assert len(sealed(tmp_path)) == 1
+    manager.close_all()
+    assert len(sealed(tmp_path)) == 1
+
+
+def test_live_file_left_by_a_crash_is_sealed(file_paths, tmp_path):
+    crashed = FileManager(file_paths, HEADERS, backend='csv', policy='row', fsync=False)
+    crashed.initialize_files()
+    crashed.write_row('speed', row(1))
+    # No close_all(): the process died with the live file still open.
+    restarted = FileManager(file_paths, HEADERS, backend='csv', policy='row', fsync=False)
+    restarted.initialize_files()
+    [path] = sealed(tmp_path)
+    assert read_csv(path) == [HEADERS['speed'], row(1)]
+    restarted.close_all()
+
+
+def test_binary_backend_writes_record_logs(file_paths, tmp_path):
+    manager = FileManager(file_paths, HEADERS, SCHEMAS, backend='binary', policy='row',
+                          fsync=False)
+    manager.initialize_files()
+    when = datetime.datetime(2024, 3, 1, 12, 0, 0)
+    manager.write_row('speed', [when, 12.5])
+    manager.close_all()
+    [path] = sealed(tmp_path, '.rec')
+    with RecordLogReader(path) as reader:
+        assert [list(r) for r in reader] == [[when.timestamp(), 12.5]]
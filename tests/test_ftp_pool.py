@@ -0,0 +1,135 @@
+# tests/test_ftp_pool.py
+import errno
+import time
+import threading
+
+import pytest
+
+from bob.ftp_client import FTPConnectionPool
+
+
+class FakeClient:
+    """Stands in for a logged-in FTPClient."""
+    def __init__(self):
+        self.last_activity = self.last_released = time.monotonic()
+        self.noop_error = None
+        self.closed = False
+
+    def noop(self):
+        if self.noop_error is not None:
+            raise self.noop_error
+        self.last_activity = time.monotonic()
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool():
+    pool = FTPConnectionPool(max_size=2, keepalive_interval=60, idle_timeout=600)
+    pool.opened = []
+
+    def connect():
+        client = FakeClient()
+        pool.opened.append(client)
+        return client
+
+    pool._connect = connect
+    yield pool
+    pool.close_all()
+
+
+def test_link_errors_discard_the_connection(pool):
+    with pytest.raises(OSError):
+        with pool.lease():
+            raise OSError(errno.ENETUNREACH, 'Network is unreachable')
+    assert pool.opened[0].closed
+    assert pool._open == 0
+    with pool.lease() as client:
+        assert client is pool.opened[1]
+
+
+def test_local_file_errors_keep_the_connection(pool):
+    with pytest.raises(FileNotFoundError):
+        with pool.lease():
+            open('/nonexistent/speed.csv', 'rb')
+    with pool.lease() as client:
+        assert client is pool.opened[0]
+    assert not client.closed
+
+
+def test_connection_is_reused(pool):
+    with pool.lease() as first:
+        pass
+    with pool.lease() as second:
+        pass
+    assert first is second
+    assert len(pool.opened) == 1
+
+
+def test_dead_connection_is_evicted_after_a_failed_noop(pool):
+    with pool.lease() as client:
+        pass
+    # Idle past the keepalive interval, so the pool checks it before reuse.
+    client.last_activity -= 120
+    client.noop_error = EOFError()
+    with pool.lease() as replacement:
+        assert replacement is not client
+    assert client.closed
+    assert len(pool.opened) == 2
+    assert pool._open == 1
+
+
+def test_recently_used_connection_is_not_probed(pool):
+    with pool.lease() as client:
+        pass
+    client.noop_error = EOFError()
+    with pool.lease() as again:
+        assert again is client
+
+
+def test_pool_size_limits_open_connections(pool):
+    leased = threading.Semaphore(0)
+    release = threading.Event()
+
+    def hold():
+        with pool.lease():
+            leased.release()
+            release.wait(5)
+
+    holders = [threading.Thread(target=hold) for _ in range(2)]
+    for thread in holders:
+        thread.start()
+    for _ in holders:
+        assert leased.acquire(timeout=1)
+    waiter = threading.Thread(target=hold)
+    waiter.start()
+    time.sleep(0.1)
+    assert len(pool.opened) == 2
+    assert waiter.is_alive()
+    release.set()
+    for thread in holders + [waiter]:
+        thread.join(2)
+    assert leased.acquire(timeout=1)
+    # The waiter got a connection one of the holders returned.
+    assert len(pool.opened) == 2
+
+    pool.ensure_capacity(3)
+    assert pool.max_size == 3
+
+
+def test_failed_connect_frees_the_slot(pool):
+    connect = pool._connect
+
+    def refuse():
+        raise ConnectionRefusedError(errno.ECONNREFUSED, 'Connection refused')
+
+    pool._connect = refuse
+    for _ in range(3):
+        with pytest.raises(ConnectionRefusedError):
+            with pool.lease():
+                pass
+    assert pool._open == 0
+    pool._connect = connect
+    with pool.lease():
+        pass
@@ -0,0 +1,77 @@
+# tests/test_geojoin.py
+import bisect
+import datetime
+import collections
+
+import pytest
+
+from bob.geojoin import geotag
+
+UTC = datetime.timezone.utc
+T0 = datetime.datetime(2024, 3, 1, 12, 0, 0, tzinfo=UTC)
+
+Fix = collections.namedtuple('Fix', ['timestamp', 'latitude', 'longitude'])
+
+
+class FixBuffer:
+    """Time-ordered fixes with the bracket()/between() lookups of GPSReader."""
+    def __init__(self, fixes):
+        self.fixes = fixes
+        self.times = [fix.timestamp.timestamp() for fix in fixes]
+
+    def bracket(self, when):
+        i = bisect.bisect_right(self.times, when)
+        before = self.fixes[i - 1] if i else None
+        after = self.fixes[i] if i < len(self.fixes) else None
+        return before, after
+
+    def between(self, start, end):
+        return self.fixes[bisect.bisect_left(self.times, start):
+                          bisect.bisect_right(self.times, end)]
+
+
+def at(seconds):
+    return T0 + datetime.timedelta(seconds=seconds)
+
+
+# Heading north at about 11 m/s: 0.0001 degrees of latitude per second.
+TRACK = FixBuffer([Fix(at(s), 51.0 + s * 0.0001, -1.0) for s in range(0, 61, 10)])
+
+
+def test_nearest_uses_the_closest_fix():
+    tag = geotag(TRACK, at(12), at(24), method='nearest', max_error=30)
+    assert tag.latitude == pytest.approx(51.002)
+    assert tag.error == pytest.approx(2)
+
+
+def test_interpolate_between_the_surrounding_fixes():
+    tag = geotag(TRACK, at(12), at(24), method='interpolate', max_error=30)
+    assert tag.latitude == pytest.approx(51.0018)
+    assert tag.longitude == pytest.approx(-1.0)
+    assert tag.error == pytest.approx(8)
+
+
+def test_distance_moved_during_the_test():
+    tag = geotag(TRACK, at(5), at(45), method='nearest', max_error=30)
+    # Fixes at 10..40s cover 0.003 degrees of latitude, about 333 m.
+    assert tag.moved == pytest.approx(333.6, rel=0.01)
+
+
+def test_fix_too_far_away_is_rejected():
+    assert geotag(TRACK, at(100), at(120), method='nearest', max_error=30) is None
+    assert geotag(TRACK, at(100), at(120), method='nearest', max_error=60) is not None
+
+
+def test_interpolate_falls_back_to_nearest_at_the_end_of_the_track():
+    tag = geotag(TRACK, at(62), at(64), method='interpolate', max_error=30)
+    assert tag.latitude == pytest.approx(51.006)
+    assert tag.error == pytest.approx(3)
+
+
+def test_no_fixes():
+    assert geotag(FixBuffer([]), at(0), at(10), method='interpolate', max_error=30) is None
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        geotag(TRACK, at(0), at(10), method='closest')
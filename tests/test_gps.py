@@ -0,0 +1,114 @@
+# tests/test_gps.py
+import datetime
+
+import pytest
+
+pytest.importorskip('serial')
+
+from bob.gps import GPSFix, GPSReader, NMEAParser, split_sentence  # noqa: E402
+
+UTC = datetime.timezone.utc
+
+
+def sentence(body):
+    """Frame an NMEA body with its checksum."""
+    checksum = 0
+    for byte in body.encode('ascii'):
+        checksum ^= byte
+    return f"${body}*{checksum:02X}\r\n".encode('ascii')
+
+
+def gga(time_of_day, latitude='4807.038', longitude='01131.000'):
+    return sentence(f"GPGGA,{time_of_day},{latitude},N,{longitude},E,1,08,0.9,545.4,M,46.9,M,,")
+
+
+def rmc(time_of_day, date):
+    return sentence(f"GPRMC,{time_of_day},A,4807.038,N,01131.000,E,022.4,084.4,{date},003.1,W")
+
+
+def test_checksum_accepts_valid_sentence():
+    line = sentence("GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1")
+    fields = split_sentence(line)
+    assert fields[0] == b'GPGSA'
+    assert fields[-1] == b'2.1'
+    # Lower-case checksum digits are accepted too.
+    line = gga('120002').strip()
+    assert line.endswith(b'*4B')
+    assert split_sentence(line[:-2] + line[-2:].lower()) is not None
+
+
+@pytest.mark.parametrize('line', [
+    b'$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*00',
+    b'$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,',
+    b'GPGGA,123519*47',
+    b'$GPGGA,123519*4',
+    b'$GPGGA,123519*ZZ',
+])
+def test_checksum_rejects_invalid_sentence(line):
+    assert split_sentence(line) is None
+
+
+def test_corrupted_sentence_is_counted_and_ignored():
+    parser = NMEAParser()
+    line = bytearray(gga('123519'))
+    line[10] ^= 0x01
+    assert parser.feed(bytes(line)) is None
+    assert parser.bad_checksums == 1
+
+
+def test_gga_uses_date_from_rmc():
+    parser = NMEAParser()
+    assert parser.feed(rmc('123519', '230324')) is not None
+    fix = parser.feed(gga('123520'))
+    assert fix.timestamp == datetime.datetime(2024, 3, 23, 12, 35, 20, tzinfo=UTC)
+    assert fix.latitude == pytest.approx(48 + 7.038 / 60)
+    assert fix.longitude == pytest.approx(11 + 31 / 60)
+    assert (fix.quality, fix.satellites, fix.hdop, fix.altitude) == (1, 8, 0.9, 545.4)
+    assert fix.speed == pytest.approx(22.4 * 1.852)
+    assert fix.course == 84.4
+
+
+def test_southern_and_western_hemispheres_are_negative():
+    parser = NMEAParser()
+    parser.feed(rmc('120000', '010324'))
+    fix = parser.feed(sentence("GPGGA,120001,3351.407,S,15112.918,W,1,05,1.2,10.0,M,,M,,"))
+    assert fix.latitude < 0 and fix.longitude < 0
+
+
+def test_fix_after_midnight_rolls_the_date_forward():
+    parser = NMEAParser()
+    parser.feed(rmc('235959.50', '290224'))
+    fix = parser.feed(gga('000000.50'))
+    assert fix.timestamp == datetime.datetime(2024, 3, 1, 0, 0, 0, 500000, tzinfo=UTC)
+
+
+def test_late_fix_before_midnight_keeps_the_previous_date():
+    parser = NMEAParser()
+    parser.feed(rmc('000001', '010324'))
+    fix = parser.feed(gga('235959'))
+    assert fix.timestamp == datetime.datetime(2024, 2, 29, 23, 59, 59, tzinfo=UTC)
+
+
+def test_rmc_supplies_the_fix_without_gga():
+    parser = NMEAParser()
+    fix = parser.feed(rmc('081836', '130998'))
+    assert fix.timestamp == datetime.datetime(2098, 9, 13, 8, 18, 36, tzinfo=UTC)
+    assert fix.altitude is None
+
+
+def test_reader_merges_fixes_with_the_same_timestamp():
+    reader = GPSReader()
+    when = datetime.datetime(2024, 3, 1, 12, 0, 0, tzinfo=UTC)
+    reader.add(GPSFix(when, 48.1, 11.5, speed=40.0, course=84.4))
+    reader.add(GPSFix(when, 48.1, 11.5, quality=1, satellites=8, hdop=0.9, altitude=545.4))
+    assert reader.fixes == 1
+    assert reader.latest() == GPSFix(when, 48.1, 11.5, 1, 8, 0.9, 545.4, 40.0, 84.4)
+
+
+def test_reader_drops_out_of_order_fixes():
+    reader = GPSReader()
+    when = datetime.datetime(2024, 3, 1, 12, 0, 0, tzinfo=UTC)
+    reader.add(GPSFix(when, 48.1, 11.5))
+    reader.add(GPSFix(when - datetime.timedelta(seconds=1), 48.2, 11.6))
+    assert reader.fixes == 1
+    assert reader.latest().latitude == 48.1
@@ -0,0 +1,42 @@
+# tests/test_http_session.py
+import pytest
+
+pytest.importorskip('requests')
+
+from bob import http_session  # noqa: E402
+from bob.http_session import get_session, http_get, close_session, USER_AGENT  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    close_session()
+    yield
+    close_session()
+
+
+def test_session_is_shared():
+    session = get_session()
+    assert get_session() is session
+    assert session.headers['User-Agent'] == USER_AGENT
+
+
+def test_http_and_https_share_one_pooled_adapter():
+    session = get_session()
+    assert session.adapters['http://'] is session.adapters['https://']
+
+
+def test_close_session_starts_a_new_one():
+    session = get_session()
+    close_session()
+    assert get_session() is not session
+
+
+def test_http_get_goes_through_the_shared_session(monkeypatch):
+    calls = []
+    monkeypatch.setattr(get_session(), 'get',
+                        lambda url, **kwargs: calls.append((url, kwargs)) or 'response')
+    assert http_get('http://probe.test/', 2, allow_redirects=False) == 'response'
+    assert http_get('http://probe.test/', 3) == 'response'
+    assert calls == [('http://probe.test/', {'timeout': 2, 'allow_redirects': False}),
+                     ('http://probe.test/', {'timeout': 3})]
+    assert http_session._session is get_session()
@@ -0,0 +1,228 @@
+# tests/test_internet.py
+import time
+
+import pytest
+
+pytest.importorskip('requests')
+
+from bob import internet  # noqa: E402
+from bob.internet import ConnectivityMonitor  # noqa: E402
+
+PROBES = (('http', 'http://probe.test/generate_204'), ('tcp', ('192.0.2.1', 443)))
+
+
+class Probes:
+    """Stand-in for internet._probe; each kind succeeds, fails or hangs as set."""
+    def __init__(self):
+        self.outcome = {'http': 'fail', 'tcp': 'fail'}
+        self.calls = 0
+
+    def __call__(self, kind, target, timeout):
+        self.calls += 1
+        outcome = self.outcome[kind]
+        if outcome == 'hang':
+            time.sleep(timeout + 2)
+        if outcome != 'ok':
+            raise ConnectionError(f"{kind} probe failed")
+        return f"{kind} {target}"
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    probes = Probes()
+    monkeypatch.setattr(internet, '_probe', probes)
+    return probes
+
+
+@pytest.fixture
+def monitor(probes):
+    monitor = ConnectivityMonitor(PROBES, ttl=60, timeout=0.2)
+    monitor.changes = []
+    monitor.add_listener(monitor.changes.append)
+    return monitor
+
+
+def test_any_successful_probe_means_online(probes, monitor):
+    probes.outcome['tcp'] = 'ok'
+    assert monitor.check()
+    assert monitor.via.startswith('tcp')
+
+
+def test_listeners_see_the_link_go_down_and_come_back(probes, monitor):
+    assert not monitor.check()
+    # The first verdict is not a change.
+    assert monitor.changes == []
+    probes.outcome['http'] = 'ok'
+    assert monitor.check()
+    assert monitor.check()
+    probes.outcome['http'] = 'fail'
+    assert not monitor.check()
+    assert monitor.changes == [True, False]
+
+
+def test_verdict_is_cached_for_the_ttl(probes, monitor):
+    probes.outcome['http'] = 'ok'
+    assert monitor.is_online()
+    calls = probes.calls
+    probes.outcome['http'] = 'fail'
+    for _ in range(10):
+        assert monitor.is_online()
+    assert probes.calls == calls
+
+    monitor.ttl = 0.05
+    time.sleep(0.1)
+    assert not monitor.is_online()
+    assert monitor.changes == [False]
+
+
+def test_reports_from_other_stages_refresh_the_verdict(probes, monitor):
+    monitor.report(True, 'ftp upload')
+    assert monitor.is_online()
+    assert probes.calls == 0
+    monitor.report(False)
+    assert not monitor.is_online()
+    assert monitor.changes == [False]
+
+
+def test_failing_listener_does_not_break_the_others(probes, monitor):
+    monitor.report(True)
+    monitor._listeners.insert(0, lambda online: 1 / 0)
+    monitor.report(False)
+    assert monitor.changes == [False]
+
+
+def test_a_hung_probe_does_not_delay_a_successful_one(probes, monitor):
+    probes.outcome.update(http='hang', tcp='ok')
+    start = time.monotonic()
+    assert monitor.check()
+    assert time.monotonic() - start < 0.5
+
+
+def test_check_gives_up_after_the_timeout(probes, monitor):
+    probes.outcome.update(http='hang', tcp='hang')
+    start = time.monotonic()
+    assert not monitor.check()
+    # as_completed() allows the timeout plus one second.
+    assert time.monotonic() - start < 1.5
+
+
+def test_check_internet_retries(probes, monitor, monkeypatch):
+    monkeypatch.setattr(internet, 'connectivity', monitor)
+    attempts = []
+
+    def check():
+        attempts.append(time.monotonic())
+        return len(attempts) == 3
+
+    monkeypatch.setattr(monitor, 'check', check)
+    assert internet.check_internet(retries=3, backoff=0.01)
+    assert len(attempts) == 3
+    attempts.clear()
+    monkeypatch.setattr(monitor, 'check', lambda: attempts.append(0) and False)
+    assert not internet.check_internet(retries=2, backoff=0.01)
+    assert len(attempts) == 2
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def test_http_probe_requires_204(monkeypatch):
+    monkeypatch.setattr(internet, 'http_get', lambda url, timeout, **kwargs: Response(302))
+    with pytest.raises(ConnectionError):
+        internet._probe('http', 'http://probe.test/generate_204', 1)
+    monkeypatch.setattr(internet, 'http_get', lambda url, timeout, **kwargs: Response(204))
+    assert internet._probe('http', 'http://probe.test/generate_204', 1) == \
+        'http http://probe.test/generate_204'
+
+
+class Providers:
+    """Stand-in for internet._fetch_ip answering per provider URL."""
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def __call__(self, url, timeout):
+        self.calls.append(url)
+        answer = self.answers[url]
+        if isinstance(answer, Exception):
+            raise answer
+        if answer == 'hang':
+            time.sleep(timeout + 2)
+            raise TimeoutError(url)
+        return answer
+
+
+@pytest.fixture
+def providers(monkeypatch, monitor):
+    providers = Providers({'https://a.test': '198.51.100.7', 'https://b.test': '198.51.100.7'})
+    monkeypatch.setattr(internet, '_fetch_ip', providers)
+    monkeypatch.setattr(internet, 'connectivity', monitor)
+    return providers
+
+
+@pytest.fixture
+def resolver(providers):
+    resolver = internet.PublicIPResolver(list(providers.answers), ttl=60, timeout=0.2)
+    resolver.changes = []
+    resolver.add_listener(lambda old, new: resolver.changes.append((old, new)))
+    return resolver
+
+
+def test_listeners_see_the_first_address_and_changes(providers, resolver):
+    assert resolver.resolve() == '198.51.100.7'
+    assert resolver.resolve(force=True) == '198.51.100.7'
+    providers.answers.update({'https://a.test': '203.0.113.9', 'https://b.test': '203.0.113.9'})
+    assert resolver.resolve(force=True) == '203.0.113.9'
+    assert resolver.changes == [(None, '198.51.100.7'), ('198.51.100.7', '203.0.113.9')]
+
+
+def test_address_is_cached_for_the_ttl(providers, resolver):
+    resolver.resolve()
+    calls = len(providers.calls)
+    for _ in range(5):
+        assert resolver.resolve() == '198.51.100.7'
+    assert len(providers.calls) == calls
+    resolver.ttl = 0.05
+    time.sleep(0.1)
+    resolver.resolve()
+    assert len(providers.calls) > calls
+
+
+def test_failing_providers_fall_back_to_another(providers, resolver):
+    providers.answers['https://a.test'] = ValueError("'<html>' does not appear to be an IP")
+    assert resolver.resolve() == '198.51.100.7'
+    assert resolver.provider == 'https://b.test'
+    providers.answers['https://b.test'] = 'hang'
+    start = time.monotonic()
+    assert resolver.resolve(force=True) is None
+    assert time.monotonic() - start < 1.5
+    # A failed lookup keeps the last known address and raises no change event.
+    assert resolver.ip == '198.51.100.7'
+    assert resolver.changes == [(None, '198.51.100.7')]
+
+
+def test_successful_lookup_reports_the_link_up(providers, resolver, monitor):
+    monitor.report(False)
+    resolver.resolve()
+    assert monitor.online
+    assert monitor.via == 'public IP lookup'
+
+
+class TextResponse:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ConnectionError(self.status_code)
+
+
+def test_fetch_ip_accepts_only_an_address(monkeypatch):
+    monkeypatch.setattr(internet, 'http_get', lambda url, timeout: TextResponse(' 2001:db8::1\n'))
+    assert internet._fetch_ip('https://a.test', 1) == '2001:db8::1'
+    monkeypatch.setattr(internet, 'http_get', lambda url, timeout: TextResponse('<html>'))
+    with pytest.raises(ValueError):
+        internet._fetch_ip('https://a.test', 1)
@@ -0,0 +1,64 @@
+# tests/test_latency.py
+import math
+
+import pytest
+
+from bob.latency import RingBuffer, LatencyProber, _percentile, _checksum
+
+
+def test_ring_buffer_returns_new_samples_in_order():
+    buffer = RingBuffer(4)
+    for i in range(3):
+        buffer.append(float(i), 0, i * 10.0)
+    samples, overwritten, position = buffer.since(0)
+    assert samples == [(0.0, 0, 0.0), (1.0, 0, 10.0), (2.0, 0, 20.0)]
+    assert (overwritten, position) == (0, 3)
+    assert buffer.since(position) == ([], 0, 3)
+
+
+def test_ring_buffer_reports_overwritten_samples():
+    buffer = RingBuffer(4)
+    for i in range(10):
+        buffer.append(float(i), i % 2, float(i))
+    samples, overwritten, position = buffer.since(0)
+    assert [sample[0] for sample in samples] == [6.0, 7.0, 8.0, 9.0]
+    assert (overwritten, position) == (6, 10)
+
+
+def test_lost_probes_are_kept_as_nan():
+    buffer = RingBuffer(2)
+    buffer.append(1.0, 0, math.nan)
+    assert math.isnan(buffer.since(0)[0][0][2])
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert _percentile(values, 50) == 50
+    assert _percentile(values, 95) == 95
+    assert _percentile(values, 99) == 99
+    assert _percentile([7], 99) == 7
+
+
+def test_icmp_checksum():
+    header = bytes([8, 0, 0, 0, 0x12, 0x34, 0x00, 0x01]) + b'abc'
+    checksum = _checksum(header)
+    packet = header[:2] + checksum.to_bytes(2, 'big') + header[4:]
+    assert _checksum(packet) == 0
+
+
+def test_summary_per_target(tmp_path):
+    prober = LatencyProber([('a.example', 443), ('b.example', 443)], interval=10, timeout=1,
+                           capacity=100, icmp=False)
+    for when, target, rtt in [(1.0, 0, 10.0), (2.0, 0, 30.0), (3.0, 0, math.nan),
+                              (4.0, 0, 20.0), (1.0, 1, math.nan)]:
+        prober.buffer.append(when, target, rtt)
+    summary = prober.summarize()
+    a = summary['targets']['tcp:a.example:443']
+    assert (a['probes'], a['lost'], a['loss']) == (4, 1, 0.25)
+    assert (a['min'], a['max'], a['p50']) == (10.0, 30.0, 20.0)
+    assert a['jitter'] == pytest.approx(15.0)
+    b = summary['targets']['tcp:b.example:443']
+    assert (b['probes'], b['loss']) == (1, 1.0) and 'p50' not in b
+    # Samples are only summarized once.
+    assert prober.summarize() is None
+    assert prober.write_summary(str(tmp_path / 'session-latency')) is None
@@ -0,0 +1,98 @@
+# tests/test_record_log.py
+import csv
+import datetime
+
+import pytest
+
+from bob.record_log import RecordSchema, RecordLogWriter, RecordLogReader, export_csv
+
+SCHEMA = RecordSchema([
+    ("timestamp", 'd', 'timestamp'),
+    ("download (Mbps)", 'f', '.2f'),
+    ("flag", 'B', 'd'),
+])
+
+ROWS = [
+    [datetime.datetime(2024, 3, 1, 12, 0, 0), 12.5, 0],
+    [datetime.datetime(2024, 3, 1, 12, 5, 0), 48.25, 1],
+    [datetime.datetime(2024, 3, 1, 12, 10, 0), 0.0, 3],
+]
+
+
+def write(path, rows, schema=SCHEMA):
+    writer = RecordLogWriter(str(path), schema)
+    writer.write_rows(rows)
+    writer.close()
+    return writer
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'speed.rec'
+    assert write(path, ROWS).created
+
+    with RecordLogReader(str(path)) as reader:
+        assert reader.schema == SCHEMA
+        assert len(reader) == len(ROWS)
+        records = list(reader)
+        assert reader[-1] == records[-1]
+        with pytest.raises(IndexError):
+            reader[len(ROWS)]
+
+    for record, row in zip(records, ROWS):
+        assert record[0] == row[0].timestamp()
+        assert record[1] == pytest.approx(row[1])
+        assert record[2] == row[2]
+
+
+def test_empty_log(tmp_path):
+    path = tmp_path / 'empty.rec'
+    write(path, [])
+    with RecordLogReader(str(path)) as reader:
+        assert len(reader) == 0
+        assert list(reader) == []
+
+
+def test_reopen_appends_and_drops_torn_record(tmp_path):
+    path = tmp_path / 'speed.rec'
+    write(path, ROWS[:2])
+    with open(path, 'ab') as f:
+        f.write(b'\x01\x02\x03')  # half a record from a crash mid-write
+
+    writer = write(path, ROWS[2:])
+    assert not writer.created
+    with RecordLogReader(str(path)) as reader:
+        assert [record[2] for record in reader] == [0, 1, 3]
+
+
+def test_reader_ignores_partial_trailing_record(tmp_path):
+    path = tmp_path / 'speed.rec'
+    write(path, ROWS)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * (SCHEMA.record_size - 1))
+    with RecordLogReader(str(path)) as reader:
+        assert len(reader) == len(ROWS)
+
+
+def test_layout_mismatch_is_rejected(tmp_path):
+    path = tmp_path / 'speed.rec'
+    write(path, ROWS)
+    other = RecordSchema([("timestamp", 'd', 'timestamp'), ("ping (ms)", 'f', '.2f')])
+    with pytest.raises(ValueError):
+        RecordLogWriter(str(path), other)
+
+
+def test_not_a_record_log(tmp_path):
+    path = tmp_path / 'speed.rec'
+    path.write_bytes(b'timestamp,download\n' * 4)
+    with pytest.raises(ValueError):
+        RecordLogReader(str(path))
+
+
+def test_export_csv(tmp_path):
+    path = tmp_path / 'speed.rec'
+    write(path, ROWS)
+    with open(export_csv(str(path))) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == SCHEMA.names
+    assert rows[1] == ['2024-03-01 12:00:00', '12.50', '0']
+    assert rows[2] == ['2024-03-01 12:05:00', '48.25', '1']
@@ -0,0 +1,179 @@
+# tests/test_resumable_upload.py
+import gzip
+import ftplib
+import os
+
+import pytest
+
+from bob.ftp_client import FTPClient, UploadManifest
+
+
+class FakeFTP:
+    """In-memory stand-in for the FTP_TLS connection used by FTPClient."""
+    def __init__(self, supports_size=True, fail_after=None):
+        self.files = {}
+        self.supports_size = supports_size
+        self.fail_after = fail_after   # bytes accepted before the link drops
+        self.commands = []
+
+    def voidcmd(self, command):
+        return '200 OK'
+
+    def size(self, name):
+        if not self.supports_size:
+            raise ftplib.error_perm('502 Command not implemented')
+        if name not in self.files:
+            raise ftplib.error_perm('550 No such file')
+        return len(self.files[name])
+
+    def storbinary(self, command, fp, blocksize=8192, callback=None, rest=None):
+        verb, name = command.split(' ', 1)
+        self.commands.append((verb, rest))
+        existing = self.files.get(name, b'')
+        if verb == 'APPE':
+            data = bytearray(existing)
+        else:
+            data = bytearray(existing[:rest] if rest else b'')
+        received = 0
+        while True:
+            block = fp.read(blocksize)
+            if not block:
+                break
+            if self.fail_after is not None and received + len(block) > self.fail_after:
+                keep = self.fail_after - received
+                data += block[:keep]
+                self.files[name] = bytes(data)
+                self.fail_after = None
+                raise ConnectionResetError('connection reset by peer')
+            data += block
+            received += len(block)
+            if callback:
+                callback(block)
+        self.files[name] = bytes(data)
+        return '226 Transfer complete'
+
+
+def make_client(ftp):
+    client = FTPClient.__new__(FTPClient)
+    client.ftp = ftp
+    return client
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    path = tmp_path / 'speed.csv'
+    path.write_bytes(os.urandom(100000))
+    return str(path)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return UploadManifest(str(tmp_path / 'manifest.json'))
+
+
+def mtime(path):
+    return os.stat(path).st_mtime_ns
+
+
+def upload(client, local_file, manifest, **kwargs):
+    return client.upload_file_resumable(local_file, 'speed.csv', manifest=manifest,
+                                        checkpoint_bytes=8192, **kwargs)
+
+
+def test_resume_with_size_appends_the_missing_tail(local_file, manifest):
+    ftp = FakeFTP(fail_after=30000)
+    client = make_client(ftp)
+    with pytest.raises(ConnectionResetError):
+        upload(client, local_file, manifest)
+    assert len(ftp.files['speed.csv']) == 30000
+
+    stats = upload(client, local_file, manifest)
+    assert ftp.commands[-1] == ('APPE', None)
+    assert stats['bytes_sent'] == 70000
+    assert ftp.files['speed.csv'] == open(local_file, 'rb').read()
+    assert manifest.get('speed.csv', local_file, 100000, mtime(local_file)) == 0
+
+
+def test_resume_without_size_restarts_at_the_last_checkpoint(local_file, manifest):
+    ftp = FakeFTP(supports_size=False, fail_after=30000)
+    client = make_client(ftp)
+    with pytest.raises(ConnectionResetError):
+        upload(client, local_file, manifest)
+    offset = manifest.get('speed.csv', local_file, 100000, mtime(local_file))
+    # Checkpoints trail the bytes the server actually received.
+    assert 0 < offset <= 30000
+    assert offset % 8192 == 0
+
+    stats = upload(client, local_file, manifest)
+    assert ftp.commands[-1] == ('STOR', offset)
+    assert stats['bytes_sent'] == 100000 - offset
+    assert ftp.files['speed.csv'] == open(local_file, 'rb').read()
+
+
+def test_manifest_entry_for_a_different_file_is_ignored(local_file, manifest):
+    manifest.update('speed.csv', local_file, 12345, 1000, 8192)
+    assert manifest.get('speed.csv', local_file, 100000, 1000) == 0
+    assert manifest.get('speed.csv', 'other.csv', 12345, 1000) == 0
+    assert manifest.get('speed.csv', local_file, 12345, 2000) == 0
+    assert manifest.get('speed.csv', local_file, 12345, 1000) == 8192
+
+
+def test_complete_remote_file_is_not_sent_again(local_file, manifest):
+    ftp = FakeFTP()
+    ftp.files['speed.csv'] = open(local_file, 'rb').read()
+    # Interrupted after the last block arrived but before the manifest was cleared.
+    manifest.update('speed.csv', local_file, 100000, mtime(local_file), 98304)
+    stats = upload(make_client(ftp), local_file, manifest)
+    assert stats['bytes_sent'] == 0
+    assert ftp.commands == []
+
+
+def test_remote_file_with_the_same_name_is_replaced(local_file, manifest):
+    # Same name, different and shorter content, and no record of sending it.
+    ftp = FakeFTP()
+    ftp.files['speed.csv'] = b'activated'
+    stats = upload(make_client(ftp), local_file, manifest)
+    assert ftp.commands == [('STOR', None)]
+    assert stats['bytes_sent'] == 100000
+    assert ftp.files['speed.csv'] == open(local_file, 'rb').read()
+
+
+def test_local_file_changed_since_the_interrupted_upload(local_file, manifest):
+    ftp = FakeFTP(fail_after=30000)
+    client = make_client(ftp)
+    with pytest.raises(ConnectionResetError):
+        upload(client, local_file, manifest)
+    with open(local_file, 'r+b') as f:
+        f.write(b'rewritten')
+    os.utime(local_file, ns=(mtime(local_file) + 10 ** 9,) * 2)
+    upload(client, local_file, manifest)
+    assert ftp.commands[-1] == ('STOR', None)
+    assert ftp.files['speed.csv'] == open(local_file, 'rb').read()
+
+
+def test_remote_file_shorter_than_recorded_is_replaced(local_file, manifest):
+    ftp = FakeFTP()
+    ftp.files['speed.csv'] = b'x' * 100
+    manifest.update('speed.csv', local_file, 100000, mtime(local_file), 8192)
+    upload(make_client(ftp), local_file, manifest)
+    assert ftp.commands == [('STOR', None)]
+    assert ftp.files['speed.csv'] == open(local_file, 'rb').read()
+
+
+def test_remote_file_that_is_not_a_prefix_is_replaced(local_file, manifest):
+    ftp = FakeFTP()
+    ftp.files['speed.csv'] = b'x' * 200000
+    stats = upload(make_client(ftp), local_file, manifest)
+    assert ftp.commands == [('STOR', None)]
+    assert stats['bytes_sent'] == 100000
+    assert ftp.files['speed.csv'] == open(local_file, 'rb').read()
+
+
+def test_compressed_upload_resumes_to_a_valid_stream(local_file, manifest):
+    ftp = FakeFTP(fail_after=20000)
+    client = make_client(ftp)
+    with pytest.raises(ConnectionResetError):
+        upload(client, local_file, manifest, codec='gzip')
+    upload(client, local_file, manifest, codec='gzip')
+    assert ftp.commands[-1] == ('APPE', None)
+    assert gzip.decompress(ftp.files['speed.csv']) == open(local_file, 'rb').read()
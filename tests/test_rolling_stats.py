@@ -0,0 +1,59 @@
+# tests/test_rolling_stats.py
+import json
+import math
+
+import pytest
+
+from bob.rolling_stats import RollingStats
+
+HOUR = 3600
+DAY = 86400
+# 2024-03-01 00:00:00 UTC
+T0 = 1709251200
+
+
+@pytest.fixture
+def stats(tmp_path):
+    return RollingStats([HOUR, DAY], alpha=0.5, state_path=str(tmp_path / 'stats.json'))
+
+
+def test_windows_close_when_a_sample_falls_into_the_next_one(stats):
+    stats.add(T0 + 60, {'download': 10.0, 'upload': 2.0, 'ping': 40.0})
+    stats.add(T0 + 120, {'download': 30.0, 'upload': None, 'ping': 20.0})
+    assert stats.closed == []
+    stats.add(T0 + HOUR + 5, {'download': 50.0, 'upload': 4.0, 'ping': 10.0})
+
+    closed, = stats.closed
+    assert (closed['window'], closed['start'], closed['end']) == (HOUR, T0, T0 + HOUR)
+    assert closed['metrics']['download']['count'] == 2
+    assert closed['metrics']['download']['mean'] == 20.0
+    assert closed['metrics']['upload']['count'] == 1
+    assert stats.open[DAY][1]['download'].count == 3
+
+
+def test_ewma_and_variance(stats):
+    for value in (10.0, 20.0):
+        stats.add(T0, {'download': value})
+    assert stats.ewma['download'] == 15.0
+    # Incremental EW variance: (1 - a) * (0 + d * a * d) with d = 10, a = 0.5
+    assert stats.ewm_std('download') == pytest.approx(math.sqrt(25.0))
+    assert stats.ewm_std('ping') is None
+
+
+def test_summary_writes_ended_windows_once(stats, tmp_path):
+    stats.add(T0 + 60, {'download': 10.0, 'upload': 2.0, 'ping': 40.0})
+    path = stats.write_summary(str(tmp_path / 'session-stats'))
+    with open(path) as f:
+        windows = json.load(f)['windows']
+    # Both windows of 2024-03-01 are long over.
+    assert sorted(window['window'] for window in windows) == [HOUR, DAY]
+    assert stats.open == {}
+    assert stats.write_summary(str(tmp_path / 'session-stats')) is None
+
+
+def test_state_survives_a_restart(stats):
+    stats.add(T0 + 60, {'download': 10.0, 'upload': 2.0, 'ping': 40.0})
+    reloaded = RollingStats([HOUR, DAY], alpha=0.5, state_path=stats.state_path)
+    assert reloaded.open[HOUR][0] == T0
+    assert reloaded.open[HOUR][1]['download'].count == 1
+    assert reloaded.ewma == stats.ewma
@@ -0,0 +1,156 @@
+# tests/test_scheduler.py
+import os
+import sys
+import json
+import time
+import textwrap
+import threading
+import subprocess
+
+import pytest
+
+from bob.scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return Scheduler(max_workers=4, mode='deadline', jitter=0, shutdown_timeout=1,
+                     metrics_interval=60, metrics_file=str(tmp_path / 'metrics.json'))
+
+
+def run_for(scheduler, seconds):
+    timer = threading.Timer(seconds, scheduler.stop)
+    timer.start()
+    start = time.monotonic()
+    scheduler.run()
+    timer.cancel()
+    return time.monotonic() - start
+
+
+def test_deadline_mode_keeps_the_cadence(scheduler):
+    starts = []
+    task = scheduler.add_task('fast', lambda: (starts.append(time.monotonic()), time.sleep(0.05)),
+                              0.2)
+    run_for(scheduler, 1.1)
+    # Deadlines at 0, 0.2 ... 1.0 regardless of the 50ms each run takes.
+    assert task.runs == 6
+    assert task.skipped_cycles == 0
+    assert task.metrics()['effective_period'] == pytest.approx(0.2, abs=0.03)
+
+
+def test_overrunning_task_skips_missed_cycles(scheduler):
+    task = scheduler.add_task('slow', lambda: time.sleep(0.25), 0.1)
+    run_for(scheduler, 0.9)
+    assert task.overruns == task.runs
+    assert task.skipped_cycles >= task.runs - 1 >= 1
+
+
+def test_delay_mode_sleeps_after_each_run(scheduler):
+    scheduler.mode = 'delay'
+    task = scheduler.add_task('delayed', lambda: time.sleep(0.1), 0.2)
+    run_for(scheduler, 1.0)
+    # Each cycle takes 0.3s: runs at 0, 0.3, 0.6 and 0.9.
+    assert task.runs == 4
+    assert task.skipped_cycles == 0
+
+
+def test_failures_are_counted_and_do_not_stop_the_task(scheduler):
+    task = scheduler.add_task('broken', lambda: 1 / 0, 0.1)
+    run_for(scheduler, 0.35)
+    assert task.runs == task.failures == 4
+
+
+def test_interval_policy_changes_the_interval(scheduler):
+    task = scheduler.add_task('adaptive', lambda: None, 0.5,
+                              interval_policy=lambda t: 0.1 if t.runs >= 1 else None)
+    run_for(scheduler, 0.55)
+    assert task.interval == 0.1
+    assert task.runs == 6
+
+
+def test_metrics_are_written_on_an_interval_and_at_stop(scheduler):
+    scheduler.metrics_interval = 0.2
+    scheduler.add_task('noop', lambda: None, 0.1)
+    writes = []
+    write_metrics = scheduler.write_metrics
+    scheduler.write_metrics = lambda: (writes.append(time.monotonic()), write_metrics())
+    run_for(scheduler, 0.65)
+    # Three periodic writes, independent of the seven task runs, plus one at stop.
+    assert len(writes) == 4
+    with open(scheduler.metrics_file) as f:
+        metrics = json.load(f)
+    assert metrics['mode'] == 'deadline'
+    assert metrics['tasks']['noop']['runs'] == 7
+
+
+def test_zero_settings_are_not_replaced_by_the_defaults(tmp_path):
+    scheduler = Scheduler(jitter=0, metrics_interval=0, shutdown_timeout=0,
+                          metrics_file=str(tmp_path / 'metrics.json'))
+    assert (scheduler.metrics_interval, scheduler.shutdown_timeout) == (0, 0)
+    scheduler.add_task('noop', lambda: None, 0.05)
+    writes = []
+    write_metrics = scheduler.write_metrics
+    scheduler.write_metrics = lambda: (writes.append(time.monotonic()), write_metrics())
+    run_for(scheduler, 0.3)
+    # Metrics are written at stop only.
+    assert len(writes) == 1
+
+
+def test_shutdown_runs_hooks_first_and_does_not_wait_for_hung_stages(scheduler):
+    scheduler.shutdown_timeout = 0.3
+    order = []
+    release = threading.Event()
+
+    def hung():
+        order.append('stage')
+        release.wait(5)
+
+    scheduler.add_task('hung', hung, 60)
+    scheduler.add_shutdown_hook(lambda: order.append('seal'))
+    scheduler.add_shutdown_hook(lambda: 1 / 0)
+    scheduler.add_shutdown_hook(lambda: order.append('after failing hook'))
+    elapsed = run_for(scheduler, 0.2)
+    release.set()
+    assert order == ['stage', 'seal', 'after failing hook']
+    assert elapsed < 1.0
+    assert os.path.exists(scheduler.metrics_file)
+
+
+def test_hung_stage_does_not_delay_process_exit(tmp_path):
+    script = textwrap.dedent(f"""
+        import time
+        import threading
+        from bob.scheduler import Scheduler
+
+        scheduler = Scheduler(jitter=0, shutdown_timeout=0.3,
+                              metrics_file={str(tmp_path / 'metrics.json')!r})
+        scheduler.add_task('hung', lambda: time.sleep(30), 60)
+        threading.Timer(0.2, scheduler.stop).start()
+        scheduler.run()
+    """)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.monotonic()
+    subprocess.run([sys.executable, '-c', script], cwd=root, check=True, timeout=30)
+    # Interpreter start-up and imports plus 0.2s running and 0.3s of grace.
+    assert time.monotonic() - start < 5
+
+
+def test_max_workers_bounds_concurrent_stages(scheduler):
+    scheduler.max_workers = 1
+    running = []
+    overlaps = []
+
+    def stage():
+        running.append(1)
+        overlaps.append(len(running))
+        time.sleep(0.1)
+        running.pop()
+
+    scheduler.add_task('a', stage, 0.15)
+    scheduler.add_task('b', stage, 0.15)
+    run_for(scheduler, 0.5)
+    assert overlaps and max(overlaps) == 1
+
+
+def test_stop_before_run_is_a_no_op(scheduler):
+    assert not scheduler.stop()
@@ -0,0 +1,73 @@
+# tests/test_sketch.py
+import json
+import random
+
+import pytest
+
+from bob.sketch import QuantileSketch, Summary
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize('q', [0.05, 0.25, 0.5, 0.75, 0.95, 0.99])
+def test_quantiles_stay_within_relative_accuracy(q):
+    rng = random.Random(1)
+    values = [rng.lognormvariate(3, 1) for _ in range(5000)]
+    sketch = QuantileSketch(accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=0.01)
+
+
+def test_zero_and_empty():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    for value in (0, 0, 0, 5):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(5, rel=0.01)
+
+
+def test_merge_matches_a_single_sketch():
+    rng = random.Random(2)
+    values = [rng.uniform(1, 100) for _ in range(2000)]
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i, value in enumerate(values):
+        whole.add(value)
+        (left if i % 2 else right).add(value)
+    merged = left.merge(right)
+    assert merged.count == whole.count
+    assert merged.bins == whole.bins
+
+
+def test_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_bins_are_bounded():
+    sketch = QuantileSketch(accuracy=0.01, max_bins=64)
+    for exponent in range(-30, 30):
+        for step in range(10):
+            sketch.add(10 ** (exponent / 3) * (1 + step / 10))
+    assert len(sketch.bins) <= 64
+    # Collapsing only folds the lowest buckets, so the top stays accurate.
+    assert sketch.quantile(1.0) == pytest.approx(10 ** (29 / 3) * 1.9, rel=0.01)
+
+
+def test_summary_round_trips_through_json():
+    summary = Summary()
+    for value in (12.0, 30.5, 7.25, 18.0):
+        summary.add(value)
+    data = json.loads(json.dumps(summary.to_dict()))
+    assert (data['count'], data['min'], data['max']) == (4, 7.25, 30.5)
+    assert data['mean'] == pytest.approx(16.9375)
+
+    restored = Summary.from_dict(data)
+    assert restored.count == 4
+    assert restored.quantile(0.5) == pytest.approx(summary.quantile(0.5))
+    restored.merge(summary)
+    assert (restored.count, restored.min, restored.max) == (8, 7.25, 30.5)
@@ -0,0 +1,156 @@
+# tests/test_speedtest_engine.py
+import time
+
+import pytest
+
+speedtest = pytest.importorskip('speedtest')
+
+from bob.speedtest_engine import SpeedtestEngine  # noqa: E402
+
+MBIT = 1048576
+
+
+class Network:
+    """Latency to each server and failures shared by every FakeSpeedtest."""
+    def __init__(self):
+        self.latency = {'near': 10.0, 'mid': 20.0, 'far': 40.0}
+        self.download_error = None
+        self.clients = 0
+        self.pings = []
+
+
+class FakeResults:
+    def __init__(self, client=None, opener=None, secure=False):
+        self.ping = None
+        self.server = None
+
+
+class FakeSpeedtest:
+    """The parts of speedtest.Speedtest the engine uses."""
+    network = None
+
+    def __init__(self):
+        self.network.clients += 1
+        self.config = {'client': {'ip': '198.51.100.7'}}
+        self.closest = []
+        self.servers = {}
+        self.results = FakeResults()
+
+    def get_servers(self):
+        self.servers = {0: [{'host': host} for host in self.network.latency]}
+
+    def get_closest_servers(self, limit=5):
+        self.closest.extend(self.servers[0])
+        return self.closest[:limit]
+
+    def get_best_server(self, servers):
+        host = servers[0]['host']
+        self.network.pings.append(host)
+        latency = self.network.latency[host]
+        if isinstance(latency, Exception):
+            raise latency
+        best = dict(servers[0], latency=latency)
+        self.results.ping = latency
+        self.results.server = best
+        return best
+
+    def download(self):
+        if self.network.download_error is not None:
+            raise self.network.download_error
+        return 50 * MBIT
+
+    def upload(self):
+        return 10 * MBIT
+
+
+@pytest.fixture
+def network(monkeypatch):
+    network = Network()
+    monkeypatch.setattr(FakeSpeedtest, 'network', network)
+    monkeypatch.setattr(speedtest, 'Speedtest', FakeSpeedtest)
+    monkeypatch.setattr(speedtest, 'SpeedtestResults', FakeResults)
+    return network
+
+
+@pytest.fixture
+def engine(network):
+    return SpeedtestEngine(config_ttl=60, rerank_factor=2.0, candidates=3)
+
+
+def test_first_run_ranks_the_servers(network, engine):
+    phases = []
+    result = engine.run(progress=lambda phase, partial: phases.append((phase, partial)))
+    assert (result['download'], result['upload'], result['ping']) == (50.0, 10.0, 10.0)
+    assert result['server'] == 'near'
+    assert phases == [('download', {'ping': 10.0, 'server': 'near'}),
+                      ('upload', {'download': 50.0})]
+    assert (engine.refreshes, engine.reranks) == (1, 1)
+
+
+def test_cached_config_is_reused_within_the_ttl(network, engine):
+    engine.run()
+    network.pings.clear()
+    result = engine.run(upload=False)
+    assert result['upload'] is None
+    # One client, and only the chosen server is pinged.
+    assert network.clients == 1
+    assert network.pings == ['near']
+    assert (engine.refreshes, engine.reranks) == (1, 1)
+
+
+def test_config_is_downloaded_again_after_the_ttl(network, engine):
+    engine.run()
+    engine.config_ttl = 0.05
+    time.sleep(0.1)
+    engine.run()
+    assert network.clients == 2
+    assert (engine.refreshes, engine.reranks) == (2, 2)
+
+
+def test_public_ip_change_forces_a_refresh(network, engine):
+    engine.update_public_ip('198.51.100.7')
+    engine.run()
+    engine.update_public_ip('198.51.100.7')
+    engine.run()
+    assert engine.refreshes == 1
+    engine.update_public_ip('203.0.113.9')
+    engine.run()
+    assert engine.refreshes == 2
+
+
+def test_degraded_latency_triggers_a_rerank(network, engine):
+    engine.run()
+    network.latency['near'] = 19.0
+    assert engine.run()['server'] == 'near'
+    assert engine.reranks == 1
+    network.latency['near'] = 30.0
+    assert engine.run()['server'] == 'mid'
+    assert engine.reranks == 2
+
+
+def test_unreachable_cached_server_is_reranked(network, engine):
+    engine.run()
+    network.latency['near'] = OSError('timed out')
+    result = engine.run()
+    assert result['server'] == 'mid'
+    assert engine.reranks == 2
+    assert network.clients == 1
+
+
+def test_failed_test_reranks_next_cycle(network, engine):
+    engine.run()
+    network.download_error = ConnectionResetError('reset by peer')
+    with pytest.raises(ConnectionResetError):
+        engine.run()
+    network.download_error = None
+    network.pings.clear()
+    engine.run()
+    assert engine.reranks == 2
+    assert sorted(set(network.pings)) == ['far', 'mid', 'near']
+
+
+def test_no_reachable_servers(network, engine):
+    for host in network.latency:
+        network.latency[host] = OSError('unreachable')
+    with pytest.raises(RuntimeError, match='No reachable speedtest servers'):
+        engine.run()
@@ -0,0 +1,104 @@
+# tests/test_speedtest_worker.py
+import os
+import time
+import functools
+
+import pytest
+
+from bob.speedtest_worker import SpeedtestWorker, SpeedtestTimeout, SpeedtestWorkerError
+
+
+class StubEngine:
+    """
+    Engine run inside the worker process in place of speedtest-cli. Each
+    phase sleeps for the given number of seconds.
+    """
+    def __init__(self, download=0.0, upload=0.0, fail=False, crash=False):
+        self.download = download
+        self.upload = upload
+        self.fail = fail
+        self.crash = crash
+
+    def update_public_ip(self, ip):
+        pass
+
+    def run(self, upload=True, progress=None):
+        if self.crash:
+            os._exit(3)
+        if self.fail:
+            raise RuntimeError('no reachable servers')
+        progress('download', {'ping': 12.5, 'server': 'stub'})
+        time.sleep(self.download)
+        result = {'download': 50.0, 'upload': None, 'pid': os.getpid()}
+        if upload:
+            progress('upload', {'download': 50.0})
+            time.sleep(self.upload)
+            result['upload'] = 10.0
+        return result
+
+
+@pytest.fixture
+def worker(request):
+    """A worker whose StubEngine takes its arguments from indirect parametrization."""
+    engine = functools.partial(StubEngine, **getattr(request, 'param', {}))
+    # Setup includes spawning the worker, so it gets a generous budget.
+    worker = SpeedtestWorker(setup_timeout=30, download_timeout=0.5, upload_timeout=0.5,
+                             total_timeout=60, engine_factory=engine)
+    yield worker
+    worker.close()
+
+
+def test_worker_is_reused_between_tests(worker):
+    first = worker.run()
+    second = worker.run(upload=False)
+    assert (first['download'], first['upload']) == (50.0, 10.0)
+    assert second['upload'] is None
+    assert first['pid'] == second['pid']
+    assert worker.spawns == 1
+
+
+@pytest.mark.parametrize('worker', [{'upload': 30}], indirect=True)
+def test_hung_phase_kills_and_respawns_the_worker(worker):
+    start = time.monotonic()
+    first = worker.run(upload=False)
+    with pytest.raises(SpeedtestTimeout) as excinfo:
+        worker.run()
+    assert (excinfo.value.phase, excinfo.value.cause) == ('upload', 'phase')
+    assert excinfo.value.partial == {'ping': 12.5, 'server': 'stub', 'download': 50.0}
+    assert worker.timeouts == 1
+    assert time.monotonic() - start < 20
+    with pytest.raises(ProcessLookupError):
+        os.kill(first['pid'], 0)
+
+    second = worker.run(upload=False)
+    assert worker.spawns == 2
+    assert second['pid'] != first['pid']
+
+
+@pytest.mark.parametrize('worker', [{'download': 0.4, 'upload': 0.4}], indirect=True)
+def test_total_deadline_is_enforced(worker):
+    worker.run(upload=False)
+    # Each phase fits its own 0.5s budget, but not both within 0.6s.
+    worker.total_timeout = 0.6
+    with pytest.raises(SpeedtestTimeout) as excinfo:
+        worker.run()
+    assert (excinfo.value.phase, excinfo.value.cause) == ('upload', 'total')
+    assert excinfo.value.partial['download'] == 50.0
+
+
+@pytest.mark.parametrize('worker', [{'fail': True}], indirect=True)
+def test_engine_errors_keep_the_worker(worker):
+    for _ in range(2):
+        with pytest.raises(SpeedtestWorkerError, match='no reachable servers'):
+            worker.run()
+    assert worker.spawns == 1
+    assert worker.timeouts == 0
+
+
+@pytest.mark.parametrize('worker', [{'crash': True}], indirect=True)
+def test_dead_worker_is_reported_and_replaced(worker):
+    with pytest.raises(SpeedtestWorkerError, match='died'):
+        worker.run()
+    with pytest.raises(SpeedtestWorkerError, match='died'):
+        worker.run()
+    assert worker.spawns == 2
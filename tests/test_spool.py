@@ -0,0 +1,119 @@
+# tests/test_spool.py
+import time
+import sqlite3
+
+import pytest
+
+from bob.spool import UploadSpool, PRIORITY_CONTROL, PRIORITY_SUMMARY, PRIORITY_DATA
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = UploadSpool(str(tmp_path / 'spool.db'), backoff_base=10, backoff_max=100)
+    yield spool
+    spool.close()
+
+
+def make_file(tmp_path, name):
+    path = tmp_path / name
+    path.write_text('data')
+    return str(path)
+
+
+def test_enqueue_is_idempotent(spool, tmp_path):
+    path = make_file(tmp_path, 'a.csv')
+    spool.enqueue(path, '/up')
+    spool.enqueue(path, '/up')
+    assert spool.pending_count() == 1
+    assert spool.due()[0].remote_name == 'a.csv'
+
+
+def test_due_orders_by_priority_then_age(spool, tmp_path):
+    spool.enqueue(make_file(tmp_path, 'data.csv'), '/up', priority=PRIORITY_DATA)
+    spool.enqueue(make_file(tmp_path, 'summary.json'), '/up', priority=PRIORITY_SUMMARY)
+    spool.enqueue(make_file(tmp_path, 'notice.txt'), '/up', priority=PRIORITY_CONTROL)
+    assert [item.remote_name for item in spool.due()] == ['notice.txt', 'summary.json',
+                                                          'data.csv']
+    assert [item.remote_name for item in spool.due(max_priority=PRIORITY_SUMMARY)] == [
+        'notice.txt', 'summary.json']
+    assert len(spool.due(limit=1)) == 1
+
+
+def test_failures_back_off_exponentially_up_to_the_cap(spool, tmp_path):
+    spool.enqueue(make_file(tmp_path, 'a.csv'), '/up')
+    for attempt, expected in enumerate([10, 20, 40, 80, 100, 100], start=1):
+        item = spool.due(now=time.time() + 1000)[0]
+        before = time.time()
+        spool.mark_failed(item, ConnectionResetError('reset'))
+        item = spool.due(now=time.time() + 1000)[0]
+        assert item.attempts == attempt
+        assert item.last_error == 'reset'
+        # Retries are jittered by +/-20% to spread the fleet out.
+        delay = item.next_attempt - before
+        assert expected * 0.8 - 1 <= delay <= expected * 1.2 + 1
+        assert spool.due() == []
+
+
+def test_reset_backoff_makes_everything_due(spool, tmp_path):
+    spool.enqueue(make_file(tmp_path, 'a.csv'), '/up')
+    spool.enqueue(make_file(tmp_path, 'b.csv'), '/up')
+    for item in spool.due():
+        spool.mark_failed(item, 'timed out')
+    assert spool.due() == []
+    spool.reset_backoff()
+    assert len(spool.due()) == 2
+
+
+def test_mark_done_deletes_the_file(spool, tmp_path):
+    kept = make_file(tmp_path, 'kept.txt')
+    removed = make_file(tmp_path, 'removed.csv')
+    spool.enqueue(kept, '/up', delete_after=False)
+    spool.enqueue(removed, '/up')
+    for item in spool.due():
+        spool.mark_done(item)
+    assert spool.pending_count() == 0
+    assert (tmp_path / 'kept.txt').exists()
+    assert not (tmp_path / 'removed.csv').exists()
+
+
+def test_resume_flag(spool, tmp_path):
+    spool.enqueue(make_file(tmp_path, 'data.csv'), '/up')
+    spool.enqueue(make_file(tmp_path, 'notice.txt'), '/up', priority=PRIORITY_CONTROL,
+                  resume=False)
+    assert [(item.remote_name, item.resume) for item in spool.due()] == [('notice.txt', 0),
+                                                                         ('data.csv', 1)]
+
+
+def test_spool_from_an_older_version_is_upgraded(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE spool (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL,"
+        " remote_dir TEXT NOT NULL, remote_name TEXT NOT NULL,"
+        " codec TEXT NOT NULL DEFAULT 'none', priority INTEGER NOT NULL,"
+        " delete_after INTEGER NOT NULL DEFAULT 1, attempts INTEGER NOT NULL DEFAULT 0,"
+        " next_attempt REAL NOT NULL, created_at REAL NOT NULL, last_error TEXT,"
+        " UNIQUE (path, remote_dir, remote_name));"
+        "INSERT INTO spool (path, remote_dir, remote_name, priority, next_attempt, created_at)"
+        " VALUES ('/data/a.csv', '/up', 'a.csv', 10, 0, 0);")
+    conn.close()
+    spool = UploadSpool(path)
+    try:
+        item, = spool.due()
+        assert (item.remote_name, item.resume) == ('a.csv', 1)
+    finally:
+        spool.close()
+
+
+def test_items_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    spool = UploadSpool(path, backoff_base=10, backoff_max=100)
+    spool.enqueue(make_file(tmp_path, 'a.csv'), '/up', codec='gzip', remote_name='a.csv.gz')
+    spool.close()
+
+    spool = UploadSpool(path)
+    try:
+        item, = spool.due()
+        assert (item.remote_dir, item.remote_name, item.codec) == ('/up', 'a.csv.gz', 'gzip')
+    finally:
+        spool.close()
@@ -0,0 +1,69 @@
+# tests/test_throughput.py
+import socket
+
+import pytest
+
+from bob.throughput import ThroughputServer, ThroughputEngine, MAX_REQUEST_BYTES, SAMPLE_INTERVAL
+
+
+@pytest.fixture
+def server():
+    server = ThroughputServer('127.0.0.1', 0).start()
+    yield server
+    server.stop()
+
+
+def request(server, line, payload=b''):
+    with socket.create_connection(('127.0.0.1', server.port), timeout=5) as sock:
+        sock.sendall(line + payload)
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+
+def test_ping(server):
+    assert request(server, b'PING\n') == b'PONG\n'
+
+
+def test_download_sends_the_requested_bytes(server):
+    assert len(request(server, b'DOWNLOAD 200000\n')) == 200000
+
+
+def test_upload_reports_the_bytes_received(server):
+    assert request(server, b'UPLOAD 5000\n', b'x' * 5000) == b'OK 5000\n'
+
+
+@pytest.mark.parametrize('line', [
+    b'DOWNLOAD\n',
+    b'DOWNLOAD lots\n',
+    b'DOWNLOAD -1\n',
+    b'UPLOAD 1.5\n',
+    b'UPLOAD 10 20\n',
+    b'DOWNLOAD %d\n' % (MAX_REQUEST_BYTES + 1),
+    b'DELETE 10\n',
+])
+def test_malformed_requests_get_an_error(server, line):
+    assert request(server, line).startswith(b'ERR ')
+
+
+def test_stable_requires_matching_halves():
+    engine = ThroughputEngine('127.0.0.1', 1, streams=1, stable_window=8 * SAMPLE_INTERVAL,
+                              stable_tolerance=0.1)
+    assert engine._stable([100.0] * 7) is None
+    assert engine._stable([100.0, 102.0, 98.0, 101.0, 99.0, 100.0, 103.0, 97.0]) == 100.0
+    assert engine._stable([50.0, 60.0, 70.0, 80.0, 90.0, 100.0, 110.0, 120.0]) is None
+
+
+def test_engine_against_loopback_server(server):
+    engine = ThroughputEngine('127.0.0.1', server.port, streams=2, duration=2,
+                              max_bytes=8 * 1024 * 1024)
+    result = engine.run()
+    assert result['download'] > 0 and result['upload'] > 0
+    assert result['ping'] > 0
+    assert result['server'] == f'127.0.0.1:{server.port}'
+    assert 0 < result['bytes'] <= 2 * 8 * 1024 * 1024
+    assert engine.run(upload=False)['upload'] is None
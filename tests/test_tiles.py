@@ -0,0 +1,56 @@
+# tests/test_tiles.py
+import json
+
+import pytest
+
+from bob.tiles import TileAggregator, geohash, grid_tile
+
+
+def test_geohash_known_values():
+    assert geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert geohash(-25.382708, -49.265506, 6) == '6gkzwg'
+
+
+def test_grid_tile():
+    assert grid_tile(51.5074, -0.1278, 0.01) == '5150:-13'
+
+
+@pytest.fixture
+def tiles(tmp_path):
+    return TileAggregator('geohash', 6, state_path=str(tmp_path / 'tiles.json'),
+                          persist_interval=3600)
+
+
+def test_results_aggregate_per_tile(tiles):
+    key = tiles.add(51.5074, -0.1278, {'download': 20.0, 'upload': 5.0, 'ping': 30.0})
+    assert tiles.add(51.5075, -0.1279, {'download': 40.0, 'upload': None, 'ping': 50.0}) == key
+    other = tiles.add(48.8566, 2.3522, {'download': 10.0, 'upload': 1.0, 'ping': 20.0})
+    assert other != key
+    assert tiles.tiles[key]['download'].count == 2
+    assert tiles.tiles[key]['download'].mean == 30.0
+    assert tiles.tiles[key]['upload'].count == 1
+
+
+def test_summary_lists_changed_tiles_once(tiles, tmp_path):
+    key = tiles.add(51.5074, -0.1278, {'download': 20.0, 'upload': 5.0, 'ping': 30.0})
+    path = tiles.write_summary(str(tmp_path / 'session-tiles'))
+    with open(path) as f:
+        summary = json.load(f)
+    assert list(summary['tiles']) == [key]
+    assert summary['tiles'][key]['download']['count'] == 1
+    assert tiles.write_summary(str(tmp_path / 'session-tiles')) is None
+
+
+def test_index_survives_a_restart(tiles, tmp_path):
+    key = tiles.add(51.5074, -0.1278, {'download': 20.0, 'upload': 5.0, 'ping': 30.0})
+    tiles.persist()
+    reloaded = TileAggregator('geohash', 6, state_path=tiles.state_path)
+    assert reloaded.tiles[key]['download'].count == 1
+    assert reloaded.write_summary(str(tmp_path / 'session-tiles')) is not None
+
+
+def test_changed_scheme_starts_a_new_index(tiles):
+    tiles.add(51.5074, -0.1278, {'download': 20.0})
+    tiles.persist()
+    assert TileAggregator('grid', state_path=tiles.state_path).tiles == {}
+    assert TileAggregator('geohash', 5, state_path=tiles.state_path).tiles == {}
@@ -0,0 +1,120 @@
+# tests/test_track.py
+import datetime
+
+import pytest
+
+from bob.record_log import RecordSchema
+from bob.track import (TrackCompressor, TrackLogWriter, read_track, distance, _zigzag,
+                       _unzigzag, _encode_varint, _decode_rows)
+
+SCHEMA = RecordSchema([
+    ("timestamp", 'd', 'timestamp'),
+    ("latitude", 'd', ''),
+    ("longitude", 'd', ''),
+])
+
+START = datetime.datetime(2024, 3, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+
+def fix(seconds, latitude, longitude):
+    return [START + datetime.timedelta(seconds=seconds), latitude, longitude]
+
+
+@pytest.mark.parametrize('n', [0, 1, -1, 2, -2, 63, -64, 2 ** 31, -(2 ** 31), 2 ** 62])
+def test_zigzag_round_trip(n):
+    assert _zigzag(n) >= 0
+    assert _unzigzag(_zigzag(n)) == n
+
+
+def test_zigzag_keeps_small_values_small():
+    assert [_zigzag(n) for n in (0, -1, 1, -2, 2)] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize('value', [0, 1, 127, 128, 300, 16383, 16384, 2 ** 40])
+def test_varint_round_trip(value):
+    out = bytearray()
+    _encode_varint(value, out)
+    assert len(out) == max(1, (value.bit_length() + 6) // 7)
+    assert all(byte & 0x80 for byte in out[:-1]) and not out[-1] & 0x80
+    rows, complete = _decode_rows(bytes(out), 1)
+    assert rows == [[_unzigzag(value)]]
+    assert complete == len(out)
+
+
+def test_track_log_round_trip(tmp_path):
+    path = str(tmp_path / 'gps.trk')
+    rows = [fix(0, 51.5007292, -0.1246254), fix(1.25, 51.5007401, -0.1246011),
+            fix(2.5, -33.8567844, 151.2152967)]
+    writer = TrackLogWriter(path, SCHEMA)
+    writer.write_rows(rows)
+    writer.close()
+
+    schema, decoded = read_track(path)
+    assert schema == SCHEMA
+    assert len(decoded) == len(rows)
+    for row, original in zip(decoded, rows):
+        assert row[0] == pytest.approx(original[0].timestamp(), abs=1e-3)
+        assert row[1] == pytest.approx(original[1], abs=1e-7)
+        assert row[2] == pytest.approx(original[2], abs=1e-7)
+
+
+def test_slow_movement_costs_few_bytes(tmp_path):
+    path = tmp_path / 'gps.trk'
+    writer = TrackLogWriter(str(path), SCHEMA)
+    writer.write_rows([fix(0, 51.5, -0.12)])
+    writer.flush()
+    before = path.stat().st_size
+    writer.write_rows([fix(i, 51.5 + i * 1e-5, -0.12 - i * 1e-5) for i in range(1, 101)])
+    writer.close()
+    # One second and about a metre per row: a handful of bytes, not 24.
+    assert (path.stat().st_size - before) / 100 <= 8
+
+
+def test_reopen_continues_deltas_and_drops_torn_row(tmp_path):
+    path = str(tmp_path / 'gps.trk')
+    writer = TrackLogWriter(path, SCHEMA)
+    writer.write_rows([fix(0, 10.0, 20.0), fix(1, 10.001, 20.001)])
+    writer.close()
+    with open(path, 'ab') as f:
+        f.write(b'\x81')  # first byte of a varint from a crash mid-write
+
+    writer = TrackLogWriter(path, SCHEMA)
+    assert not writer.created
+    writer.write_rows([fix(2, 10.002, 20.002)])
+    writer.close()
+
+    _, rows = read_track(path)
+    assert [round(row[1], 3) for row in rows] == [10.0, 10.001, 10.002]
+
+
+def test_layout_mismatch_is_rejected(tmp_path):
+    path = str(tmp_path / 'gps.trk')
+    TrackLogWriter(path, SCHEMA).close()
+    other = RecordSchema([("timestamp", 'd', 'timestamp'), ("latitude", 'd', '')])
+    with pytest.raises(ValueError):
+        TrackLogWriter(path, other)
+
+
+def test_compressor_drops_stationary_fixes():
+    track = TrackCompressor(min_distance=5, max_interval=60, tolerance=1, window=10)
+    kept = []
+    for second in range(30):
+        kept += track.add(fix(second, 51.5, -0.12))
+    kept += track.flush()
+    assert track.seen == 30
+    assert len(kept) == 1
+
+
+def test_compressor_keeps_track_within_tolerance():
+    track = TrackCompressor(min_distance=0, max_interval=60, tolerance=2, window=8)
+    # A straight line east followed by a turn north.
+    points = ([fix(i, 51.5, -0.12 + i * 1e-4) for i in range(20)] +
+              [fix(20 + i, 51.5 + (i + 1) * 1e-4, -0.12 + 19e-4) for i in range(20)])
+    kept = []
+    for point in points:
+        kept += track.add(point)
+    kept += track.flush()
+    assert len(kept) < len(points) / 4
+    assert kept[0] == points[0] and kept[-1] == points[-1]
+    corner = points[19]
+    assert min(distance(corner[1:3], point[1:3]) for point in kept) < 2